@@ -1,7 +1,6 @@
 import asyncio
 import os
 import warnings
-from datetime import timedelta
 from sys import argv
 
 import colorama
@@ -26,11 +25,12 @@ import py.justin
 import py.sim
 import py.teams
 import py.test
+import py.trace
 import py.write
 import py.weekly
 from py.cli import run_main
 from py.tpa import TPAService
-from py.util import CURRENT_YEAR
+from py.util import CURRENT_YEAR, TPA_HOST, TPA_MAX_CONCURRENCY, TPA_PORT
 
 install(show_locals=True)
 
@@ -41,17 +41,19 @@ colorama.init()
 requests_cache.install_cache(
     "requests_cache",
     urls_expire_after={
-        f"*{CURRENT_YEAR}*": timedelta(days=30),
+        # Current-season URLs are revalidated by the proxy (py/tpa/revalidate.py)
+        f"*{CURRENT_YEAR}*": 0,
         "*": -1,
     },
 )
 
 
-async def start_server():
-    server = Server([TPAService()])
+async def start_server(max_concurrency: int = TPA_MAX_CONCURRENCY):
+    server = Server([TPAService(max_concurrency=max_concurrency)])
     cache_size = humanize.naturalsize(os.stat("requests_cache.sqlite").st_size)
-    print(f"starting with cache size of {cache_size}")
-    await server.start("127.0.0.1", "1337")
+    pb_cache_size = humanize.naturalsize(os.stat("tpa_cache.sqlite").st_size)
+    print(f"starting with cache size of {cache_size} (+{pb_cache_size} protobuf)")
+    await server.start(TPA_HOST, TPA_PORT)
     print("waiting")
     await server.wait_closed()
 
@@ -59,6 +61,9 @@ async def start_server():
 if __name__ == "__main__":
     if len(argv) >= 2 and argv[1] == "tpa":
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(start_server())
+        if len(argv) >= 3:
+            loop.run_until_complete(start_server(max_concurrency=int(argv[2])))
+        else:
+            loop.run_until_complete(start_server())
     else:
         asyncio.get_event_loop().run_until_complete(run_main(argv[1:]))
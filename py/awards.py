@@ -64,10 +64,20 @@ async def wffa_info():
                 )
                 async for award in tpa.get_event_awards(event_key=event.key):
                     if award.award_type == AwardType.WOODIE_FLOWERS:
+                        teams = {
+                            t.key: t
+                            async for t in tpa.get_teams_by_keys(
+                                team_keys=[
+                                    r.team_key
+                                    for r in award.recipient_list
+                                    if len(r.team_key) > 0
+                                ]
+                            )
+                        }
                         for recipient in award.recipient_list:
                             tcity, tstate, tcountry = "", "", ""
                             if len(recipient.team_key) > 0:
-                                team = await tpa.get_team(team_key=recipient.team_key)
+                                team = teams[recipient.team_key]
                                 tcity, tstate, tcountry = (
                                     team.city,
                                     team.state_prov,
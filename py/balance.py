@@ -0,0 +1,369 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from py.util import BALANCE_STEPS, BALANCE_TIME_BUDGET_SECONDS
+
+# One index array per division; items are whatever the caller indexed (teams).
+Members = List[npt.NDArray[np.int64]]
+# (division a, position in a, division b, position in b)
+Swap = Tuple[int, int, int, int]
+
+
+class Split(NamedTuple):
+    divisions: List[List[int]]  # item indices per division
+    scores: Dict[str, float]  # objective name -> unweighted score
+    cost: float
+    steps: int
+
+
+class Objective(ABC):
+    """One term of the cost `anneal` minimizes: weight * score / scale.
+
+    `delta` scores a swap without making it and `commit` keeps the last swap
+    passed to `delta`, so objectives only ever redo the divisions a swap touches.
+    """
+
+    name = ""
+
+    def __init__(self, scale: float = 1.0, weight: float = 1.0) -> None:
+        self.scale = scale
+        self.weight = weight
+
+    @abstractmethod
+    def reset(self, members: Members) -> None:
+        pass
+
+    @abstractmethod
+    def score(self) -> float:
+        pass
+
+    @abstractmethod
+    def delta(self, members: Members, swap: Swap) -> float:
+        pass
+
+    @abstractmethod
+    def commit(self) -> None:
+        pass
+
+
+class DivisionStatSpread(Objective):
+    """How far apart the divisions are on some per-division statistic, e.g. the
+    range of their mean strengths."""
+
+    def __init__(
+        self,
+        name: str,
+        values: npt.NDArray[np.float64],
+        stat: Callable[[npt.NDArray[np.float64]], float],
+        spread: Callable[[npt.NDArray[np.float64]], float] = np.ptp,
+        scale: float = 1.0,
+        weight: float = 1.0,
+    ) -> None:
+        super().__init__(scale, weight)
+        self.name = name
+        self.values = np.asarray(values, dtype=np.float64)
+        self.stat = stat
+        self.spread = spread
+
+    def reset(self, members: Members) -> None:
+        self.stats = np.array([self.stat(self.values[m]) for m in members])
+        self.current = float(self.spread(self.stats))
+
+    def score(self) -> float:
+        return self.current
+
+    def delta(self, members: Members, swap: Swap) -> float:
+        a, i, b, j = swap
+        stats = self.stats.copy()
+        for d, pos, other in [(a, i, members[b][j]), (b, j, members[a][i])]:
+            vals = self.values[members[d]]
+            vals[pos] = self.values[other]
+            stats[d] = self.stat(vals)
+
+        self.pending = stats, float(self.spread(stats))
+        return self.pending[1] - self.current
+
+    def commit(self) -> None:
+        self.stats, self.current = self.pending
+
+
+class StrengthSpread(Objective):
+    """How unevenly strength is spread: the RMS distance of each division's mean
+    from the overall mean, plus the RMS distance of each division's standard
+    deviation (depth) from their average.
+
+    Each division's sums of values and squared values are kept, so a swap is
+    scored from the two changed divisions alone.
+    """
+
+    def __init__(
+        self,
+        values: npt.NDArray[np.float64],
+        name: str = "Strength",
+        scale: float = 1.0,
+        weight: float = 1.0,
+    ) -> None:
+        super().__init__(scale, weight)
+        self.name = name
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def moments(self, d: int, s1: float, s2: float) -> Tuple[float, float]:
+        mean = s1 / self.sizes[d]
+        return mean, np.sqrt(max(s2 / self.sizes[d] - mean * mean, 0.0))
+
+    def reset(self, members: Members) -> None:
+        self.sizes = [len(m) for m in members]
+        self.center = float(self.values[np.concatenate(members)].mean())
+        self.s1 = [float(self.values[m].sum()) for m in members]
+        self.s2 = [float((self.values[m] ** 2).sum()) for m in members]
+        self.mean_sd = [
+            self.moments(d, *s) for d, s in enumerate(zip(self.s1, self.s2))
+        ]
+        self.dev2 = sum((m - self.center) ** 2 for m, _ in self.mean_sd)
+        self.sd1 = sum(sd for _, sd in self.mean_sd)
+        self.sd2 = sum(sd * sd for _, sd in self.mean_sd)
+        self.current = self.total(self.dev2, self.sd1, self.sd2)
+
+    def total(self, dev2: float, sd1: float, sd2: float) -> float:
+        n = len(self.sizes)
+        return float(np.sqrt(dev2 / n) + np.sqrt(max(sd2 / n - (sd1 / n) ** 2, 0.0)))
+
+    def score(self) -> float:
+        return self.current
+
+    def delta(self, members: Members, swap: Swap) -> float:
+        a, i, b, j = swap
+        diff = self.values[members[b][j]] - self.values[members[a][i]]
+        sq_diff = self.values[members[b][j]] ** 2 - self.values[members[a][i]] ** 2
+        dev2, sd1, sd2 = self.dev2, self.sd1, self.sd2
+        changed = []
+        for d, sign in [(a, 1), (b, -1)]:
+            s1, s2 = self.s1[d] + sign * diff, self.s2[d] + sign * sq_diff
+            old_mean, old_sd = self.mean_sd[d]
+            mean, sd = self.moments(d, s1, s2)
+            dev2 += (mean - self.center) ** 2 - (old_mean - self.center) ** 2
+            sd1 += sd - old_sd
+            sd2 += sd * sd - old_sd * old_sd
+            changed.append((d, s1, s2, (mean, sd)))
+
+        total = self.total(dev2, sd1, sd2)
+        self.pending = changed, dev2, sd1, sd2, total
+        return total - self.current
+
+    def commit(self) -> None:
+        changed, self.dev2, self.sd1, self.sd2, self.current = self.pending
+        for d, s1, s2, mean_sd in changed:
+            self.s1[d], self.s2[d], self.mean_sd[d] = s1, s2, mean_sd
+
+
+class CountSpread(Objective):
+    """How far each division's count of every label (region, rookie or not) is
+    from its fair share, as the mean squared difference per division."""
+
+    def __init__(
+        self,
+        name: str,
+        labels: Sequence[object],
+        scale: float = 1.0,
+        weight: float = 1.0,
+    ) -> None:
+        super().__init__(scale, weight)
+        self.name = name
+        _, self.labels = np.unique(
+            np.array(labels, dtype=object).astype(str), return_inverse=True
+        )
+
+    def reset(self, members: Members) -> None:
+        k = self.labels.max() + 1
+        self.counts = np.stack(
+            [np.bincount(self.labels[m], minlength=k) for m in members]
+        )
+        sizes = np.array([len(m) for m in members])
+        totals = self.counts.sum(axis=0)
+        self.expected = np.outer(sizes, totals) / sizes.sum()
+        self.sq = float(((self.counts - self.expected) ** 2).sum())
+
+    def score(self) -> float:
+        return self.sq / len(self.counts)
+
+    def term(self, d: int, k: int, count: int) -> float:
+        return (count - self.expected[d, k]) ** 2
+
+    def delta(self, members: Members, swap: Swap) -> float:
+        a, i, b, j = swap
+        p, q = self.labels[members[a][i]], self.labels[members[b][j]]
+        self.pending = p, q, a, b, 0.0
+        if p == q:
+            return 0.0
+
+        c = self.counts
+        change = 0.0
+        for d, k, step in [(a, p, -1), (a, q, 1), (b, q, -1), (b, p, 1)]:
+            change += self.term(d, k, c[d, k] + step) - self.term(d, k, c[d, k])
+
+        self.pending = p, q, a, b, change
+        return change / len(self.counts)
+
+    def commit(self) -> None:
+        p, q, a, b, change = self.pending
+        if p == q:
+            return
+
+        self.counts[a, p] -= 1
+        self.counts[a, q] += 1
+        self.counts[b, q] -= 1
+        self.counts[b, p] += 1
+        self.sq += change
+
+
+class PairConstraints(Objective):
+    """Number of broken pairwise constraints: pairs of items that must share a
+    division (`together`) or must not (`apart`)."""
+
+    def __init__(
+        self,
+        together: Sequence[Tuple[int, int]] = (),
+        apart: Sequence[Tuple[int, int]] = (),
+        name: str = "Constraints",
+        scale: float = 1.0,
+        weight: float = 1.0,
+    ) -> None:
+        super().__init__(scale, weight)
+        self.name = name
+        self.pairs = [(x, y, True) for x, y in together] + [
+            (x, y, False) for x, y in apart
+        ]
+        self.by_item = {}  # type: Dict[int, List[Tuple[int, int, bool]]]
+        for pair in self.pairs:
+            for item in pair[:2]:
+                self.by_item.setdefault(item, []).append(pair)
+
+    def broken(self, div: Callable[[int], int], pair: Tuple[int, int, bool]) -> bool:
+        x, y, together = pair
+        return bool(div(x) == div(y)) != together
+
+    def reset(self, members: Members) -> None:
+        self.div_of = {int(t): d for d, m in enumerate(members) for t in m}
+        self.current = sum(self.broken(self.div_of.get, p) for p in self.pairs)
+
+    def score(self) -> float:
+        return float(self.current)
+
+    def delta(self, members: Members, swap: Swap) -> float:
+        a, i, b, j = swap
+        t1, t2 = int(members[a][i]), int(members[b][j])
+        moved = {t1: b, t2: a}
+
+        def div(t: int) -> int:
+            return moved.get(t, self.div_of[t])
+
+        touched = set(self.by_item.get(t1, []) + self.by_item.get(t2, []))
+        change = sum(
+            self.broken(div, p) - self.broken(self.div_of.get, p) for p in touched
+        )
+        self.pending = t1, t2, a, b, change
+        return float(change)
+
+    def commit(self) -> None:
+        t1, t2, a, b, change = self.pending
+        self.div_of[t1], self.div_of[t2] = b, a
+        self.current += change
+
+
+def anneal(
+    initial: Sequence[Sequence[int]],
+    objectives: List[Objective],
+    groups: Optional[Sequence[object]] = None,
+    steps: int = BALANCE_STEPS,
+    time_budget: float = BALANCE_TIME_BUDGET_SECONDS,
+    seed: Union[None, int, np.random.SeedSequence] = None,
+) -> Split:
+    """Simulated annealing over swaps of two items in different divisions.
+
+    Swaps keep division sizes fixed, and with `groups` (one label per item) only
+    items with the same label trade places, so whatever spread of labels
+    `initial` has is kept. The temperature schedule is set by `steps`, so a seed
+    always gives the same split unless `time_budget` (seconds) cuts it short.
+    """
+    rng = np.random.default_rng(seed)
+    members = [np.array(d, dtype=np.int64) for d in initial]
+    n = sum(len(m) for m in members)
+    div_of = np.zeros(n, dtype=np.int64)
+    pos_of = np.zeros(n, dtype=np.int64)
+    for d, m in enumerate(members):
+        div_of[m] = d
+        pos_of[m] = np.arange(len(m))
+
+    labels = np.zeros(n, dtype=np.int64)
+    if groups is not None:
+        _, labels = np.unique(
+            np.array(groups, dtype=object).astype(str), return_inverse=True
+        )
+    by_label = [np.flatnonzero(labels == g) for g in range(labels.max() + 1)]
+
+    for o in objectives:
+        o.reset(members)
+
+    def cost() -> float:
+        return sum(o.weight * o.score() / o.scale for o in objectives)
+
+    def propose() -> Optional[Swap]:
+        t1 = int(rng.integers(n))
+        t2 = int(rng.choice(by_label[labels[t1]]))
+        if div_of[t1] == div_of[t2]:
+            return None
+        return int(div_of[t1]), int(pos_of[t1]), int(div_of[t2]), int(pos_of[t2])
+
+    def delta(swap: Swap) -> float:
+        return sum(o.weight * o.delta(members, swap) / o.scale for o in objectives)
+
+    # Start hot enough that a typical uphill move is taken about 2/3 of the time.
+    sample = [abs(delta(s)) for s in (propose() for _ in range(200)) if s is not None]
+    sample = [x for x in sample if np.isfinite(x)]
+    t_start = max(np.mean(sample) if len(sample) > 0 else 1.0, 1e-9) * 2.5
+    t_end = t_start * 1e-4
+
+    current = cost()
+    best, best_members = current, [m.copy() for m in members]
+    deadline = time.monotonic() + time_budget
+    step = 0
+    for step in range(1, steps + 1):
+        if step % 1024 == 0 and time.monotonic() > deadline:
+            break
+
+        swap = propose()
+        if swap is None:
+            continue
+
+        d = delta(swap)
+        temp = t_start * (t_end / t_start) ** (step / steps)
+        # NaN compares false against everything, so it would otherwise be taken.
+        if not np.isfinite(d) or (d > 0 and rng.random() >= np.exp(-d / temp)):
+            continue
+
+        # `delta` above left every objective holding this swap.
+        for o in objectives:
+            o.commit()
+
+        a, i, b, j = swap
+        t1, t2 = members[a][i], members[b][j]
+        members[a][i], members[b][j] = t2, t1
+        div_of[t1], div_of[t2] = b, a
+        pos_of[t1], pos_of[t2] = j, i
+        current += d
+        if current < best - 1e-12:
+            best, best_members = current, [m.copy() for m in members]
+
+    for o in objectives:
+        o.reset(best_members)
+
+    return Split(
+        divisions=[sorted(m.tolist()) for m in best_members],
+        scores={o.name: o.score() for o in objectives},
+        cost=cost(),
+        steps=step,
+    )
@@ -44,8 +44,10 @@ async def run_main(argv):
     args = [attempt_to_cast_value(a) for a in args]
     fn = fns[module_name][fn_name]
 
-    if inspect.iscoroutinefunction(fn):
-        await fn(*args)
+    try:
+        if inspect.iscoroutinefunction(fn):
+            await fn(*args)
+        else:
+            fn(*args)
+    finally:
         close()
-    else:
-        fn(*args)
@@ -1,9 +1,10 @@
 from tbapy import TBA
 import numpy as np
 from pprint import pprint
-from collections import defaultdict
 from tqdm import tqdm
 
+from py.opr import COLORS, OPRDesign
+
 tba = TBA("1EhUOwczJi4vDUXza94fAo7s4UFrKgBrTJ6A3MTeYR0WrgzlyGR0Tzyl1TN2P6Tu")
 event_key = "2023isde1"
 
@@ -63,85 +64,34 @@ class Accessors:
         )
 
 
-def build_team_mapping(matches):
-    team_set = set()
-    for match in matches:
-        for color in ["red", "blue"]:
-            for team in match["alliances"][color]["team_keys"]:
-                team_set.add(team[3:])
-
-    team_list = list(team_set)
-    team_id_map = {}
-    for i, team in enumerate(team_list):
-        team_id_map[team] = i
-
-    return team_list, team_id_map
-
-
-def build_s_matrix(matches, team_id_map, accessor):
-    n = len(team_id_map.keys())
-    s = np.zeros((n, 1))
-    for match in matches:
-        if match["alliances"]["blue"]["score"] == -1:
-            continue
-
-        for color in ["red", "blue"]:
-            alliance_teams = [
-                team[3:] for team in match["alliances"][color]["team_keys"]
-            ]
-            stat = accessor(match, color)
-            for team in alliance_teams:
-                s[team_id_map[team]] += stat
-
-    return s
-
-
-def calc_stat(matches, team_list, team_id_map, m_inv, accessor):
-    s = build_s_matrix(matches, team_id_map, accessor)
-    x = np.dot(m_inv, s)
-    stat_dict = {}
-    for team, stat in zip(team_list, x):
-        stat_dict[team] = stat[0]
+def played(matches):
+    return [m for m in matches if m["alliances"]["blue"]["score"] != -1]
 
-    return stat_dict
-
-
-def build_m_inv_matrix(matches, team_id_map):
-    n = len(team_id_map.keys())
-    M = np.zeros((n, n))
-    for match in matches:
-        if match["alliances"]["blue"]["score"] == -1:
-            continue
 
-        for color in ["red", "blue"]:
-            alliance_teams = match["alliances"][color]["team_keys"]
-            for team1 in alliance_teams:
-                for team2 in alliance_teams:
-                    M[team_id_map[team1[3:]], team_id_map[team2[3:]]] += 1
-
-    return np.linalg.pinv(M)
-
-
-def opr(matches):
-    team_list, team_id_map = build_team_mapping(matches)
-    if not team_list:
+def accessors(matches, accessor_fns):
+    """COPRs for every accessor at once, as team number -> [copr per accessor]."""
+    matches = played(matches)
+    design = OPRDesign(
+        [m["alliances"][color]["team_keys"] for m in matches for color in COLORS]
+    )
+    if not design.teams:
         return {}
 
-    m_inv = build_m_inv_matrix(matches, team_id_map)
-    oprs = calc_stat(
-        matches, team_list, team_id_map, m_inv, lambda m, c: m["alliances"][c]["score"]
-    )
-    return oprs
+    targets = np.array(
+        [[fn(m, color) for fn in accessor_fns] for m in matches for color in COLORS],
+        dtype=np.float64,
+    ).reshape(-1, len(accessor_fns))
+    x = design.solve(targets)
+    return {team[3:]: [float(v) for v in x[i]] for i, team in enumerate(design.teams)}
 
 
-def accessor(matches, accessor):
-    team_list, team_id_map = build_team_mapping(matches)
-    if not team_list:
-        return {}
-
-    m_inv = build_m_inv_matrix(matches, team_id_map)
-    oprs = calc_stat(matches, team_list, team_id_map, m_inv, accessor)
-    return oprs
+def opr(matches):
+    return {
+        team: row[0]
+        for team, row in accessors(
+            matches, [lambda m, c: m["alliances"][c]["score"]]
+        ).items()
+    }
 
 
 print_headers = True
@@ -157,9 +107,7 @@ for event in tqdm(tba.events(year=2023)):
     if matches[0]["score_breakdown"] is None:
         continue
 
-    team_rows = defaultdict(list)
-    headers = ["team", "eventKey", "week"]
-    for accessor_fn in [
+    accessor_fns = [
         Accessors.cones,
         Accessors.high_cones,
         Accessors.mid_cones,
@@ -168,25 +116,22 @@ for event in tqdm(tba.events(year=2023)):
         Accessors.high_cubes,
         Accessors.mid_cubes,
         Accessors.low_cubes,
-    ]:
-        for team, copr in accessor(matches, accessor=accessor_fn).items():
-            team_rows[team].append(round(copr, 4))
-
-        headers.append(accessor_fn.__name__)
-
+    ]
+    headers = ["team", "eventKey", "week"] + [fn.__name__ for fn in accessor_fns]
     for component, value in matches[0]["score_breakdown"]["red"].items():
         try:
             float(value)
         except (ValueError, TypeError):
             continue
         else:
-            for team, copr in accessor(
-                matches, accessor=Accessors.default_accessor(component)
-            ).items():
-                team_rows[team].append(round(copr, 4))
-
+            accessor_fns.append(Accessors.default_accessor(component))
             headers.append(component)
 
+    team_rows = {
+        team: [round(copr, 4) for copr in row]
+        for team, row in accessors(matches, accessor_fns).items()
+    }
+
     if print_headers:
         print(",".join(headers))
         print_headers = False
@@ -1,90 +1,279 @@
-from collections import defaultdict
 import json
-from typing import List
-from py.tpa import tpa_cm
+import os
+from collections import defaultdict
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from scipy import special
+
 from py.cli import expose
+from py.opr import played_matches
+from py.tba import EventType
+from py.tpa import tpa_cm
+from py.util import (
+    CURRENT_YEAR,
+    ELO_CHECKPOINT_DIR,
+    create_dir_if_not_exists,
+    is_official_event,
+    sort_events,
+    tqdm_bar,
+)
 
-from py.util import all_events_with_bar, is_official_event
+# TrueSkill's defaults.
+MU = 25.0
+SIGMA = MU / 3
+BETA = SIGMA / 2
+TAU = SIGMA / 100
+DRAW_PROBABILITY = 0.10
 
-import trueskill as ts
+TEAM_SIZE = 3
 
 
-@expose
-async def generate():
-    elos = defaultdict(dict)
-    curr_ratings = {}
-    active = defaultdict(lambda: False)
+class Season(NamedTuple):
+    keys: npt.NDArray[np.str_]  # team keys, which red / blue index into
+    red: npt.NDArray[np.int32]  # (matches, TEAM_SIZE), -1 where an alliance is short
+    blue: npt.NDArray[np.int32]
+    outcome: npt.NDArray[np.int8]  # 1 red won, -1 blue won, 0 tie
+
+
+def pdf(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    return np.exp(-(x**2) / 2) / np.sqrt(2 * np.pi)
+
+
+def v_w_win(
+    t: npt.NDArray[np.float64], e: npt.NDArray[np.float64]
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    x = t - e
+    # pdf / cdf through logs so heavy upsets don't divide 0 by 0.
+    v = np.exp(-(x**2) / 2 - np.log(np.sqrt(2 * np.pi)) - special.log_ndtr(x))
+    return v, v * (v + x)
+
 
-    def rating(team_key: str) -> ts.Rating:
-        if team_key not in curr_ratings:
-            curr_ratings[team_key] = ts.Rating()
+def v_w_draw(
+    t: npt.NDArray[np.float64], e: npt.NDArray[np.float64]
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    a, b = e - np.abs(t), -e - np.abs(t)
+    denom = np.maximum(special.ndtr(a) - special.ndtr(b), 1e-300)
+    v = (pdf(b) - pdf(a)) / denom
+    return v * np.where(t < 0, -1, 1), v * v + (a * pdf(a) - b * pdf(b)) / denom
 
-        return curr_ratings[team_key]
 
-    def update_ratings(
-        ratings: List[ts.Rating], red: List[str], blue: List[str]
+def layers(red: npt.NDArray[np.int32], blue: npt.NDArray[np.int32]) -> np.ndarray:
+    """Split matches into layers where no team plays twice, keeping every team's
+    matches in order. Each layer can then be rated all at once and still give
+    exactly what rating the matches one by one would."""
+    last = defaultdict(int)
+    out = np.empty(len(red), dtype=np.int64)
+    for m, teams in enumerate(np.concatenate([red, blue], axis=1).tolist()):
+        teams = [t for t in teams if t >= 0]
+        layer = max(last[t] for t in teams) + 1
+        for t in teams:
+            last[t] = layer
+        out[m] = layer
+
+    return out
+
+
+class Ratings:
+    """Every team's TrueSkill rating, as arrays indexed by `index`."""
+
+    def __init__(self) -> None:
+        self.keys = []  # type: List[str]
+        self.index = {}
+        self.mu = np.empty(0)
+        self.sigma = np.empty(0)
+        self.active = np.zeros(0, dtype=np.bool_)  # played this season
+
+    def add(self, keys: List[str]) -> npt.NDArray[np.int64]:
+        new = [k for k in keys if k not in self.index]
+        for k in new:
+            self.index[k] = len(self.keys)
+            self.keys.append(k)
+
+        self.mu = np.concatenate([self.mu, np.full(len(new), MU)])
+        self.sigma = np.concatenate([self.sigma, np.full(len(new), SIGMA)])
+        self.active = np.concatenate([self.active, np.zeros(len(new), np.bool_)])
+        return np.array([self.index[k] for k in keys], dtype=np.int64)
+
+    def new_season(self) -> None:
+        # Regress uncertainty halfway back to a new team's.
+        self.sigma = (self.sigma + SIGMA) / 2
+        self.active[:] = False
+
+    def rate(self, season: Season) -> None:
+        to_global = self.add(season.keys.tolist())
+        red = np.where(season.red >= 0, to_global[season.red], -1)
+        blue = np.where(season.blue >= 0, to_global[season.blue], -1)
+
+        lyr = layers(red, blue)
+        order = np.argsort(lyr, kind="stable")
+        for batch in np.split(order, np.flatnonzero(np.diff(lyr[order])) + 1):
+            self.update(red[batch], blue[batch], season.outcome[batch])
+
+        teams = np.concatenate([red.ravel(), blue.ravel()])
+        self.active[teams[teams >= 0]] = True
+
+    def update(
+        self,
+        red: npt.NDArray[np.int64],
+        blue: npt.NDArray[np.int64],
+        outcome: npt.NDArray[np.int8],
     ) -> None:
-        new_red, new_blue = ratings
-        for nr, r in zip(new_red, red):
-            curr_ratings[r] = nr
-        for nb, b in zip(new_blue, blue):
-            curr_ratings[b] = nb
+        """Two-team TrueSkill update for matches that share no teams."""
+        teams = np.concatenate([red, blue], axis=1)
+        valid = teams >= 0
+        idx = np.where(valid, teams, 0)
+        mu = np.where(valid, self.mu[idx], 0.0)
+        var = np.where(valid, self.sigma[idx] ** 2 + TAU**2, 0.0)
+
+        size = valid.sum(axis=1)
+        c2 = var.sum(axis=1) + size * BETA**2
+        c = np.sqrt(c2)
+        draw_margin = special.ndtri((DRAW_PROBABILITY + 1) / 2) * np.sqrt(size) * BETA
+
+        # Everything from red's side; flipped when blue won.
+        sign = np.where(outcome < 0, -1.0, 1.0)
+        t = sign * (mu[:, :TEAM_SIZE].sum(axis=1) - mu[:, TEAM_SIZE:].sum(axis=1)) / c
+        e = draw_margin / c
+        v_win, w_win = v_w_win(t, e)
+        v_draw, w_draw = v_w_draw(t, e)
+        v = np.where(outcome == 0, v_draw, v_win)
+        w = np.where(outcome == 0, w_draw, w_win)
+
+        side = sign[:, None] * np.repeat([1.0, -1.0], TEAM_SIZE)[None, :]
+        new_mu = mu + side * var / c[:, None] * v[:, None]
+        new_var = var * (1 - var / c2[:, None] * w[:, None])
+
+        self.mu[teams[valid]] = new_mu[valid]
+        self.sigma[teams[valid]] = np.sqrt(new_var[valid])
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            keys=np.array(self.keys),
+            mu=self.mu,
+            sigma=self.sigma,
+            active=self.active,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Ratings":
+        ratings = cls()
+        with np.load(path) as data:
+            ratings.keys = data["keys"].tolist()
+            ratings.mu = data["mu"]
+            ratings.sigma = data["sigma"]
+            ratings.active = data["active"]
+
+        ratings.index = {k: i for i, k in enumerate(ratings.keys)}
+        return ratings
+
+
+def checkpoint_path(year_start: int, year: int) -> str:
+    # Ratings depend on every season since the run's first one.
+    return f"{ELO_CHECKPOINT_DIR}/ratings_{year_start}_{year}.npz"
+
+
+def season_path(year: int) -> str:
+    return f"{ELO_CHECKPOINT_DIR}/matches_{year}.npz"
+
+
+async def load_season(tpa, year: int) -> Season:
+    """Every played official match of `year` as arrays, events in date order.
+
+    Finished seasons are read from disk after the first time.
+    """
+    if year < CURRENT_YEAR and os.path.exists(season_path(year)):
+        with np.load(season_path(year)) as data:
+            return Season(**{k: data[k] for k in Season._fields})
+
+    # One bulk stream per season instead of a round trip per event. Matches
+    # arrive interleaved, so bucket them and replay events in date order.
+    events = sort_events(
+        [e async for e in tpa.get_events_by_year(year=year) if is_official_event(e)]
+    )
+    event_matches = defaultdict(list)
+    async for match in tpa.get_events_matches(
+        year_start=year,
+        year_end=year,
+        event_types=list(EventType.SEASON_EVENT_TYPES),
+    ):
+        event_matches[match.event_key].append(match)
+
+    index = {}
+    red, blue, outcome = [], [], []
+    for bar, event in tqdm_bar(events):
+        bar.set_description(event.key.rjust(10))
+        for match in played_matches(event_matches[event.key]):
+            if not (match.alliances.red.team_keys and match.alliances.blue.team_keys):
+                continue
+
+            for alliance, rows in [
+                (match.alliances.red, red),
+                (match.alliances.blue, blue),
+            ]:
+                ids = [index.setdefault(k, len(index)) for k in alliance.team_keys]
+                rows.append((ids + [-1] * TEAM_SIZE)[:TEAM_SIZE])
+
+            if year == 2015:
+                diff = match.alliances.red.score - match.alliances.blue.score
+                outcome.append(int(np.sign(diff)))
+            else:
+                outcome.append({"red": 1, "blue": -1}.get(match.winning_alliance, 0))
+
+    season = Season(
+        keys=np.array(list(index), dtype=np.str_),
+        red=np.array(red, dtype=np.int32).reshape(-1, TEAM_SIZE),
+        blue=np.array(blue, dtype=np.int32).reshape(-1, TEAM_SIZE),
+        outcome=np.array(outcome, dtype=np.int8),
+    )
+    if year < CURRENT_YEAR:
+        create_dir_if_not_exists(ELO_CHECKPOINT_DIR)
+        np.savez(season_path(year), **season._asdict())
+
+    return season
+
+
+@expose
+async def generate(year_start: int = 2009, year_end: int = 2023, restart=False):
+    """Rate every official match from `year_start` through `year_end`.
+
+    Ratings are checkpointed after each finished season, so a rerun picks up
+    after the last checkpoint and only rates the seasons after it. `restart`
+    ignores the checkpoints.
+    """
+    ratings = Ratings()
+    start = year_start
+    if not restart:
+        while start <= year_end and os.path.exists(checkpoint_path(year_start, start)):
+            start += 1
+        if start > year_start:
+            ratings = Ratings.load(checkpoint_path(year_start, start - 1))
 
     async with tpa_cm() as tpa:
-        prev_year = None
-        async for event in all_events_with_bar(
-            tpa,
-            year_start=2009,
-            year_end=2023,
-            condition=is_official_event,
+        for year in range(start, year_end + 1):
+            season = await load_season(tpa, year)
+            if year > year_start:
+                ratings.new_season()
+
+            ratings.rate(season)
+            if year < CURRENT_YEAR:
+                create_dir_if_not_exists(ELO_CHECKPOINT_DIR)
+                ratings.save(checkpoint_path(year_start, year))
+
+    elos = defaultdict(dict)
+    for year in range(year_start, year_end + 1):
+        year_ratings = (
+            ratings
+            if year == year_end
+            else Ratings.load(checkpoint_path(year_start, year))
+        )
+        for k, mu, active in zip(
+            year_ratings.keys, year_ratings.mu, year_ratings.active
         ):
-            if prev_year is not None and event.year != prev_year:
-                for k in curr_ratings.keys():
-                    if active[k]:
-                        elos[k[3:]][prev_year] = curr_ratings[k].mu
-                        # v.pi *= (1 / (1.25 ** 2))
-
-                    curr_ratings[k] = ts.Rating(
-                        mu=curr_ratings[k].mu,
-                        sigma=(curr_ratings[k].sigma + ts.Rating().sigma) / 2,
-                    )
-
-                active = defaultdict(lambda: False)
-
-            async for match in tpa.get_event_matches(event_key=event.key):
-                red = [x for x in match.alliances.red.team_keys]
-                blue = [x for x in match.alliances.blue.team_keys]
-                red_ratings = [rating(x) for x in red]
-                blue_ratings = [rating(x) for x in blue]
-
-                for k in red + blue:
-                    active[k] = True
-
-                ranks = (
-                    [
-                        0 if match.winning_alliance in ["red", ""] else 1,
-                        0 if match.winning_alliance in ["blue", ""] else 1,
-                    ]
-                    if event.year != 2015
-                    else [
-                        0
-                        if match.alliances.red.score >= match.alliances.blue.score
-                        else 1,
-                        0
-                        if match.alliances.blue.score >= match.alliances.red.score
-                        else 1,
-                    ]
-                )
-
-                new_ratings = ts.rate([red_ratings, blue_ratings], ranks=ranks)
-
-                update_ratings(new_ratings, red, blue)
-
-            prev_year = event.year
-
-        for k, v in curr_ratings.items():
-            if active[k]:
-                elos[k[3:]][prev_year] = v.mu
-
-        with open("py/data/elos.json", "w+") as f:
-            json.dump(elos, fp=f, indent=4)
+            if active:
+                elos[k[3:]][year] = float(mu)
+
+    with open("py/data/elos.json", "w+") as f:
+        json.dump(elos, fp=f, indent=4)
@@ -2,12 +2,13 @@ import glob
 import json
 import os
 import random
-import statistics
 from collections import defaultdict
 from itertools import groupby
 from math import ceil, log
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+import numpy as np
+import rich
 import statbotics
 from betterproto import Casing
 from colorama import Fore
@@ -27,12 +28,23 @@ from protos.tpa import (
     Team,
     TeamSimple,
 )
+from py.balance import (
+    CountSpread,
+    DivisionStatSpread,
+    PairConstraints,
+    StrengthSpread,
+    anneal,
+)
 from py.cli import expose
-from py.sim import sim
+from py.montecarlo import alliance_indices
+from py.schedule_gen import balanced_assignment, qual_schedule, schedule_quality
+from py.sim import sim_many
 from py.tba import ROOKIE_YEAR_LOWEST_NUMBER, AwardType, EventType
+from py.team_features import team_strengths
 from py.tpa.context_manager import tpa_cm
 from py.util import (
-    MAX_TEAMS_PAGE_RANGE,
+    BALANCE_STEPS,
+    BALANCE_TIME_BUDGET_SECONDS,
     SHORT_TO_STATE,
     STATE_TO_SHORT,
     Leaderboard,
@@ -43,6 +55,7 @@ from py.util import (
     flatten_lists_async,
     get_real_event_schedule,
     get_savepath,
+    make_table,
     sort_events,
     tqdm_bar,
     tqdm_bar_async,
@@ -54,15 +67,15 @@ save_dir = get_savepath("fake_events")
 
 
 def make_schedule_pb(
-    id_to_team_map: Dict[int, Team], schedule_fp: str, event_key: str
+    id_to_team_map: Dict[int, Team], event_key: str, rounds: int = 10, seed: int = 0
 ) -> Schedule:
     schedule = Schedule(teams=list(id_to_team_map.values()))
-
-    with open(schedule_fp, "r") as f:
-        lines = [l.strip().split(",") for l in f.readlines()]
+    generated = qual_schedule(len(id_to_team_map), rounds, seed)
 
     matches = []
-    for match_num, line in enumerate(lines, start=1):
+    for match_num, (ids, surrogates) in enumerate(
+        zip(generated.teams.tolist(), generated.surrogate.tolist()), start=1
+    ):
         m = MatchSimple(
             event_key=event_key,
             key=f"{event_key}_qm{match_num}",
@@ -71,17 +84,16 @@ def make_schedule_pb(
             match_number=match_num,
         )
 
-        red_line = line[:6]
-        blue_line = line[6:]
-
         red_alliance = MatchAlliance()
         blue_alliance = MatchAlliance()
 
-        for line, alliance in [(red_line, red_alliance), (blue_line, blue_alliance)]:
-            for t_id, is_surrogate in zip(line[::2], line[1::2]):
-                alliance.team_keys.append(id_to_team_map[int(t_id)].key)
-                if is_surrogate == "1":
-                    alliance.surrogate_team_keys.append(id_to_team_map[int(t_id)].key)
+        for line, is_surrogate, alliance in zip(
+            ids, surrogates, [red_alliance, blue_alliance]
+        ):
+            for t_id, surrogate in zip(line, is_surrogate):
+                alliance.team_keys.append(id_to_team_map[t_id].key)
+                if surrogate:
+                    alliance.surrogate_team_keys.append(id_to_team_map[t_id].key)
 
         m.alliances = MatchSimpleAlliances(red=red_alliance, blue=blue_alliance)
         matches.append(m)
@@ -90,17 +102,25 @@ def make_schedule_pb(
     return schedule
 
 
+def balanced_id_map(
+    teams: List[Team], year: int, rounds: int = 10, seed: int = 0
+) -> Dict[int, Team]:
+    """Schedule ids for `teams` that even out strength of schedule."""
+    template = qual_schedule(len(teams), rounds, seed)
+    strength = team_strengths([t.key for t in teams], year)
+    order, _ = balanced_assignment(template.teams - 1, strength, seed=seed)
+    return {i: teams[j] for i, j in enumerate(order, start=1)}
+
+
 def generate_with_teams(
     team_list: List[TeamSimple], event_key: str, fname: str, num_matches=10
 ) -> Schedule:
-    schedule_filepath = f"schedules/{len(team_list)}_{num_matches}.csv"
     schedule = make_schedule_pb(
-        id_to_team_map={
-            i: t
-            for i, t in enumerate(random.sample(team_list, len(team_list)), start=1)
-        },
-        schedule_fp=schedule_filepath,
+        id_to_team_map=balanced_id_map(
+            team_list, int(event_key[:4]), rounds=num_matches
+        ),
         event_key=event_key,
+        rounds=num_matches,
     )
 
     with file_cm(save_dir + "/" + fname, "wb+") as f:
@@ -309,13 +329,8 @@ def create(team_list_filepath, name=None, key=None, city="City"):
     with open(team_list_filepath, "r") as f:
         teams = [Team(key=f"frc{t.strip()}", team_number=int(t)) for t in f.readlines()]
 
-    schedule_filepath = f"schedules/{len(teams)}_10.csv"
     schedule = make_schedule_pb(
-        id_to_team_map={
-            i: t for i, t in enumerate(random.sample(teams, len(teams)), start=1)
-        },
-        schedule_fp=schedule_filepath,
-        event_key=e.key,
+        id_to_team_map=balanced_id_map(teams, e.year), event_key=e.key
     )
 
     fe = FakeEvent(inner_event=e, schedule=schedule)
@@ -402,7 +417,13 @@ async def fair_divisions_gen(year: int, states: str, fraction: float = 0.35):
 
 
 @expose
-async def fair_divisions(in_fp, n_divs: int):
+async def fair_divisions(
+    in_fp,
+    n_divs: int,
+    seed: int = 0,
+    steps: int = BALANCE_STEPS,
+    time_budget: float = BALANCE_TIME_BUDGET_SECONDS,
+):
     # with file_cm(in_fp, "r") as f:
     #     lines = f.readlines()
 
@@ -441,54 +462,45 @@ async def fair_divisions(in_fp, n_divs: int):
         },
     }
 
-    def snr(teams: List[int]) -> float:
-        x = statistics.mean([perfs[t] for t in teams])
-        o = statistics.stdev([perfs[t] for t in teams])
-
-        return 10.0 * log((x * x) / (o * o))
+    def snr(values: np.ndarray) -> float:
+        return 10.0 * log(values.mean() ** 2 / values.var(ddof=1))
 
-    def top_quartile(teams: List[int]) -> List[int]:
-        return sorted(teams, key=lambda t: -perfs[t])[: int(round(len(teams) * 0.25))]
+    def top_quartile(values: np.ndarray) -> np.ndarray:
+        # At least two teams, or the sample variance in `snr` is NaN.
+        return -np.sort(-values)[: max(2, int(round(len(values) * 0.25)))]
 
-    valid = False
-    n = 0
-    while not valid:
-        random.shuffle(teams)
-        divs = [sorted(d) for d in chunkify(teams, n_divs)]
-        if n_divs == 1:
-            break
-
-        avgs = []
-        dists = []
-        top_dists = []
-
-        for div in divs:
-            d_avg = statistics.mean([perfs[t] for t in div])
-            d_snr = snr(div)
-            d_top_snr = snr(top_quartile(div))
-
-            avgs.append(d_avg)
-            dists.append(d_snr)
-            top_dists.append(d_top_snr)
-
-            if len(avgs) > (n_divs / 2):
-                for a in avgs:
-                    if abs(a - d_avg) > eval_limits["Average"][n_divs]:
-                        break
-                else:
-                    for d in dists:
-                        if abs(d - d_snr) > eval_limits["Distribution"][n_divs]:
-                            break
-                    else:
-                        for td in top_dists:
-                            if (
-                                abs(td - d_top_snr)
-                                > eval_limits["Top Distribution"][n_divs]
-                            ):
-                                break
-                        else:
-                            valid = True
-        n += 1
+    if n_divs == 1:
+        divs = [sorted(teams)]
+    else:
+        order = np.random.default_rng(seed).permutation(len(teams))
+        values = np.array([perfs[t] for t in teams], dtype=np.float64)
+        split = anneal(
+            initial=chunkify(order, n_divs),
+            objectives=[
+                DivisionStatSpread(
+                    "Average", values, np.mean, scale=eval_limits["Average"][n_divs]
+                ),
+                DivisionStatSpread(
+                    "Distribution",
+                    values,
+                    snr,
+                    scale=eval_limits["Distribution"][n_divs],
+                ),
+                DivisionStatSpread(
+                    "Top Distribution",
+                    values,
+                    lambda v: snr(top_quartile(v)),
+                    scale=eval_limits["Top Distribution"][n_divs],
+                ),
+            ],
+            steps=steps,
+            time_budget=time_budget,
+            seed=seed,
+        )
+        divs = [sorted(teams[i] for i in d) for d in split.divisions]
+        for name, score in split.scores.items():
+            limit = eval_limits[name][n_divs]
+            print(f"{name}: {score:.3f} (limit {limit})")
 
     def sort(x):
         s = sb.get_team_year(x, 2024)
@@ -505,12 +517,17 @@ async def fair_divisions(in_fp, n_divs: int):
 
 
 @expose
-async def create_and_sim_district(in_file: str, n_divs: int, prekey: str):
-    fair_divisions(in_file, n_divs)
+async def create_and_sim_district(
+    in_file: str, n_divs: int, prekey: str, iterations: int = 1000
+):
+    await fair_divisions(in_file, n_divs)
+    fe_fps = []
     for i in range(n_divs):
         k = f"{prekey}{i + 1}"
         create(f"out/divs/{i + 1}.txt", name=k, key=k)
-        await sim(f"out/fake_events/{k}/{k}_fe.pb")
+        fe_fps.append(f"out/fake_events/{k}/{k}_fe.pb")
+
+    await sim_many(fe_fps, iterations=iterations)
 
 
 @expose
@@ -566,7 +583,22 @@ async def geo_balance(in_file: str, n_divs: int):
 
 
 @expose
-async def geo_epa_balance(in_file: str, year: int, n_divs: int):
+async def geo_epa_balance(
+    in_file: str,
+    year: int,
+    n_divs: int,
+    seed: int = 0,
+    steps: int = BALANCE_STEPS,
+    time_budget: float = BALANCE_TIME_BUDGET_SECONDS,
+):
+    """Split teams into divisions with every region dealt out evenly and EPA
+    spread as evenly as possible.
+
+    This used to reshuffle until every division's EPA stdev was under 7 and the
+    stdev of the division medians at most 1. Now it minimizes the largest stdev
+    and the spread of medians instead (scaled by those limits), so it always
+    returns a split; whether that split meets the old limits is printed.
+    """
     n = 0
 
     with open(in_file, "r") as f:
@@ -587,56 +619,226 @@ async def geo_epa_balance(in_file: str, year: int, n_divs: int):
     async with tpa_cm() as tpa:
         all_teams = [t async for t in tpa.get_all_teams()]
 
+    teams = [t for t in all_teams if (t.team_number) in nums]
+    rng = np.random.default_rng(seed)
+
+    # Deal every region out round-robin, then only ever swap teams from the same
+    # region so that spread survives.
+    initial = [[] for _ in range(n_divs)]
+    for region_, teamlist in groupby(
+        sorted(range(len(teams)), key=lambda i: region(teams[i])),
+        lambda i: region(teams[i]),
+    ):
+        for i in rng.permutation(list(teamlist)):
+            initial[n % n_divs].append(int(i))
+            n += 1
+
+    values = np.array(
+        [team_epa_lookup[t.team_number]["epa_pre_champs"] for t in teams],
+        dtype=np.float64,
+    )
+    split = anneal(
+        initial=initial,
+        objectives=[
+            DivisionStatSpread(
+                "Max stdev",
+                values,
+                lambda v: v.std(ddof=1),
+                spread=np.max,
+                scale=7,
+            ),
+            DivisionStatSpread(
+                "Median stdev",
+                values,
+                np.median,
+                spread=lambda s: s.std(ddof=1),
+                scale=1,
+            ),
+        ],
+        groups=[region(t) for t in teams],
+        steps=steps,
+        time_budget=time_budget,
+        seed=seed,
+    )
+    divs = [[teams[i].team_number for i in d] for d in split.divisions]
+
     with open("out.csv", "w+") as f:
-        good = False
-        x = 0
-        teams = [t for t in all_teams if (t.team_number) in nums]
+        for name, score in split.scores.items():
+            print(f"{name}: {score:.3f}")
+            print(f"{name},{score}", file=f)
 
-        while not good:
-            maybe_good = True
-            divs = defaultdict(list)
-            x += 1
-            print(x)
+        meets = split.scores["Max stdev"] < 7 and split.scores["Median stdev"] <= 1
+        print(f"Meets the old limits: {meets}")
 
-            for region_, teamlist in groupby(
-                sorted(teams, key=lambda t: region(t)),
-                lambda t: region(t),
-            ):
-                teamlist = list(teamlist)
-                random.shuffle(teamlist)
+    with open("out_divs3.txt", "w+") as f:
+        for i in range(n_divs):
+            print(",".join([str(x) for x in sorted(divs[i])]), file=f)
+            if 2713 in divs[i]:
+                for x in sorted(divs[i]):
+                    print(x, file=f)
 
-                for team in teamlist:
-                    divs[n % n_divs].append(team.team_number)
-                    n += 1
 
-            median_epas = {}
-            for n in range(n_divs):
-                if not maybe_good:
-                    break
+@expose
+async def balance_divisions(
+    in_file: str,
+    year: int,
+    n_divs: int,
+    strength: str = "epa_end",
+    w_strength: float = 1.0,
+    w_region: float = 1.0,
+    w_rookie: float = 1.0,
+    w_constraints: float = 10.0,
+    constraints_file: Optional[str] = None,
+    seed: int = 0,
+    steps: int = BALANCE_STEPS,
+    time_budget: float = BALANCE_TIME_BUDGET_SECONDS,
+):
+    """Split teams into divisions on a weighted mix of strength, region spread,
+    rookie share and pairwise constraints.
+
+    `in_file` has one team number per line, optionally followed by a tab and its
+    district points, which `strength="points"` uses; otherwise `strength` names
+    a Statbotics team year field. `constraints_file` lines look like
+    `together 254 1678` or `apart 254 1678`.
+    """
+    with open(in_file, "r") as f:
+        rows = [line.strip().split("\t") for line in f if line.strip() != ""]
 
-                div = divs[n]
-                epas = [team_epa_lookup[n]["epa_pre_champs"] for n in div]
-                epas.sort()
-                median_epas[n] = statistics.median(epas)
+    nums = [int(r[0]) for r in rows]
+    async with tpa_cm() as tpa:
+        by_key = {
+            t.key: t
+            async for t in tpa.get_teams_by_keys(team_keys=[f"frc{n}" for n in nums])
+        }
+    teams = [by_key[f"frc{n}"] for n in nums]
+    index = {n: i for i, n in enumerate(nums)}
 
-                median = statistics.stdev(epas)
-                if median >= 7:
-                    maybe_good = False
+    if strength == "points":
+        values = np.array([float(r[1]) for r in rows])
+    else:
+        lookup = {
+            x["team"]: x[strength]
+            for i in range(0, 4)
+            for x in sb.get_team_years(year=year, limit=9999, offset=1000 * i)
+        }
+        # Teams Statbotics doesn't know get the average.
+        values = np.array([lookup.get(n) for n in nums], dtype=np.float64)
+        values[np.isnan(values)] = np.nanmean(values)
+
+    together, apart = [], []
+    if constraints_file is not None:
+        with open(constraints_file, "r") as f:
+            for line_num, line in enumerate(f, start=1):
+                if line.strip() == "":
+                    continue
 
-                print(median, end=",", file=f)
+                kind, *pair = line.split()
+                unknown = [n for n in pair if int(n) not in index]
+                if len(unknown) > 0:
+                    raise ValueError(
+                        f"{constraints_file}:{line_num}: team {unknown[0]} is not "
+                        f"in {in_file} ({line.strip()!r})"
+                    )
+
+                members = [index[int(n)] for n in pair]
+                pairs = [
+                    (x, y) for k, x in enumerate(members) for y in members[k + 1 :]
+                ]
+                (together if kind == "together" else apart).extend(pairs)
+
+    rookies = [t.rookie_year == year for t in teams]
+    objectives = [
+        # Every team equally strong: nothing to normalize by.
+        StrengthSpread(values, scale=values.std() or 1.0, weight=w_strength),
+        CountSpread("Region", [region(t) for t in teams], weight=w_region),
+    ]
+    if w_rookie > 0:
+        objectives.append(CountSpread("Rookies", rookies, weight=w_rookie))
+    objectives.append(PairConstraints(together, apart, weight=w_constraints))
+    objectives = [o for o in objectives if o.weight > 0]
+
+    split = anneal(
+        initial=chunkify(np.random.default_rng(seed).permutation(len(nums)), n_divs),
+        objectives=objectives,
+        steps=steps,
+        time_budget=time_budget,
+        seed=seed,
+    )
 
-            if maybe_good and statistics.stdev(list(median_epas.values())) > 1:
-                maybe_good = False
+    rich.print(
+        make_table(
+            col_names=["Objective", "Score", "Weight", "Cost"],
+            row_vals=[
+                [
+                    o.name,
+                    f"{o.score():.3f}",
+                    o.weight,
+                    f"{o.weight * o.score() / o.scale:.3f}",
+                ]
+                for o in objectives
+            ],
+        )
+    )
 
-            good = maybe_good
-            if maybe_good:
-                print(statistics.stdev(list(median_epas.values())), file=f)
-            else:
-                print("")
+    table = []
+    for i, div in enumerate(split.divisions, start=1):
+        v = values[div]
+        table.append(
+            [
+                i,
+                len(div),
+                round(float(v.mean()), 1),
+                round(float(v.std()), 1),
+                sum(rookies[t] for t in div),
+                len(set(region(teams[t]) for t in div)),
+            ]
+        )
 
-    with open("out_divs3.txt", "w+") as f:
-        for i in range(n_divs):
-            print(",".join([str(x) for x in sorted(divs[i])]), file=f)
-            if 2713 in divs[i]:
-                for x in sorted(divs[i]):
-                    print(x, file=f)
+        with file_cm(get_savepath(f"divs/{i}.txt"), "w+") as f:
+            for t in sorted(div, key=lambda t: -values[t]):
+                f.write(f"{nums[t]}\n")
+
+    rich.print(
+        make_table(
+            col_names=["Div", "Teams", "Mean", "SD", "Rookies", "Regions"],
+            row_vals=table,
+        )
+    )
+
+
+@expose
+async def schedule_report(event: str):
+    """How fair a qual schedule is: repeats, tightest turnaround and strength of
+    schedule. `event` is a real event key or a fake event's _fe.pb path."""
+    if event.endswith(".pb"):
+        with file_cm(event, "rb") as f:
+            fake_event = FakeEvent.FromString(f.read())
+        schedule, year = fake_event.schedule, fake_event.inner_event.year
+    else:
+        schedule, year = await get_real_event_schedule(event_key=event), int(event[:4])
+
+    keys = [t.key for t in schedule.teams]
+    matches = [m for m in schedule.matches if m.comp_level == "qm"]
+    teams = alliance_indices(matches, {k: i for i, k in enumerate(keys)})
+    quality = schedule_quality(teams, team_strengths(keys, year))
+
+    rich.print(
+        make_table(
+            col_names=["Partner repeats", "Opponent repeats", "Min gap", "SOS var"],
+            row_vals=[
+                [
+                    quality.partner_repeats,
+                    quality.opponent_repeats,
+                    quality.min_gap,
+                    round(quality.sos_variance, 4),
+                ]
+            ],
+        )
+    )
+    order = np.argsort(-quality.sos)
+    rich.print(
+        make_table(
+            col_names=["Team", "SOS"],
+            row_vals=[[keys[i][3:], round(float(quality.sos[i]), 3)] for i in order],
+        )
+    )
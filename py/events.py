@@ -675,8 +675,7 @@ async def regions_by_einstein():
             condition=lambda e: e.event_type == EventType.CMP_FINALS,
         ):
             async for alliance in tpa.get_event_alliances(event_key=event.key):
-                for tk in alliance.picks:
-                    team = await tpa.get_team(team_key=tk)
+                async for team in tpa.get_teams_by_keys(team_keys=alliance.picks):
                     if team.country == "USA":
                         counts[conv.get(team.state_prov, team.state_prov)] += 1
                     else:
@@ -5,7 +5,7 @@ from py.cli import expose
 from py.osrm import event_matrix, matrix
 from py.tba import EventType
 from py.tpa import tpa_cm
-from py.util import MAX_TEAMS_PAGE_NUM, flatten_lists_async, tqdm_bar_async
+from py.util import flatten_lists_async, tqdm_bar_async
 
 
 @expose
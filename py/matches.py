@@ -3,6 +3,7 @@ from itertools import combinations
 from pprint import pprint
 
 from rich import print
+from tqdm.asyncio import tqdm as atqdm
 
 from protos.tpa import WltRecord
 from py.cli import expose
@@ -32,30 +33,27 @@ async def teamups():
     records = defaultdict(lambda: WltRecord())
 
     async with tpa_cm() as tpa:
-        for year in range(2006, CURRENT_YEAR_RANGE):
-            for bar, event in tqdm_bar(
-                [
-                    e
-                    async for e in tpa.get_events_by_year(year=year)
-                    if e.event_type in EventType.SEASON_EVENT_TYPES
-                ]
-            ):
-                bar.set_description(event.key)
-                async for match in tpa.get_event_matches(event_key=event.key):
-                    for alliance in match.alliances.tied:
-                        for combo in combinations(alliance.team_keys, 2):
-                            combo = sort_combo(combo)
-                            records[combo].ties += 1
+        async for match in atqdm(
+            tpa.get_events_matches(
+                year_start=2006,
+                year_end=CURRENT_YEAR_RANGE - 1,
+                event_types=list(EventType.SEASON_EVENT_TYPES),
+            )
+        ):
+            for alliance in match.alliances.tied:
+                for combo in combinations(alliance.team_keys, 2):
+                    combo = sort_combo(combo)
+                    records[combo].ties += 1
 
-                    if match.winning_alliance == "":
-                        continue
+            if match.winning_alliance == "":
+                continue
 
-                    for combo in combinations(match.alliances.winner.team_keys, 2):
-                        combo = sort_combo(combo)
-                        records[combo].wins += 1
-                    for combo in combinations(match.alliances.loser.team_keys, 2):
-                        combo = sort_combo(combo)
-                        records[combo].losses += 1
+            for combo in combinations(match.alliances.winner.team_keys, 2):
+                combo = sort_combo(combo)
+                records[combo].wins += 1
+            for combo in combinations(match.alliances.loser.team_keys, 2):
+                combo = sort_combo(combo)
+                records[combo].losses += 1
 
     table = []
     for combo, record in wilson_sort(
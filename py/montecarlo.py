@@ -0,0 +1,314 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+from scipy import sparse
+
+from protos.tpa import Match
+from py.util import SIM_CHUNK_SAMPLES
+
+# Columns of a TeamModel: RP1 contribution, RP2 contribution, points.
+RP1, RP2, PTS = 0, 1, 2
+
+SEEDS = 8
+RANK_PERCENTILES = [5, 50, 95]
+
+
+class BracketMatch(NamedTuple):
+    comp_level: str
+    set_number: int
+    round: str
+    # "3" is the 3rd seed, "W2" / "L2" the winner / loser of the bracket's 2nd match.
+    red: str
+    blue: str
+    best_of: int
+
+
+BRACKETS = {
+    # 8 alliances, every round a best-of-3 series (through 2022).
+    "bo3": [
+        BracketMatch("qf", 1, "QF", "1", "8", 3),
+        BracketMatch("qf", 2, "QF", "4", "5", 3),
+        BracketMatch("qf", 3, "QF", "2", "7", 3),
+        BracketMatch("qf", 4, "QF", "3", "6", 3),
+        BracketMatch("sf", 1, "SF", "W1", "W2", 3),
+        BracketMatch("sf", 2, "SF", "W3", "W4", 3),
+        BracketMatch("f", 1, "F", "W5", "W6", 3),
+    ],
+    # 8 alliance double elimination (2023+), single games until a best-of-3 final.
+    "double": [
+        BracketMatch("sf", 1, "R1", "1", "8", 1),
+        BracketMatch("sf", 2, "R1", "4", "5", 1),
+        BracketMatch("sf", 3, "R1", "2", "7", 1),
+        BracketMatch("sf", 4, "R1", "3", "6", 1),
+        BracketMatch("sf", 5, "R2", "L1", "L2", 1),
+        BracketMatch("sf", 6, "R2", "L3", "L4", 1),
+        BracketMatch("sf", 7, "R2", "W1", "W2", 1),
+        BracketMatch("sf", 8, "R2", "W3", "W4", 1),
+        BracketMatch("sf", 9, "R3", "L7", "W6", 1),
+        BracketMatch("sf", 10, "R3", "L8", "W5", 1),
+        BracketMatch("sf", 11, "R4", "W7", "W8", 1),
+        BracketMatch("sf", 12, "R4", "W10", "W9", 1),
+        BracketMatch("sf", 13, "R5", "L11", "W12", 1),
+        BracketMatch("f", 1, "F", "W11", "W13", 3),
+    ],
+}
+
+
+class TeamModel(NamedTuple):
+    keys: List[str]
+    means: npt.NDArray[np.float64]  # (teams, 3)
+    variances: npt.NDArray[np.float64]  # (teams, 3)
+
+
+class QualSim(NamedTuple):
+    rps: npt.NDArray[np.float64]  # total over all iterations, per team
+    wins: npt.NDArray[np.int64]
+    ties: npt.NDArray[np.int64]
+    played: npt.NDArray[np.int64]
+    last_scores: npt.NDArray[np.int64]  # (matches, [red, blue]) of the last run
+    # (iterations, teams) final qual rank, 1-based; a .npy memmap if rank_path
+    ranks: Optional[npt.NDArray[np.unsignedinteger]]
+
+
+class PlayoffGame(NamedTuple):
+    red: int  # alliance (seed - 1)
+    blue: int
+    scores: npt.NDArray[np.int64]  # (games, [red, blue])
+    red_won: npt.NDArray[np.bool_]  # (games,), ties already broken
+
+
+class PlayoffSim(NamedTuple):
+    rounds: List[str]  # the bracket's rounds in order, then "Won"
+    # (alliances, rounds) P(still alive at or past that round). In double
+    # elimination that counts upper-bracket alliances skipping a lower round.
+    reach: npt.NDArray[np.float64]
+    last_run: List[PlayoffGame]  # one per BracketMatch, from the last iteration
+
+
+def team_model(
+    keys: List[str], histories: Dict[str, List[Tuple[float, float, float]]]
+) -> TeamModel:
+    """Per-team mean and variance of each component (RP1, RP2, points).
+
+    Teams with fewer than two observations borrow the component's variance over
+    every observation of `keys`, and teams with none get a mean of 0.
+    """
+    observed = [np.asarray(histories[k], dtype=np.float64).reshape(-1, 3) for k in keys]
+    everything = np.concatenate(observed)
+    pooled = everything.var(axis=0) if len(everything) > 0 else np.zeros(3)
+
+    means = np.zeros((len(keys), 3))
+    variances = np.tile(pooled, (len(keys), 1))
+    for i, obs in enumerate(observed):
+        if len(obs) > 0:
+            means[i] = obs.mean(axis=0)
+        if len(obs) > 1:
+            variances[i] = obs.var(axis=0)
+
+    return TeamModel(keys=keys, means=means, variances=variances)
+
+
+def alliance_indices(
+    matches: List[Match], index: Dict[str, int]
+) -> npt.NDArray[np.int64]:
+    """(matches, [red, blue], teams per alliance) array of TeamModel rows."""
+    return np.array(
+        [
+            [
+                [index[k] for k in a.team_keys]
+                for a in [m.alliances.red, m.alliances.blue]
+            ]
+            for m in matches
+        ],
+        dtype=np.int64,
+    )
+
+
+def alliance_incidence(alliances: npt.NDArray[np.int64], n: int) -> sparse.csr_matrix:
+    rows = np.repeat(np.arange(alliances.shape[0] * 2), alliances.shape[2])
+    return sparse.csr_matrix(
+        (np.ones(alliances.size), (rows, alliances.ravel())),
+        shape=(alliances.shape[0] * 2, n),
+    )
+
+
+def rank_storage(
+    iterations: int, n: int, path: Optional[str] = None
+) -> npt.NDArray[np.unsignedinteger]:
+    dtype = np.uint8 if n < 256 else np.uint16
+    if path is None:
+        return np.empty((iterations, n), dtype=dtype)
+
+    return np.lib.format.open_memmap(
+        path, mode="w+", dtype=dtype, shape=(iterations, n)
+    )
+
+
+def simulate_quals(
+    model: TeamModel,
+    alliances: npt.NDArray[np.int64],
+    thresholds: Tuple[float, float],
+    iterations: int,
+    score_rp: bool = False,
+    seed: Union[None, int, np.random.SeedSequence] = None,
+    rank_path: Optional[str] = None,
+) -> QualSim:
+    """Play the schedule `iterations` times.
+
+    Each alliance's RP1 / RP2 / points are drawn from a normal with the summed
+    means and variances of its teams; an RP is awarded when the draw clears its
+    threshold. Wins are worth 2 RP and ties 1, or the alliance score when
+    `score_rp` (2015). Iterations are drawn in chunks of ~SIM_CHUNK_SAMPLES.
+
+    Every iteration's final ranking (RP, ties broken at random) is kept in a
+    uint8 (uint16 past 255 teams) matrix, written straight to a .npy memmap at
+    `rank_path` if given.
+    """
+    rng = np.random.default_rng(seed)
+    n_matches = alliances.shape[0]
+    n = len(model.keys)
+    incidence_t = alliance_incidence(alliances, n).T.tocsr()
+    ranks = rank_storage(iterations, n, rank_path)
+
+    mean = model.means[alliances].sum(axis=2)  # (matches, 2, 3)
+    sd = np.sqrt(model.variances[alliances].sum(axis=2))
+    chunk = max(1, SIM_CHUNK_SAMPLES // mean.size)
+
+    rps = np.zeros(len(model.keys))
+    wins = np.zeros(len(model.keys), dtype=np.int64)
+    ties = np.zeros(len(model.keys), dtype=np.int64)
+    last_scores = np.zeros((n_matches, 2), dtype=np.int64)
+    for start in range(0, iterations, chunk):
+        k = min(chunk, iterations - start)
+        draws = rng.normal(mean, sd, size=(k,) + mean.shape)
+
+        scores = np.rint(draws[..., PTS])  # (k, matches, 2)
+        opp_scores = scores[..., ::-1]
+        won = scores > opp_scores
+        tied = scores == opp_scores
+
+        rp = (draws[..., RP1] > thresholds[0]).astype(np.float64)
+        rp += draws[..., RP2] > thresholds[1]
+        rp += np.where(won | tied, scores, 0) if score_rp else 2 * won + tied
+
+        team_rp = (incidence_t @ rp.reshape(k, -1).T).T  # (k, teams)
+        rps += team_rp.sum(axis=0)
+
+        # RP totals are whole numbers, so < 1 of noise only reorders ties.
+        order = np.argsort(-(team_rp + 0.5 * rng.random(team_rp.shape)), axis=1)
+        np.put_along_axis(
+            ranks[start : start + k],
+            order,
+            np.arange(1, n + 1, dtype=ranks.dtype)[None, :],
+            axis=1,
+        )
+
+        wins += (incidence_t @ won.reshape(k, -1).sum(axis=0)).astype(np.int64)
+        ties += (incidence_t @ tied.reshape(k, -1).sum(axis=0)).astype(np.int64)
+        last_scores = scores[-1].astype(np.int64)
+
+    played = iterations * np.asarray(incidence_t.sum(axis=1)).ravel().astype(np.int64)
+    if isinstance(ranks, np.memmap):
+        ranks.flush()
+
+    return QualSim(
+        rps=rps,
+        wins=wins,
+        ties=ties,
+        played=played,
+        last_scores=last_scores,
+        ranks=ranks,
+    )
+
+
+def rank_probabilities(
+    ranks: npt.NDArray[np.unsignedinteger], chunk: int = 65536
+) -> npt.NDArray[np.float64]:
+    """(teams, ranks) matrix of P(team finishes at rank r + 1)."""
+    iterations, n = ranks.shape
+    counts = np.zeros(n * n, dtype=np.int64)
+    offsets = np.arange(n, dtype=np.int64) * n - 1
+    for start in range(0, iterations, chunk):
+        block = ranks[start : start + chunk].astype(np.int64) + offsets
+        counts += np.bincount(block.ravel(), minlength=n * n)
+
+    return counts.reshape(n, n) / max(iterations, 1)
+
+
+def rank_percentiles(
+    probs: npt.NDArray[np.float64], percentiles: Sequence[float] = RANK_PERCENTILES
+) -> npt.NDArray[np.int64]:
+    """(teams, percentiles) ranks; e.g. the 95th is the rank a team beats 95%
+    of the time at worst."""
+    cdf = np.cumsum(probs, axis=1)
+    return np.stack(
+        [(cdf < p / 100 - 1e-9).sum(axis=1) + 1 for p in percentiles], axis=1
+    )
+
+
+def simulate_playoffs(
+    model: TeamModel,
+    alliances: npt.NDArray[np.int64],
+    bracket: List[BracketMatch],
+    iterations: int,
+    seed: Union[None, int, np.random.SeedSequence] = None,
+) -> PlayoffSim:
+    """Play `bracket` `iterations` times between `alliances` ((seeds, teams)
+    TeamModel rows, best seed first).
+
+    Games use the qual score model: each alliance's points are a normal with its
+    teams' summed means and variances. Ties go either way with equal odds, in
+    place of the game's tiebreakers. A series is won by the majority of its
+    `best_of` games, so every game is drawn up front and all iterations of a
+    bracket match are played at once.
+    """
+    rng = np.random.default_rng(seed)
+    n = alliances.shape[0]
+    mean = model.means[alliances, PTS].sum(axis=1)  # (alliances,)
+    sd = np.sqrt(model.variances[alliances, PTS].sum(axis=1))
+
+    rounds = list(dict.fromkeys(b.round for b in bracket)) + ["Won"]
+    # Index of the latest round each alliance played in, per iteration.
+    furthest = np.full((n, iterations), -1, dtype=np.int64)
+    runs = np.arange(iterations)
+    winners = []  # type: List[npt.NDArray[np.int64]]
+    losers = []  # type: List[npt.NDArray[np.int64]]
+    last_run = []  # type: List[PlayoffGame]
+
+    def source(s: str) -> npt.NDArray[np.int64]:
+        if s[0] == "W":
+            return winners[int(s[1:]) - 1]
+        if s[0] == "L":
+            return losers[int(s[1:]) - 1]
+        return np.full(iterations, int(s) - 1, dtype=np.int64)
+
+    for b in bracket:
+        red, blue = source(b.red), source(b.blue)
+        r = rounds.index(b.round)
+        furthest[red, runs] = r
+        furthest[blue, runs] = r
+
+        sides = np.stack([red, blue])  # (2, iterations)
+        scores = np.rint(
+            rng.normal(mean[sides], sd[sides], size=(b.best_of, 2, iterations))
+        )
+        tied = scores[:, 0] == scores[:, 1]
+        red_won = (scores[:, 0] > scores[:, 1]) | (
+            tied & (rng.random(tied.shape) < 0.5)
+        )
+        series = 2 * red_won.sum(axis=0) > b.best_of
+        winners.append(np.where(series, red, blue))
+        losers.append(np.where(series, blue, red))
+        last_run.append(
+            PlayoffGame(
+                red=int(red[-1]),
+                blue=int(blue[-1]),
+                scores=scores[..., -1].astype(np.int64),
+                red_won=red_won[:, -1],
+            )
+        )
+
+    furthest[winners[-1], runs] = len(rounds) - 1
+    reach = (furthest[:, None, :] >= np.arange(len(rounds))[None, :, None]).mean(axis=2)
+    return PlayoffSim(rounds=rounds, reach=reach, last_run=last_run)
@@ -0,0 +1,292 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import betterproto
+import numpy as np
+import numpy.typing as npt
+from scipy import linalg, optimize, sparse
+
+from protos.tpa import Match
+from py.util import OPR_FACTORIZATION_CACHE_SIZE, OPR_RIDGE_ALPHA
+
+ComponentFn = Callable[[Match, str], float]
+Bounds = Tuple[Optional[float], Optional[float]]
+
+COLORS = ["red", "blue"]
+
+# "ls": plain least squares (min-norm when under-determined)
+# "ridge": least squares + alpha * |x|^2, shrinks thinly-scheduled teams to 0
+# "l1": least absolute deviations, solved as a linear program
+# "nnls": least squares with every contribution >= 0
+SOLVER_MODES = ["ls", "ridge", "l1", "nnls"]
+
+
+def team_sort_key(team_key: str) -> Tuple[int, str]:
+    # "frc254" < "frc1114" < "frc1114B" without choking on B/C team suffixes.
+    return len(team_key), team_key
+
+
+def played_matches(matches: List[Match]) -> List[Match]:
+    return [m for m in matches if m.alliances.blue.score != -1]
+
+
+class Factorization:
+    """Factorized normal matrix (A^T A) of one design.
+
+    Cholesky when the schedule pins every team down, otherwise the
+    pseudo-inverse so under-determined schedules still get the min-norm answer.
+    """
+
+    def __init__(self, normal: npt.NDArray[np.float64]) -> None:
+        self.cho = None
+        self.pinv = None
+        try:
+            self.cho = linalg.cho_factor(normal)
+        except linalg.LinAlgError:
+            pass
+        else:
+            # A singular normal matrix can still squeak through with a ~0 pivot.
+            diag = np.abs(np.diag(self.cho[0]))
+            if diag.min() <= np.sqrt(np.finfo(np.float64).eps) * diag.max():
+                self.cho = None
+
+        if self.cho is None:
+            self.pinv = np.linalg.pinv(normal)
+
+    def solve(self, rhs: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        if self.cho is not None:
+            return linalg.cho_solve(self.cho, rhs)
+
+        return self.pinv @ rhs
+
+
+# Keyed by the design itself (teams + alliance rows), so every event / match set
+# is factorized once no matter how many components are solved against it.
+factorizations: "OrderedDict[tuple, Factorization]" = OrderedDict()
+
+
+class OPRDesign:
+    """Alliance-by-team incidence matrix for one set of matches.
+
+    Row 2i is match i's red alliance and row 2i + 1 its blue one; column j is
+    `teams[j]`. Plain OPR, component OPRs and every breakdown field are all
+    least-squares solves against this one matrix with different right-hand
+    sides, so they can be solved together.
+    """
+
+    def __init__(
+        self, alliances: Sequence[Sequence[str]], teams: Optional[List[str]] = None
+    ) -> None:
+        if teams is None:
+            teams = sorted({t for a in alliances for t in a}, key=team_sort_key)
+
+        self.teams = teams
+        self.index = {t: i for i, t in enumerate(teams)}
+
+        sizes = [len(a) for a in alliances]
+        rows = np.repeat(np.arange(len(alliances)), sizes)
+        cols = np.fromiter(
+            (self.index[t] for a in alliances for t in a),
+            dtype=np.int64,
+            count=sum(sizes),
+        )
+        self.a = sparse.csr_matrix(
+            (np.ones(len(cols)), (rows, cols)), shape=(len(alliances), len(teams))
+        )
+        self.key = (tuple(teams), self.a.indptr.tobytes(), self.a.indices.tobytes())
+
+    @classmethod
+    def from_matches(
+        cls, matches: List[Match], teams: Optional[List[str]] = None
+    ) -> "OPRDesign":
+        return cls(
+            [
+                getattr(m.alliances, c).team_keys
+                for m in played_matches(matches)
+                for c in COLORS
+            ],
+            teams=teams,
+        )
+
+    def solve(
+        self,
+        targets: npt.NDArray[np.float64],
+        mode: str = "ls",
+        alpha: float = OPR_RIDGE_ALPHA,
+        bounds: Bounds = (None, None),
+    ) -> npt.NDArray[np.float64]:
+        """Solve every column of `targets` (one row per alliance) at once.
+
+        Returns a (teams x components) array. None of the modes raise on
+        singular schedules: "ls" falls back to the minimum-norm answer and the
+        others are well-posed regardless. `bounds` only applies to "l1".
+        """
+        targets = targets.reshape(self.a.shape[0], -1)
+        if mode == "ls":
+            return self.factorization().solve(self.a.T @ targets)
+        if mode == "ridge":
+            return self.factorization(alpha).solve(self.a.T @ targets)
+        if mode == "l1":
+            return np.stack([self.solve_l1(y, bounds) for y in targets.T], axis=1)
+        if mode == "nnls":
+            a = self.a.toarray()
+            return np.stack([optimize.nnls(a, y)[0] for y in targets.T], axis=1)
+
+        raise ValueError(f"unknown OPR solver mode {mode!r}, expected {SOLVER_MODES}")
+
+    def solve_l1(self, y: npt.NDArray[np.float64], bounds: Bounds) -> np.ndarray:
+        # min sum(t)  s.t.  -t <= Ax - y <= t, over [x (teams), t (alliances)].
+        rows, n = self.a.shape
+        eye = sparse.identity(rows, format="csr")
+        res = optimize.linprog(
+            c=np.concatenate([np.zeros(n), np.ones(rows)]),
+            A_ub=sparse.vstack(
+                [sparse.hstack([self.a, -eye]), sparse.hstack([-self.a, -eye])]
+            ).tocsr(),
+            b_ub=np.concatenate([y, -y]),
+            bounds=[bounds] * n + [(0, None)] * rows,
+            method="highs",
+        )
+        if res.status != 0:
+            raise ValueError(f"L1 OPR failed: {res.message}")
+
+        return res.x[:n]
+
+    def factorization(self, alpha: float = 0.0) -> Factorization:
+        key = (self.key, alpha)
+        if key in factorizations:
+            factorizations.move_to_end(key)
+            return factorizations[key]
+
+        normal = (self.a.T @ self.a).toarray()
+        f = Factorization(normal + alpha * np.eye(len(self.teams)))
+        factorizations[key] = f
+        if len(factorizations) > OPR_FACTORIZATION_CACHE_SIZE:
+            factorizations.popitem(last=False)
+
+        return f
+
+    def as_dict(self, x: npt.NDArray[np.float64]) -> Dict[str, float]:
+        return {t: float(v) for t, v in zip(self.teams, x)}
+
+
+class IncrementalOPR:
+    """Component OPRs that follow a live event one match at a time.
+
+    Until the schedule pins every team down this just re-solves (only a handful
+    of matches, so that's cheap). From then on each new match is folded into
+    (A^T A)^-1 and the solution with a rank-2 Woodbury update, which is O(n^2)
+    per match instead of a fresh factorization.
+    """
+
+    def __init__(
+        self, component_fns: Sequence[ComponentFn], teams: Optional[List[str]] = None
+    ) -> None:
+        self.component_fns = component_fns
+        self.fixed_teams = teams
+        self.matches = []  # type: List[Match]
+        self.seen = set()
+        self.teams = []  # type: List[str]
+        self.index = {}  # type: Dict[str, int]
+        self.p = None  # type: Optional[npt.NDArray[np.float64]]
+        self.x = None  # type: Optional[npt.NDArray[np.float64]]
+
+    def update(self, matches: List[Match]) -> bool:
+        """Fold in played matches not seen yet; returns whether anything changed."""
+        new = [m for m in played_matches(matches) if m.key not in self.seen]
+        if len(new) == 0:
+            return False
+
+        self.seen.update(m.key for m in new)
+        self.matches.extend(new)
+
+        new_teams = {
+            t
+            for m in new
+            for c in COLORS
+            for t in getattr(m.alliances, c).team_keys
+            if t not in self.index
+        }
+        if self.fixed_teams is not None:
+            # Teams missing from the given list get added, as they would be
+            # without one.
+            unknown = new_teams.difference(self.fixed_teams)
+            self.fixed_teams = self.fixed_teams + sorted(unknown, key=team_sort_key)
+
+        if self.p is None or new_teams:
+            self.resolve()
+        else:
+            for m in new:
+                self.apply(m)
+
+        return True
+
+    def resolve(self) -> None:
+        design = OPRDesign.from_matches(self.matches, teams=self.fixed_teams)
+        self.teams = design.teams
+        self.index = design.index
+        self.x = design.solve(component_targets(self.matches, self.component_fns))
+
+        f = design.factorization()
+        self.p = (
+            None if f.cho is None else linalg.cho_solve(f.cho, np.eye(len(self.teams)))
+        )
+
+    def apply(self, match: Match) -> None:
+        u = np.zeros((len(self.teams), len(COLORS)))
+        for j, c in enumerate(COLORS):
+            for t in getattr(match.alliances, c).team_keys:
+                u[self.index[t], j] = 1
+
+        y = component_targets([match], self.component_fns)
+        pu = self.p @ u
+        gain = pu @ np.linalg.inv(np.eye(len(COLORS)) + u.T @ pu)
+        self.x += gain @ (y - u.T @ self.x)
+        self.p -= gain @ pu.T
+
+    def as_dict(self, component: int = 0) -> Dict[str, float]:
+        if self.x is None:
+            return {}
+
+        return {t: float(v) for t, v in zip(self.teams, self.x[:, component])}
+
+
+def component_targets(
+    matches: List[Match], component_fns: Sequence[ComponentFn]
+) -> npt.NDArray[np.float64]:
+    return np.array(
+        [
+            [float(fn(m, c)) for fn in component_fns]
+            for m in played_matches(matches)
+            for c in COLORS
+        ],
+        dtype=np.float64,
+    ).reshape(-1, len(component_fns))
+
+
+def breakdown_targets(
+    matches: List[Match],
+) -> Tuple[List[str], npt.NDArray[np.float64]]:
+    """Every numeric score breakdown field, one column each."""
+    rows = []
+    for m in played_matches(matches):
+        _, sb = betterproto.which_one_of(m, "score_breakdown")
+        for c in COLORS:
+            rows.append(
+                {}
+                if sb is None
+                else getattr(sb, c).to_dict(
+                    casing=betterproto.Casing.SNAKE, include_default_values=True
+                )
+            )
+
+    names = []
+    for row in rows:
+        if len(row) > 0:
+            names = [k for k, v in row.items() if type(v) in [int, float]]
+            break
+
+    targets = np.array(
+        [[float(row.get(k, 0)) for k in names] for row in rows], dtype=np.float64
+    ).reshape(-1, len(names))
+    return names, targets
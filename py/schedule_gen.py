@@ -0,0 +1,285 @@
+import functools
+import os
+from math import ceil, exp
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from py.montecarlo import alliance_incidence
+from py.util import SCHEDULE_CACHE_SIZE, SCHEDULE_CANDIDATES, SCHEDULE_STEPS
+
+TEAMS_PER_MATCH = 6
+TEAMS_PER_ALLIANCE = 3
+
+# Pre-generated {teams}_{rounds}.csv schedules, 18-100 teams and 1-14 rounds.
+SCHEDULES_DIR = "schedules"
+
+# Relative cost of a repeated partner, a repeated opponent and each match short
+# of the minimum turnaround between a team's matches.
+PARTNER_WEIGHT = 3.0
+OPPONENT_WEIGHT = 1.0
+GAP_WEIGHT = 10.0
+
+
+class GeneratedSchedule(NamedTuple):
+    # (matches, [red, blue], teams per alliance) team ids, 1-based.
+    teams: npt.NDArray[np.int16]
+    surrogate: npt.NDArray[np.bool_]
+
+
+class ScheduleQuality(NamedTuple):
+    partner_repeats: int  # extra pairings beyond the first, summed over pairs
+    opponent_repeats: int
+    min_gap: int  # fewest matches between two of a team's matches
+    sos: npt.NDArray[np.float64]  # per team, see `pairings`
+    sos_variance: float
+
+
+def min_gap(n_teams: int) -> int:
+    # What the old pre-generated schedules managed: 2 for 18 teams, 8 for 100.
+    return max(2, round(n_teams / 12))
+
+
+class ScheduleSearch:
+    """Local search over a qual schedule, one slot swap at a time.
+
+    `slots[m, c]` is the team in column c of match m, red being columns 0-2.
+    Partner / opponent counts and each team's match list are kept up to date so
+    a swap only rescores the pairs and turnarounds it touches.
+    """
+
+    def __init__(self, slots: npt.NDArray[np.int64], n_teams: int) -> None:
+        # Plain lists: this is all scalar work, where numpy indexing is slow.
+        self.slots: List[List[int]] = slots.tolist()
+        self.gap = min_gap(n_teams)
+        self.partners = [[0] * n_teams for _ in range(n_teams)]
+        self.opponents = [[0] * n_teams for _ in range(n_teams)]
+        self.appearances: List[List[int]] = [[] for _ in range(n_teams)]
+        self.cost = 0.0
+        for m, match in enumerate(self.slots):
+            for c, t in enumerate(match):
+                self.appearances[t].append(m)
+                self.cost += self.pair_delta(m, c, t, 1, after=c)
+
+        self.cost += sum(self.gap_cost(t) for t in range(n_teams))
+
+    def pair_delta(self, m: int, c: int, t: int, sign: int, after: int = -1) -> float:
+        # Adds (sign 1) or removes (sign -1) t's pairings with the rest of match m.
+        delta = 0.0
+        for other_c in range(after + 1, TEAMS_PER_MATCH):
+            o = self.slots[m][other_c]
+            if other_c == c or o < 0:
+                continue
+
+            same = other_c // TEAMS_PER_ALLIANCE == c // TEAMS_PER_ALLIANCE
+            counts = self.partners if same else self.opponents
+            old = counts[t][o]
+            new = old + sign
+            weight = PARTNER_WEIGHT if same else OPPONENT_WEIGHT
+            delta += weight * (new * (new - 1) - old * (old - 1)) / 2
+            counts[t][o] = counts[o][t] = new
+
+        return delta
+
+    def gap_cost(self, t: int) -> float:
+        ms = self.appearances[t]
+        return GAP_WEIGHT * sum(
+            max(0, self.gap - (b - a)) ** 2 for a, b in zip(ms, ms[1:])
+        )
+
+    def swap(self, m1: int, c1: int, m2: int, c2: int) -> float:
+        """Swap two slots and return the change in cost."""
+        x, y = self.slots[m1][c1], self.slots[m2][c2]
+        delta = -self.gap_cost(x) - self.gap_cost(y)
+        delta += self.pair_delta(m1, c1, x, -1)
+        self.slots[m1][c1] = -1
+        delta += self.pair_delta(m2, c2, y, -1)
+        self.slots[m2][c2] = x
+        delta += self.pair_delta(m2, c2, x, 1)
+        self.slots[m1][c1] = y
+        delta += self.pair_delta(m1, c1, y, 1)
+
+        if m1 != m2:
+            self.appearances[x].remove(m1)
+            self.appearances[y].remove(m2)
+            self.appearances[x].append(m2)
+            self.appearances[y].append(m1)
+            self.appearances[x].sort()
+            self.appearances[y].sort()
+
+        delta += self.gap_cost(x) + self.gap_cost(y)
+        self.cost += delta
+        return delta
+
+    def run(self, steps: int, rng: np.random.Generator) -> None:
+        n_matches = len(self.slots)
+        t_start, t_end = 2.0, 0.02
+        moves = rng.integers(
+            [n_matches, TEAMS_PER_MATCH, n_matches, TEAMS_PER_MATCH], size=(steps, 4)
+        ).tolist()
+        coins = rng.random(steps).tolist()
+        for step, (m1, c1, m2, c2) in enumerate(moves):
+            x, y = self.slots[m1][c1], self.slots[m2][c2]
+            if x == y or (m1 != m2 and (x in self.slots[m2] or y in self.slots[m1])):
+                continue
+            if m1 == m2 and c1 // TEAMS_PER_ALLIANCE == c2 // TEAMS_PER_ALLIANCE:
+                continue
+
+            delta = self.swap(m1, c1, m2, c2)
+            temp = t_start * (t_end / t_start) ** (step / steps)
+            if delta > 0 and coins[step] >= exp(-delta / temp):
+                self.swap(m1, c1, m2, c2)
+
+
+def initial_slots(
+    n_teams: int, rounds: int, rng: np.random.Generator
+) -> npt.NDArray[np.int64]:
+    """Teams dealt out a shuffled round at a time, never twice in one match.
+
+    Slots left over in the last match go to the first teams of one more round;
+    those teams play a surrogate match.
+    """
+    n_matches = ceil(n_teams * rounds / TEAMS_PER_MATCH)
+    extra = n_matches * TEAMS_PER_MATCH - n_teams * rounds
+    stream = [int(t) for _ in range(rounds) for t in rng.permutation(n_teams)]
+    stream += [int(t) for t in rng.permutation(n_teams)[:extra]]
+
+    for start in range(0, len(stream), TEAMS_PER_MATCH):
+        for i in range(start, start + TEAMS_PER_MATCH):
+            if stream[i] not in stream[start:i]:
+                continue
+
+            # Pull the next team that isn't already in this match forward.
+            for j in range(start + TEAMS_PER_MATCH, len(stream)):
+                if stream[j] not in stream[start : start + TEAMS_PER_MATCH]:
+                    stream[i], stream[j] = stream[j], stream[i]
+                    break
+
+    return np.array(stream, dtype=np.int64).reshape(n_matches, TEAMS_PER_MATCH)
+
+
+@functools.lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def generate_schedule(n_teams: int, rounds: int, seed: int = 0) -> GeneratedSchedule:
+    """A qual schedule where every team plays `rounds` matches.
+
+    Repeated partners and opponents and short turnarounds are minimized by
+    simulated annealing. When the slots don't divide evenly, a few teams play
+    once more, with their third match marked as a surrogate one, as FIRST does.
+    The pre-generated tables have fewer repeats at most sizes, so `qual_schedule`
+    only falls back to this for sizes they don't cover.
+
+    Cached by (teams, rounds, seed); the arrays are shared, so read-only.
+    """
+    if n_teams < TEAMS_PER_MATCH:
+        raise ValueError(f"need at least {TEAMS_PER_MATCH} teams, got {n_teams}")
+
+    rng = np.random.default_rng(seed)
+    search = ScheduleSearch(initial_slots(n_teams, rounds, rng), n_teams)
+    search.run(SCHEDULE_STEPS * n_teams * rounds // TEAMS_PER_MATCH, rng)
+
+    surrogate = np.zeros((len(search.slots), TEAMS_PER_MATCH), dtype=np.bool_)
+    for t, ms in enumerate(search.appearances):
+        if len(ms) > rounds:
+            m = ms[min(2, len(ms) - 1)]
+            surrogate[m, search.slots[m].index(t)] = True
+
+    shape = (-1, 2, TEAMS_PER_ALLIANCE)
+    teams = (np.array(search.slots) + 1).astype(np.int16).reshape(shape)
+    surrogate = surrogate.reshape(shape)
+    teams.setflags(write=False)
+    surrogate.setflags(write=False)
+    return GeneratedSchedule(teams=teams, surrogate=surrogate)
+
+
+@functools.lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def table_schedule(n_teams: int, rounds: int) -> Optional[GeneratedSchedule]:
+    """schedules/{teams}_{rounds}.csv if there is one. Each line is a match:
+    (team id, is surrogate) pairs for red, then for blue."""
+    path = f"{SCHEDULES_DIR}/{n_teams}_{rounds}.csv"
+    if not os.path.exists(path):
+        return None
+
+    cells = np.loadtxt(path, delimiter=",", dtype=np.int64, ndmin=2)
+    cells = cells.reshape(-1, 2, TEAMS_PER_ALLIANCE, 2)
+    teams = cells[..., 0].astype(np.int16)
+    surrogate = cells[..., 1].astype(np.bool_)
+    teams.setflags(write=False)
+    surrogate.setflags(write=False)
+    return GeneratedSchedule(teams=teams, surrogate=surrogate)
+
+
+def qual_schedule(n_teams: int, rounds: int, seed: int = 0) -> GeneratedSchedule:
+    """The pre-generated schedule for this size, else a generated one (`seed`
+    only matters then)."""
+    table = table_schedule(n_teams, rounds)
+    if table is not None:
+        return table
+
+    return generate_schedule(n_teams, rounds, seed)
+
+
+def pairings(
+    teams: npt.NDArray[np.integer], n_teams: int
+) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """(partners, opponents, appearances) counts of a (matches, 2, 3) schedule
+    of 0-based team ids, from its red / blue incidence matrices."""
+    inc = alliance_incidence(np.asarray(teams, dtype=np.int64), n_teams)
+    red, blue = inc[0::2], inc[1::2]
+    partners = (red.T @ red + blue.T @ blue).toarray().astype(np.int64)
+    opponents = (red.T @ blue + blue.T @ red).toarray().astype(np.int64)
+    appearances = partners.diagonal().copy()
+    np.fill_diagonal(partners, 0)
+    return partners, opponents, appearances
+
+
+def sos_matrix(teams: npt.NDArray[np.integer], n_teams: int) -> npt.NDArray[np.float64]:
+    """(teams, teams) weights turning strengths into each team's strength of
+    schedule: the average strength it faced per match, less the average help it
+    got from its partners."""
+    partners, opponents, appearances = pairings(teams, n_teams)
+    return (opponents - partners) / np.maximum(appearances, 1)[:, None]
+
+
+def schedule_quality(
+    teams: npt.NDArray[np.integer], strength: npt.NDArray[np.float64]
+) -> ScheduleQuality:
+    n = len(strength)
+    partners, opponents, appearances = pairings(teams, n)
+
+    matches_of = np.argsort(
+        np.asarray(teams).reshape(len(teams), -1), axis=None, kind="stable"
+    )
+    flat = np.asarray(teams).ravel()[matches_of]
+    gaps = np.diff(matches_of // TEAMS_PER_MATCH)[np.diff(flat) == 0]
+
+    sos = sos_matrix(teams, n) @ strength
+    return ScheduleQuality(
+        partner_repeats=int(np.triu(np.maximum(partners - 1, 0), 1).sum()),
+        opponent_repeats=int(np.triu(np.maximum(opponents - 1, 0), 1).sum()),
+        min_gap=int(gaps.min()) if len(gaps) > 0 else 0,
+        sos=sos,
+        sos_variance=float(sos.var()),
+    )
+
+
+def balanced_assignment(
+    teams: npt.NDArray[np.integer],
+    strength: npt.NDArray[np.float64],
+    candidates: int = SCHEDULE_CANDIDATES,
+    seed: int = 0,
+) -> Tuple[npt.NDArray[np.int64], float]:
+    """Which real team to give each schedule id so strength of schedule is as
+    even as possible.
+
+    Repeats and gaps don't depend on who gets which id, so only the SOS
+    variance of `candidates` random assignments is scored, all in one product.
+    Returns the best as `order` (id i -> strength[order[i]]) and its variance.
+    """
+    n = len(strength)
+    rng = np.random.default_rng(seed)
+    orders = np.argsort(rng.random((candidates, n)), axis=1)
+    sos = strength[orders] @ sos_matrix(teams, n).T  # (candidates, teams)
+    variances = sos.var(axis=1)
+    best = int(np.argmin(variances))
+    return orders[best], float(variances[best])
@@ -1,19 +1,30 @@
-from typing import Callable, Dict
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
 
-import betterproto
 import numpy as np
+import pandas as pd
 import statbotics
 from rich import print
 from rich.pretty import pprint
 from rich.table import Table
-from scipy import optimize
-from scipy.optimize import minimize
 from tqdm import tqdm
 
 from protos.tpa import Match, Schedule
 from py.cli import expose
+from py.opr import (
+    ComponentFn,
+    IncrementalOPR,
+    OPRDesign,
+    breakdown_targets,
+    component_targets,
+    played_matches,
+    team_sort_key,
+)
+from py.tba import EventType
 from py.tpa.context_manager import tpa_cm
-from py.util import OPPOSITE_COLOR, OPRUtils, make_table, make_table_from_dict
+from py.util import OPPOSITE_COLOR, make_table, make_table_from_dict
 
 sb = statbotics.Statbotics()
 
@@ -34,49 +45,22 @@ def win_lose_rp_component(m: Match, color: str) -> float:
         return 0.0
 
 
+def get_component_oprs(
+    schedule: Schedule, component_fns: Sequence[ComponentFn], mode: str = "ls"
+) -> List[Dict[int, float]]:
+    teams = sorted(schedule.teams, key=lambda t: t.team_number)
+    design = OPRDesign.from_matches(schedule.matches, teams=[t.key for t in teams])
+    x = design.solve(component_targets(schedule.matches, component_fns), mode=mode)
+    return [
+        {t.team_number: float(x[i, j]) for i, t in enumerate(teams)}
+        for j in range(len(component_fns))
+    ]
+
+
 def get_component_opr(
-    schedule: Schedule,
-    component_fn: Callable[
-        [Match, str],
-        float,
-    ],
+    schedule: Schedule, component_fn: ComponentFn, mode: str = "ls"
 ) -> Dict[int, float]:
-    teams = schedule.teams
-    teams.sort(key=lambda t: t.team_number)
-    coprs = {}
-
-    d = {t.team_number: c for c, t in enumerate(teams)}
-    b = np.zeros(len(teams))
-    a = np.matrix([[0 for _ in range(len(teams))] for _ in range(len(teams))])
-
-    tk_to_team = {t.key: t for t in teams}
-
-    for match in schedule.matches:
-        for b1, r1 in zip(
-            match.alliances.blue.team_keys, match.alliances.red.team_keys
-        ):
-            for b2, r2 in zip(
-                match.alliances.blue.team_keys, match.alliances.red.team_keys
-            ):
-                a[
-                    (
-                        d[tk_to_team[b1].team_number],
-                        d[tk_to_team[b2].team_number],
-                    )
-                ] += 1
-                a[
-                    (
-                        d[tk_to_team[r1].team_number],
-                        d[tk_to_team[r2].team_number],
-                    )
-                ] += 1
-
-            b[d[tk_to_team[b1].team_number]] += component_fn(match, "blue")
-            b[d[tk_to_team[r1].team_number]] += component_fn(match, "red")
-
-    coprs = np.linalg.solve(a, b)
-    coprs = {t: coprs[i] for t, i in d.items()}
-    return coprs
+    return get_component_oprs(schedule, [component_fn], mode=mode)[0]
 
 
 @expose
@@ -93,87 +77,152 @@ async def copr_table(event_key: str, sort_by="rp"):
                 teams.update(a.team_keys)
 
         teams = sorted(list(teams), key=lambda t: int(t[3:]))
-        teams = [await tpa.get_team(team_key=t) for t in teams]
-        match = matches[35]
-        _, sb = betterproto.which_one_of(match, "score_breakdown")
-        sb = sb.red.to_dict(
-            casing=betterproto.Casing.SNAKE, include_default_values=True
-        )
+        teams = [t async for t in tpa.get_teams_by_keys(team_keys=teams)]
+
+    components, targets = breakdown_targets(matches)
+    sort_index = components.index(sort_by)
+    for c in components:
+        table.add_column(c)
+
+    design = OPRDesign.from_matches(matches, teams=[t.key for t in teams])
+    coprs = design.solve(targets)
+    for i, t in enumerate(teams):
+        data.append([t.team_number] + [round(float(v), 2) for v in coprs[i]])
+
+    data.sort(key=lambda r: -r[sort_index + 1])
+    [table.add_row(*[str(c) for c in r]) for r in data]
 
-        components = [k for k, v in sb.items() if type(v) in [int, float]]
-        sort_index = components.index(sort_by)
+    print(table)
 
-        coprs = {}
 
-        def make_copr_fn(component: str) -> Callable:
-            def copr_fn(m, c):
-                _, sb = betterproto.which_one_of(m, "score_breakdown")
-                return getattr(getattr(sb, c), component)
+def event_opr_rows(
+    event_key: str, week: int, match_data: List[bytes]
+) -> List[Dict[str, object]]:
+    # Runs in a worker process, so matches travel as serialized protos.
+    matches = played_matches([Match.FromString(b) for b in match_data])
+    if len(matches) == 0:
+        return []
+
+    names, targets = breakdown_targets(matches)
+    targets = np.hstack([component_targets(matches, [opr_component]), targets])
+    design = OPRDesign.from_matches(matches)
+    x = design.solve(targets)
+
+    columns = ["opr"] + names
+    return [
+        {
+            "team": t,
+            "event_key": event_key,
+            "week": week,
+            **{c: float(v) for c, v in zip(columns, x[i])},
+        }
+        for i, t in enumerate(design.teams)
+    ]
 
-            return copr_fn
 
-        for c in components:
-            try:
-                coprs[c] = get_component_opr(
-                    Schedule(teams=teams, matches=matches), make_copr_fn(c)
+@expose
+async def season_oprs(
+    year_start: int,
+    year_end: Optional[int] = None,
+    workers: Optional[int] = None,
+    out_dir: str = "out/oprs",
+):
+    """Precompute OPR and every breakdown COPR for each season event.
+
+    Written as Parquet under `out_dir`, partitioned by year and week. Events TBA
+    gives no week (championship, FoC) are filed one week after the last one.
+    """
+    if year_end is None:
+        year_end = year_start
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for year in range(year_start, year_end + 1):
+            async with tpa_cm() as tpa:
+                events = [
+                    e
+                    async for e in tpa.get_events_by_year(year=year)
+                    if e.event_type in EventType.SEASON_EVENT_TYPES
+                ]
+                event_matches = defaultdict(list)
+                async for m in tpa.get_events_matches(
+                    year_start=year,
+                    year_end=year,
+                    event_types=list(EventType.SEASON_EVENT_TYPES),
+                ):
+                    event_matches[m.event_key].append(bytes(m))
+
+            weekless = EventType.CMP_EVENT_TYPES | {EventType.FOC}
+            last_week = max(
+                [e.week for e in events if e.event_type not in weekless], default=0
+            )
+            # Weekless events go one week after the last (0-based) week, then
+            # everything gets the usual + 1 for 1-based weeks.
+            weeks = [
+                last_week + 1 if e.event_type in weekless else e.week for e in events
+            ]
+            futures = [
+                asyncio.wrap_future(
+                    pool.submit(event_opr_rows, e.key, week + 1, event_matches[e.key])
                 )
-                table.add_column(c)
-            except:
-                print(f"failed on {c}")
+                for e, week in zip(events, weeks)
+            ]
 
-        for tk in list(coprs.values())[0]:
-            row = [(tk)] + [(round(coprs[c][tk], 2)) for c in components]
-            data.append(row)
+            rows = []
+            for f in tqdm(
+                asyncio.as_completed(futures), total=len(futures), desc=str(year)
+            ):
+                rows.extend(await f)
+
+            if len(rows) == 0:
+                continue
+
+            df = pd.DataFrame(rows)
+            df.insert(0, "year", year)
+            df.to_parquet(
+                out_dir,
+                index=False,
+                partition_cols=["year", "week"],
+                existing_data_behavior="delete_matching",
+            )
+            print(f"{year}: {len(df)} team-events from {len(futures)} events")
 
-    data.sort(key=lambda r: -r[sort_index + 1])
-    [table.add_row(*[str(c) for c in r]) for r in data]
 
-    print(table)
+def load_season_oprs(year: int, out_dir: str = "out/oprs") -> pd.DataFrame:
+    return pd.read_parquet(f"{out_dir}/year={year}")
 
 
 @expose
-async def opr(event_key: str):
+async def live_opr(event_key: str, poll_seconds: float = 5):
+    live = IncrementalOPR([opr_component])
     async with tpa_cm() as tpa:
-        team_to_indx = {
-            t.key: i
-            for i, t in enumerate(
-                [t async for t in tpa.get_event_teams(event_key=event_key)]
-            )
-        }
-        indx_to_team = {v: k for k, v in team_to_indx.items()}
+        while True:
+            matches = [
+                m
+                async for m in tpa.get_event_matches(event_key=event_key)
+                if m.comp_level == "qm"
+            ]
+            if live.update(matches):
+                print(f"{event_key} after {len(live.matches)} matches")
+                print(make_table_from_dict(live.as_dict(), round_to=2))
+
+            await asyncio.sleep(poll_seconds)
+
+
+@expose
+async def opr(event_key: str, mode: str = "l1"):
+    async with tpa_cm() as tpa:
+        teams = [t.key async for t in tpa.get_event_teams(event_key=event_key)]
         matches = [
             m
             async for m in tpa.get_event_matches(event_key=event_key)
             if m.comp_level == "qm"
         ]
 
-        def individual_match_error(x, m_number: int) -> float:
-            ret = 0
-            for alliance in [
-                matches[m_number].alliances.blue,
-                matches[m_number].alliances.red,
-            ]:
-                predicted_score = 0
-                for tk in alliance.team_keys:
-                    predicted_score += x[team_to_indx[tk]]
-
-                ret += abs(alliance.score - predicted_score)
-
-            return ret
-
-        def score_fn(x):
-            return sum([individual_match_error(x, i) for i in range(len(matches))])
-
-        x0 = [0 for _ in range(len(team_to_indx.keys()))]
-        lower_bounds = [0 for _ in range(len(team_to_indx.keys()))]
-        upper_bounds = [200 for _ in range(len(team_to_indx.keys()))]
-        bounds = optimize.Bounds(lower_bounds, upper_bounds)
-        res = optimize.minimize(
-            score_fn, x0, method="trust-constr", bounds=bounds, options={"disp": True}
-        )
-
-        oprs = {indx_to_team[i]: x for i, x in enumerate(res.x)}
-        print(make_table_from_dict(oprs, round_to=2))
+    design = OPRDesign.from_matches(matches, teams=sorted(teams, key=team_sort_key))
+    x = design.solve(
+        component_targets(matches, [opr_component]), mode=mode, bounds=(0, 200)
+    )
+    print(make_table_from_dict(design.as_dict(x[:, 0]), round_to=2))
 
 
 class optim_dict:
@@ -1,10 +1,9 @@
-import random
-import statistics
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional
 
 import numpy as np
 from rich import print
-from tqdm.rich import tqdm, trange
 
 from protos.tpa import (
     FakeAlliance,
@@ -12,11 +11,28 @@ from protos.tpa import (
     Match,
     MatchAlliance,
     MatchAlliances,
+    Team,
     TeamRp,
     WltRecord,
 )
 from py.cli import expose
-from py.scout import get_component_opr, opr_component
+from py.montecarlo import (
+    BRACKETS,
+    RANK_PERCENTILES,
+    SEEDS,
+    BracketMatch,
+    QualSim,
+    TeamModel,
+    alliance_indices,
+    rank_percentiles,
+    rank_probabilities,
+    simulate_playoffs,
+    simulate_quals,
+    team_model,
+)
+from py.opr import played_matches
+from py.scout import get_component_oprs, opr_component
+from py.team_features import Features, TeamFeatureStore
 from py.tpa.context_manager import tpa_cm
 from py.util import (
     file_cm,
@@ -63,200 +79,140 @@ RP_THRESHOLDS = {
 }
 
 
-@expose
-async def sim(fe_fp: str, iterations=1000):
-    with file_cm(fe_fp, "rb") as f:
-        fake_event = FakeEvent.FromString(f.read())
-
-    rankings_file = fe_fp.replace("_fe.pb", "_ranks.tsv")
-    opr_file = fe_fp.replace("_fe.pb", "_oprs.txt")
-
-    schedule = fake_event.schedule
-    year = fake_event.inner_event.year
-
-    team_rp1 = defaultdict(list)
-    team_rp2 = defaultdict(list)
-    team_opr = defaultdict(list)
-    all_rp1, all_rp2, all_opr = [], [], []
-
-    rp1_cache = {}
-    rp2_cache = {}
-    opr_cache = {}
+async def team_histories(
+    teams: List[Team], year: int, store: Optional[TeamFeatureStore] = None
+) -> Dict[str, List[Features]]:
+    """(RP1, RP2, OPR) at each official event each team played in `year`.
 
-    records = defaultdict(lambda: defaultdict(lambda: 0))
-    played = defaultdict(lambda: 0)
+    Events already in `store` aren't solved again; the rest are solved once for
+    every team at them, and saved to the store once their quals are over.
+    """
+    if store is None:
+        store = TeamFeatureStore()
 
+    # Events still being played: used for this run but never stored.
+    live = {}  # type: Dict[str, Dict[str, Features]]
+    histories = {}
     async with tpa_cm() as tpa:
-        for bar, team in tqdm_bar(schedule.teams):
+        for bar, team in tqdm_bar(teams):
+            live_features = []
             async for event in tpa.get_team_events_by_year(
                 year=year, team_key=team.key
             ):
                 bar.set_description(event.key.rjust(10))
-                if not is_official_event(event):
+                if not is_official_event(event) or event.key in store.solved:
                     continue
 
-                event_schedule = await get_real_event_schedule(event_key=event.key)
-                if event.key not in rp1_cache:
-                    try:
-
-                        rp1_coprs = get_component_opr(
-                            schedule=event_schedule,
-                            component_fn=RP_FNs[year][0],
-                        )
-                        rp2_coprs = get_component_opr(
-                            schedule=event_schedule,
-                            component_fn=RP_FNs[year][1],
-                        )
-                        oprs = get_component_opr(
-                            schedule=event_schedule,
-                            component_fn=opr_component,
-                        )
-
-                        rp1_cache[event.key] = rp1_coprs
-                        rp2_cache[event.key] = rp2_coprs
-                        opr_cache[event.key] = oprs
-
-                    except np.linalg.LinAlgError:
+                if event.key not in live:
+                    event_schedule = await get_real_event_schedule(event_key=event.key)
+                    rp1_coprs, rp2_coprs, oprs = get_component_oprs(
+                        schedule=event_schedule,
+                        component_fns=[*RP_FNs[year], opr_component],
+                        mode=store.mode,
+                    )
+                    features = {
+                        f"frc{n}": (rp1_coprs[n], rp2_coprs[n], oprs[n]) for n in oprs
+                    }
+                    matches = event_schedule.matches
+                    finished = len(played_matches(matches)) == len(matches) > 0
+                    if finished:
+                        store.put_event(event.key, year, features)
                         continue
 
-                rp1_coprs = rp1_cache[event.key]
-                rp2_coprs = rp2_cache[event.key]
-                oprs = opr_cache[event.key]
-                try:
-                    team_rp1[team.key].append(rp1_coprs[team.team_number])
-                    all_rp1.append(rp1_coprs[team.team_number])
-                    team_rp2[team.key].append(rp2_coprs[team.team_number])
-                    all_rp2.append(rp2_coprs[team.team_number])
-                    team_opr[team.key].append(oprs[team.team_number])
-                    all_opr.append(oprs[team.team_number])
-                except KeyError:
-                    pass
-
-            for d in [team_rp1, team_rp2, team_opr]:
-                if len(d[team.key]) == 0:
-                    d[team.key].append(0)
-
-    all_rp1_var = statistics.pvariance(all_rp1)
-    all_rp2_var = statistics.pvariance(all_rp2)
-    all_opr_var = statistics.pvariance(all_opr)
-    rps = defaultdict(lambda: 0)
-    schedule.matches[0].alliances.red.team_keys
-
-    for _ in trange(iterations):
-        for m in schedule.matches:
-            for a in [m.alliances.red, m.alliances.blue]:
-                rp1_vars = [
-                    statistics.pvariance(team_rp1[k])
-                    if len(team_rp1[k]) > 1
-                    else all_rp1_var
-                    for k in a.team_keys
-                ]
-                rp1_stdev = sum(rp1_vars) ** 0.5
-                rp1_means = [statistics.mean(team_rp1[k]) for k in a.team_keys]
-                rp1_mean = sum(rp1_means)
-                if (n := random.gauss(rp1_mean, rp1_stdev)) > RP_THRESHOLDS[year][0]:
-                    # print(f"Awarding RP1 as n={round(n,2)} to {a.team_keys}")
-                    for k in a.team_keys:
-                        rps[k] += 1
-
-                rp2_vars = [
-                    statistics.pvariance(team_rp2[k])
-                    if len(team_rp2[k]) > 1
-                    else all_rp2_var
-                    for k in a.team_keys
-                ]
-                rp2_stdev = sum(rp2_vars) ** 0.5
-                rp2_means = [statistics.mean(team_rp2[k]) for k in a.team_keys]
-                rp2_mean = sum(rp2_means)
-                if (n := random.gauss(rp2_mean, rp2_stdev)) > RP_THRESHOLDS[year][1]:
-                    # print(f"Awarding RP2 as n={round(n,2)} to {a.team_keys}")
-                    for k in a.team_keys:
-                        rps[k] += 1
-
-            red_pt_vars = [
-                statistics.pvariance(team_opr[k])
-                if len(team_opr[k]) > 1
-                else all_opr_var
-                for k in m.alliances.red.team_keys
-            ]
-
-            red_pt_stdev = sum(red_pt_vars) ** 0.5
-            red_pt_means = [
-                statistics.mean(team_opr[k]) for k in m.alliances.red.team_keys
-            ]
-            red_pt_mean = sum(red_pt_means)
-            red_pts = round(random.gauss(red_pt_mean, red_pt_stdev))
-
-            blue_pt_vars = [
-                statistics.pvariance(team_opr[k])
-                if len(team_opr[k]) > 1
-                else all_opr_var
-                for k in m.alliances.blue.team_keys
-            ]
-            blue_pt_stdev = sum(blue_pt_vars) ** 0.5
-            blue_pt_means = [
-                statistics.mean(team_opr[k]) for k in m.alliances.blue.team_keys
-            ]
-            blue_pt_mean = sum(blue_pt_means)
-            blue_pts = round(random.gauss(blue_pt_mean, blue_pt_stdev))
-
-            m.alliances.blue.score = blue_pts
-            m.alliances.red.score = red_pts
-
-            if red_pts > blue_pts:
-                for k in m.alliances.red.team_keys:
-                    rps[k] += 2 if year != 2015 else m.alliances.red.score
-                    records[k]["wins"] += 1
-            elif red_pts == blue_pts:
-                for a in [m.alliances.red, m.alliances.blue]:
-                    for k in a.team_keys:
-                        rps[k] += 1 if year != 2015 else a.score
-                        records[k]["ties"] += 1
-            else:
-                for k in m.alliances.blue.team_keys:
-                    rps[k] += 2 if year != 2015 else m.alliances.blue.score
-                    records[k]["wins"] += 1
-
-            for a in [m.alliances.red, m.alliances.blue]:
-                for k in a.team_keys:
-                    played[k] += 1
-
-    for t, rec in records.items():
-        rec["losses"] = played[t] - (rec["wins"] + rec["ties"])
+                    live[event.key] = features
+
+                if team.key in live[event.key]:
+                    live_features.append(live[event.key][team.key])
+
+            histories[team.key] = store.history(team.key, year) + live_features
+
+    return histories
+
+
+def rank_matrix_path(fe_fp: str) -> str:
+    return fe_fp.replace("_fe.pb", "_rank_matrix.npy")
+
+
+def simulate_division(**kwargs) -> QualSim:
+    # Runs in a worker process. The rank matrix is already on disk, so drop it
+    # rather than pickle a copy back; the parent re-opens the memmap.
+    return simulate_quals(**kwargs)._replace(ranks=None)
+
+
+def sim_args(fake_event: FakeEvent, model: TeamModel) -> Dict[str, object]:
+    year = fake_event.inner_event.year
+    return dict(
+        model=model,
+        alliances=alliance_indices(
+            fake_event.schedule.matches, {k: i for i, k in enumerate(model.keys)}
+        ),
+        thresholds=RP_THRESHOLDS[year],
+        score_rp=year == 2015,
+    )
+
+
+async def save_sim(
+    fe_fp: str,
+    fake_event: FakeEvent,
+    model: TeamModel,
+    result: QualSim,
+    iterations: int,
+):
+    rankings_file = fe_fp.replace("_fe.pb", "_ranks.tsv")
+    opr_file = fe_fp.replace("_fe.pb", "_oprs.txt")
+    rank_dist_file = fe_fp.replace("_fe.pb", "_rank_dist.txt")
+    rank_probs_file = fe_fp.replace("_fe.pb", "_rank_probs.csv")
+    schedule = fake_event.schedule
+    keys = model.keys
+
+    for m, (red_pts, blue_pts) in zip(schedule.matches, result.last_scores):
+        m.alliances.red.score = int(red_pts)
+        m.alliances.blue.score = int(blue_pts)
+
+    rps = {k: int(rp) for k, rp in zip(keys, result.rps)}
+    records = {
+        k: {
+            "wins": int(result.wins[i]),
+            "ties": int(result.ties[i]),
+            "losses": int(result.played[i] - result.wins[i] - result.ties[i]),
+        }
+        for i, k in enumerate(keys)
+    }
+
+    ranked = sorted(rps.items(), key=lambda t: -t[1])
+    async with tpa_cm() as tpa:
+        ranked_teams = [
+            t async for t in tpa.get_teams_by_keys(team_keys=[k for k, _ in ranked])
+        ]
 
     with file_cm(rankings_file, "w+") as f:
-        async with tpa_cm() as tpa:
-            for bar, (k, rp) in tqdm_bar(sorted(rps.items(), key=lambda t: -t[1])):
-                bar.set_description(k)
-                team = await tpa.get_team(team_key=k)
-                f.write(f"{team.team_number}\t{team.nickname}\n")
+        for team in ranked_teams:
+            f.write(f"{team.team_number}\t{team.nickname}\n")
 
     with file_cm(fe_fp, "wb+") as f:
         fake_event.schedule = schedule
-        async with tpa_cm() as tpa:
-            for k, rp in sorted(rps.items(), key=lambda t: -t[1]):
-                team = await tpa.get_team(team_key=k)
-                fake_event.rankings.append(
-                    TeamRp(team=team, rp=rp, record=WltRecord().from_dict(records[k]))
-                )
+        for team, (k, rp) in zip(ranked_teams, ranked):
+            fake_event.rankings.append(
+                TeamRp(team=team, rp=rp, record=WltRecord().from_dict(records[k]))
+            )
 
         f.write(fake_event.SerializeToString())
 
+    index = {k: i for i, k in enumerate(keys)}
     with file_cm(opr_file, "w+") as f:
         table = []
-        i = 1
-        for tk, rp in tqdm(sorted(rps.items(), key=lambda t: -t[1])):
+        for i, (tk, rp) in enumerate(ranked, start=1):
+            rp1, rp2, opr = model.means[index[tk]]
             table.append(
                 [
                     i,
                     tk[3:],
                     round(rp / (iterations * 10), 2),
-                    round(sum(team_rp1[tk]) / len(team_rp1[tk]), 2),
-                    round(sum(team_rp2[tk]) / len(team_rp2[tk]), 2),
-                    round(sum(team_opr[tk]) / len(team_opr[tk]), 2),
+                    round(rp1, 2),
+                    round(rp2, 2),
+                    round(opr, 2),
                 ]
             )
-            i += 1
 
         print(
             make_table(
@@ -266,6 +222,103 @@ async def sim(fe_fp: str, iterations=1000):
             file=f,
         )
 
+    probs = rank_probabilities(result.ranks)
+    bands = rank_percentiles(probs)
+    mean_rank = probs @ np.arange(1, len(keys) + 1)
+    with file_cm(rank_dist_file, "w+") as f:
+        table = []
+        for i in np.argsort(mean_rank):
+            table.append(
+                [
+                    keys[i][3:],
+                    round(float(mean_rank[i]), 1),
+                    *bands[i],
+                    *[f"{p:.1%}" for p in probs[i, :SEEDS]],
+                    f"{probs[i, :SEEDS].sum():.1%}",
+                ]
+            )
+
+        print(
+            make_table(
+                col_names=["Team", "Avg"]
+                + [f"p{p}" for p in RANK_PERCENTILES]
+                + [f"#{s}" for s in range(1, SEEDS + 1)]
+                + [f"Top {SEEDS}"],
+                row_vals=table,
+            ),
+            file=f,
+        )
+
+    with file_cm(rank_probs_file, "w+") as f:
+        print(",".join(["team"] + [str(r) for r in range(1, len(keys) + 1)]), file=f)
+        for k, row in zip(keys, probs):
+            print(",".join([k[3:]] + [f"{p:.5f}" for p in row]), file=f)
+
+
+@expose
+async def sim(fe_fp: str, iterations=1000, seed=None):
+    with file_cm(fe_fp, "rb") as f:
+        fake_event = FakeEvent.FromString(f.read())
+
+    teams = fake_event.schedule.teams
+    histories = await team_histories(teams, fake_event.inner_event.year)
+    model = team_model([t.key for t in teams], histories)
+    result = simulate_quals(
+        **sim_args(fake_event, model),
+        iterations=iterations,
+        seed=seed,
+        rank_path=rank_matrix_path(fe_fp),
+    )
+    await save_sim(fe_fp, fake_event, model, result, iterations)
+
+
+async def sim_many(
+    fe_fps: List[str], iterations=1000, seed=None, workers: Optional[int] = None
+):
+    """`sim` for several fake events at once, e.g. every division of a district.
+
+    Each team's history is looked up once no matter how many divisions it shows
+    up in; the Monte Carlo runs in a process pool.
+    """
+    fake_events = []
+    for fe_fp in fe_fps:
+        with file_cm(fe_fp, "rb") as f:
+            fake_events.append(FakeEvent.FromString(f.read()))
+
+    store = TeamFeatureStore()
+    histories = {}
+    for year in sorted(set(fe.inner_event.year for fe in fake_events)):
+        teams = {
+            t.key: t
+            for fe in fake_events
+            if fe.inner_event.year == year
+            for t in fe.schedule.teams
+        }
+        histories[year] = await team_histories(list(teams.values()), year, store)
+
+    models = [
+        team_model([t.key for t in fe.schedule.teams], histories[fe.inner_event.year])
+        for fe in fake_events
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(fake_events))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                partial(simulate_division, **sim_args(fe, model)),
+                iterations=iterations,
+                seed=s,
+                rank_path=rank_matrix_path(fe_fp),
+            )
+            for fe_fp, fe, model, s in zip(fe_fps, fake_events, models, seeds)
+        ]
+        results = [
+            f.result()._replace(ranks=np.load(rank_matrix_path(fe_fp), mmap_mode="r"))
+            for fe_fp, f in zip(fe_fps, futures)
+        ]
+
+    for fe_fp, fe, model, result in zip(fe_fps, fake_events, models, results):
+        await save_sim(fe_fp, fe, model, result, iterations)
+
 
 @expose
 def print_faked_schedule(path):
@@ -275,271 +328,168 @@ def print_faked_schedule(path):
     print(fake_event.schedule.matches[1])
 
 
+def elim_match(
+    event_key: str,
+    bm: BracketMatch,
+    match_number: int,
+    red: FakeAlliance,
+    blue: FakeAlliance,
+    red_score: int,
+    blue_score: int,
+    red_won: bool,
+) -> Match:
+    return Match(
+        alliances=MatchAlliances(
+            red=MatchAlliance(
+                score=red_score,
+                team_keys=[
+                    red.first_pick.key,
+                    red.captain.key,
+                    red.second_pick.key,
+                ],
+            ),
+            blue=MatchAlliance(
+                score=blue_score,
+                team_keys=[
+                    blue.first_pick.key,
+                    blue.captain.key,
+                    blue.second_pick.key,
+                ],
+            ),
+        ),
+        key=f"{event_key}_{bm.comp_level}{bm.set_number}m{match_number}",
+        comp_level=bm.comp_level,
+        set_number=bm.set_number,
+        match_number=match_number,
+        winning_alliance="red" if red_won else "blue",
+        event_key=event_key,
+    )
+
+
 @expose
-async def save_draft(fake_event_path: str):
-    with file_cm(fake_event_path, "rb") as f:
+async def sim_playoffs(
+    fe_fp: str, iterations=10000, bracket: Optional[str] = None, seed=None
+):
+    """Simulate the playoffs of a fake event with its alliances already picked.
+
+    `bracket` is one of BRACKETS; defaults to double elimination from 2023 on
+    and best-of-3 series before that. The last run's matches replace the fake
+    event's playoff matches. The odds of each alliance still being alive at or
+    past each round go to _playoffs.txt.
+    """
+    with file_cm(fe_fp, "rb") as f:
         fake_event = FakeEvent.FromString(f.read())
 
-    print(f"Alliances: (ctrl-d to end)")
-    alliances_raw = []
-    try:
-        while True:
-            alliances_raw.append(input())
-    except EOFError:
-        pass
-
-    fake_event.alliance_selection.clear()
-    fake_event.schedule.matches = list(
-        filter(lambda m: m.comp_level == "qm", fake_event.schedule.matches)
+    year = fake_event.inner_event.year
+    if bracket is None:
+        bracket = "double" if year >= 2023 else "bo3"
+
+    picks = sorted(fake_event.alliance_selection, key=lambda a: a.seed)
+    teams = [t for a in picks for t in [a.captain, a.first_pick, a.second_pick]]
+    model = team_model([t.key for t in teams], await team_histories(teams, year))
+    result = simulate_playoffs(
+        model=model,
+        alliances=np.arange(len(teams)).reshape(len(picks), 3),
+        bracket=BRACKETS[bracket],
+        iterations=iterations,
+        seed=seed,
     )
 
-    async with tpa_cm() as tpa:
-        for i, raw_alliance in enumerate(alliances_raw, start=1):
-            c, p1, p2 = raw_alliance.split("\t")
-            fake_event.alliance_selection.append(
-                FakeAlliance(
-                    captain=await tpa.get_team(team_key=f"frc{c}"),
-                    first_pick=await tpa.get_team(team_key=f"frc{p1}"),
-                    second_pick=await tpa.get_team(team_key=f"frc{p2}"),
-                    seed=i,
+    event_key = fake_event.inner_event.key
+    fake_event.schedule.matches = [
+        m for m in fake_event.schedule.matches if m.comp_level == "qm"
+    ]
+    for bm, game in zip(BRACKETS[bracket], result.last_run):
+        red_wins = 0
+        for i, (scores, red_won) in enumerate(zip(game.scores, game.red_won)):
+            fake_event.schedule.matches.append(
+                elim_match(
+                    event_key=event_key,
+                    bm=bm,
+                    match_number=i + 1,
+                    red=picks[game.red],
+                    blue=picks[game.blue],
+                    red_score=int(scores[0]),
+                    blue_score=int(scores[1]),
+                    red_won=bool(red_won),
                 )
             )
+            red_wins += red_won
+            if max(red_wins, i + 1 - red_wins) * 2 > bm.best_of:
+                break
 
-    def gen_fake_elim_match(
-        event_key: str,
-        comp_level: str,
-        set_number: int,
-        match_number: int,
-        red_fake: FakeAlliance,
-        blue_fake: FakeAlliance,
-        red_score: int,
-        blue_score: int,
-    ) -> Match:
-        return Match(
-            alliances=MatchAlliances(
-                red=MatchAlliance(
-                    score=red_score,
-                    team_keys=[
-                        red_fake.first_pick.key,
-                        red_fake.captain.key,
-                        red_fake.second_pick.key,
-                    ],
-                ),
-                blue=MatchAlliance(
-                    score=blue_score,
-                    team_keys=[
-                        blue_fake.first_pick.key,
-                        blue_fake.captain.key,
-                        blue_fake.second_pick.key,
-                    ],
-                ),
-            ),
-            key=f"{event_key}_{comp_level}{set_number}m{match_number}",
-            comp_level=comp_level,
-            set_number=set_number,
-            match_number=match_number,
-            winning_alliance="red" if red_score > blue_score else "blue",
-            event_key=event_key,
-        )
-
-    # Qf
-    a = lambda n: fake_event.alliance_selection[n - 1]
-    sa = lambda a_: f"{a_.captain.key}-{a_.first_pick.key}-{a_.second_pick.key}"
-    qf18_winner = int(input(f"1. [{sa(a(1))}] vs 8. [{sa(a(8))}] - "))
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=1,
-                match_number=1,
-                red_fake=a(1),
-                blue_fake=a(8),
-                red_score=2 if qf18_winner == 1 else 1,
-                blue_score=1 if qf18_winner == 1 else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=1,
-                match_number=2,
-                red_fake=a(1),
-                blue_fake=a(8),
-                red_score=2 if qf18_winner == 1 else 1,
-                blue_score=1 if qf18_winner == 1 else 2,
-            ),
-        ]
-    )
+    with file_cm(fe_fp, "wb+") as f:
+        f.write(fake_event.SerializeToString())
 
-    qf27_winner = int(input(f"2. [{sa(a(2))}] vs 7. [{sa(a(7))}] - "))
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=3,
-                match_number=1,
-                red_fake=a(2),
-                blue_fake=a(7),
-                red_score=2 if qf27_winner == 2 else 1,
-                blue_score=1 if qf27_winner == 2 else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=3,
-                match_number=2,
-                red_fake=a(2),
-                blue_fake=a(7),
-                red_score=2 if qf27_winner == 2 else 1,
-                blue_score=1 if qf27_winner == 2 else 2,
-            ),
-        ]
-    )
+    with file_cm(fe_fp.replace("_fe.pb", "_playoffs.txt"), "w+") as f:
+        table = []
+        for a, reach in zip(picks, result.reach):
+            table.append(
+                [
+                    a.seed,
+                    "-".join(
+                        t.key[3:] for t in [a.captain, a.first_pick, a.second_pick]
+                    ),
+                    *[f"{p:.1%}" for p in reach],
+                ]
+            )
 
-    qf36_winner = int(input(f"3. [{sa(a(3))}] vs 6. [{sa(a(6))}] - "))
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=4,
-                match_number=1,
-                red_fake=a(3),
-                blue_fake=a(6),
-                red_score=2 if qf36_winner == 3 else 1,
-                blue_score=1 if qf36_winner == 3 else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=4,
-                match_number=2,
-                red_fake=a(3),
-                blue_fake=a(6),
-                red_score=2 if qf36_winner == 3 else 1,
-                blue_score=1 if qf36_winner == 3 else 2,
-            ),
-        ]
-    )
+        print(
+            make_table(col_names=["#", "Alliance"] + result.rounds, row_vals=table),
+            file=f,
+        )
 
-    qf45_winner = int(input(f"4. [{sa(a(4))}] vs 5. [{sa(a(5))}] - "))
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=2,
-                match_number=1,
-                red_fake=a(4),
-                blue_fake=a(5),
-                red_score=2 if qf45_winner == 4 else 1,
-                blue_score=1 if qf45_winner == 4 else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="qf",
-                set_number=2,
-                match_number=2,
-                red_fake=a(4),
-                blue_fake=a(5),
-                red_score=2 if qf45_winner == 4 else 1,
-                blue_score=1 if qf45_winner == 4 else 2,
-            ),
-        ]
-    )
 
-    # Sf
-    sf14_winner = int(
-        input(
-            f"{qf18_winner}. [{sa(a(qf18_winner))}] vs {qf45_winner}. [{sa(a(qf45_winner))}] - "
-        )
-    )
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="sf",
-                set_number=1,
-                match_number=1,
-                red_fake=a(qf18_winner),
-                blue_fake=a(qf45_winner),
-                red_score=2 if sf14_winner == qf18_winner else 1,
-                blue_score=1 if sf14_winner == qf18_winner else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="sf",
-                set_number=1,
-                match_number=2,
-                red_fake=a(qf18_winner),
-                blue_fake=a(qf45_winner),
-                red_score=2 if sf14_winner == qf18_winner else 1,
-                blue_score=1 if sf14_winner == qf18_winner else 2,
-            ),
-        ]
-    )
+@expose
+async def save_draft(
+    fake_event_path: str,
+    alliances_path: Optional[str] = None,
+    iterations=10000,
+    bracket: Optional[str] = None,
+):
+    """Record alliance selection, then simulate the playoffs.
+
+    Alliances are one per line, captain / first pick / second pick team numbers
+    separated by tabs, read from `alliances_path` or stdin.
+    """
+    with file_cm(fake_event_path, "rb") as f:
+        fake_event = FakeEvent.FromString(f.read())
 
-    sf23_winner = int(
-        input(
-            f"{qf27_winner}. [{sa(a(qf27_winner))}] vs {qf36_winner}. [{sa(a(qf36_winner))}] - "
-        )
-    )
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="sf",
-                set_number=2,
-                match_number=1,
-                red_fake=a(qf27_winner),
-                blue_fake=a(qf36_winner),
-                red_score=2 if sf23_winner == qf27_winner else 1,
-                blue_score=1 if sf23_winner == qf27_winner else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="sf",
-                set_number=2,
-                match_number=2,
-                red_fake=a(qf27_winner),
-                blue_fake=a(qf36_winner),
-                red_score=2 if sf23_winner == qf27_winner else 1,
-                blue_score=1 if sf23_winner == qf27_winner else 2,
-            ),
-        ]
-    )
+    if alliances_path is None:
+        print(f"Alliances: (ctrl-d to end)")
+        alliances_raw = []
+        try:
+            while True:
+                alliances_raw.append(input())
+        except EOFError:
+            pass
+    else:
+        with file_cm(alliances_path, "r") as f:
+            alliances_raw = f.read().splitlines()
 
-    # F
-    f_winner = int(
-        input(
-            f"{sf14_winner}. [{sa(a(sf14_winner))}] vs {sf23_winner}. [{sa(a(sf23_winner))}] - "
+    fake_event.alliance_selection.clear()
+    picks = [
+        [f"frc{n}" for n in a.split("\t")] for a in alliances_raw if a.strip() != ""
+    ]
+    async with tpa_cm() as tpa:
+        teams = {
+            t.key: t
+            async for t in tpa.get_teams_by_keys(
+                team_keys=[k for alliance in picks for k in alliance]
+            )
+        }
+
+    for i, (c, p1, p2) in enumerate(picks, start=1):
+        fake_event.alliance_selection.append(
+            FakeAlliance(
+                captain=teams[c],
+                first_pick=teams[p1],
+                second_pick=teams[p2],
+                seed=i,
+            )
         )
-    )
-    fake_event.schedule.matches.extend(
-        [
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="f",
-                set_number=1,
-                match_number=1,
-                red_fake=a(sf14_winner),
-                blue_fake=a(sf23_winner),
-                red_score=2 if f_winner == sf14_winner else 1,
-                blue_score=1 if f_winner == sf14_winner else 2,
-            ),
-            gen_fake_elim_match(
-                event_key=fake_event.inner_event.key,
-                comp_level="f",
-                set_number=1,
-                match_number=2,
-                red_fake=a(sf14_winner),
-                blue_fake=a(sf23_winner),
-                red_score=2 if f_winner == sf14_winner else 1,
-                blue_score=1 if f_winner == sf14_winner else 2,
-            ),
-        ]
-    )
 
     with file_cm(fake_event_path, "wb+") as f:
         f.write(fake_event.SerializeToString())
+
+    await sim_playoffs(fake_event_path, iterations=iterations, bracket=bracket)
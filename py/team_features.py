@@ -0,0 +1,160 @@
+import json
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from py.util import OPR_RIDGE_ALPHA, TEAM_FEATURES_PATH
+
+PRE_ELOS_PATH = "py/data/pre_elos.json"
+# Bump whenever what gets stored changes (table layout, the component fns);
+# opening a store written by another version starts it over.
+SCHEMA_VERSION = 2
+
+# One row of features per (team, year, event), the same triple sim.team_histories
+# returns: RP1 component OPR, RP2 component OPR, OPR.
+Features = Tuple[float, float, float]
+
+
+def pack(rows: npt.NDArray[np.float64]) -> bytes:
+    return rows.astype("<f8").tobytes()
+
+
+def unpack(data: bytes) -> npt.NDArray[np.float64]:
+    # Copied so rows can be updated in place; frombuffer views are read-only.
+    return np.frombuffer(data, dtype="<f8").reshape(-1, 3).copy()
+
+
+def solver_config(mode: str) -> str:
+    # Everything the OPR solve depends on besides the matches themselves.
+    return f"{mode}:{OPR_RIDGE_ALPHA}" if mode == "ridge" else mode
+
+
+class TeamFeatureStore:
+    """Per-(team, year) simulation features, kept on disk between runs.
+
+    Each row holds the team's per-event features as a packed float64 array along
+    with their mean and variance. Events are solved once for every team that
+    played them and only recorded once their quals are over, so later runs just
+    solve events that are new (or still being played).
+
+    Rows are kept per OPR solver config (`mode`, and its parameters), so
+    switching solvers never serves features solved another way.
+    """
+
+    def __init__(self, path: str = TEAM_FEATURES_PATH, mode: str = "ls") -> None:
+        self.path = path
+        self.mode = mode
+        self.config = solver_config(mode)
+        self.conn = sqlite3.connect(path)
+        (version,) = self.conn.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS team_years")
+            self.conn.execute("DROP TABLE IF EXISTS events")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS team_years (team TEXT, year INTEGER, "
+            "config TEXT, events TEXT, features BLOB, stats BLOB, "
+            "PRIMARY KEY (team, year, config))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events (key TEXT, year INTEGER, "
+            "config TEXT, PRIMARY KEY (key, config))"
+        )
+        self.conn.commit()
+        self.solved = {
+            k
+            for (k,) in self.conn.execute(
+                "SELECT key FROM events WHERE config = ?", (self.config,)
+            ).fetchall()
+        }
+
+    def get(self, team: str, year: int) -> Tuple[List[str], npt.NDArray[np.float64]]:
+        row = self.conn.execute(
+            "SELECT events, features FROM team_years "
+            "WHERE team = ? AND year = ? AND config = ?",
+            (team, year, self.config),
+        ).fetchone()
+        if row is None:
+            return [], np.zeros((0, 3))
+
+        events, data = row
+        return events.split(","), unpack(data)
+
+    def stats(
+        self, team: str, year: int
+    ) -> Optional[Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]]:
+        """(means, variances) of the team's features, None if it has none."""
+        row = self.conn.execute(
+            "SELECT stats FROM team_years WHERE team = ? AND year = ? AND config = ?",
+            (team, year, self.config),
+        ).fetchone()
+        if row is None:
+            return None
+
+        means, variances = unpack(row[0])
+        return means, variances
+
+    def history(self, team: str, year: int) -> List[Features]:
+        return [tuple(r) for r in self.get(team, year)[1].tolist()]
+
+    def put_event(
+        self, event_key: str, year: int, features: Dict[str, Features]
+    ) -> None:
+        for team, f in features.items():
+            events, rows = self.get(team, year)
+            if event_key in events:
+                rows[events.index(event_key)] = f
+            else:
+                events.append(event_key)
+                rows = np.vstack([rows, f])
+
+            stats = np.stack([rows.mean(axis=0), rows.var(axis=0)])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO team_years VALUES (?, ?, ?, ?, ?, ?)",
+                (team, year, self.config, ",".join(events), pack(rows), pack(stats)),
+            )
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?)",
+            (event_key, year, self.config),
+        )
+        self.conn.commit()
+        self.solved.add(event_key)
+
+
+def zscores(values: Dict[str, float]) -> Dict[str, float]:
+    if len(values) < 2:
+        return {k: 0.0 for k in values}
+
+    arr = np.array(list(values.values()))
+    sd = arr.std() or 1.0
+    return {k: (v - arr.mean()) / sd for k, v in values.items()}
+
+
+def team_strengths(
+    team_keys: List[str], year: int, store: Optional[TeamFeatureStore] = None
+) -> npt.NDArray[np.float64]:
+    """Standardized strength of each team: its mean OPR in `year` from the
+    feature store, else its pre-season Elo from pre_elos.json, else average (0).
+
+    Each source is z-scored over `team_keys` on its own so they can be mixed.
+    """
+    if store is None:
+        store = TeamFeatureStore()
+
+    oprs = {}
+    for k in team_keys:
+        stats = store.stats(k, year)
+        if stats is not None:
+            oprs[k] = float(stats[0][2])
+
+    with open(PRE_ELOS_PATH, "r") as f:
+        pre_elos = {f"frc{row['Team']}": row.get(str(year)) for row in json.load(f)}
+    # 0 / null: the team didn't compete that year.
+    elos = {k: float(pre_elos[k]) for k in team_keys if pre_elos.get(k)}
+
+    # OPR wins where a team has both.
+    z = {**zscores(elos), **zscores(oprs)}
+    return np.array([z.get(k, 0.0) for k in team_keys])
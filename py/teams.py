@@ -11,7 +11,6 @@ from rich import print
 from rich.pretty import pprint
 from tqdm.asyncio import tqdm
 from tqdm.rich import tqdm as tqdm_sync
-from tqdm.rich import trange
 from protos.tpa import Color, WltRecord, Team
 from py.cli import expose
 from py.matches import sort_combo
@@ -20,8 +19,6 @@ from py.tpa import tpa_cm
 from py.util import (
     CURRENT_YEAR,
     CURRENT_YEAR_RANGE,
-    MAX_TEAMS_PAGE_NUM,
-    MAX_TEAMS_PAGE_RANGE,
     OPPOSITE_COLOR,
     all_events_with_bar,
     all_teams_with_bar,
@@ -109,12 +106,7 @@ async def costs(year):
         costs_by_states = defaultdict(list)
 
         async for bar, team in tqdm_bar_async(
-            await flatten_lists_async(
-                [
-                    tpa.get_teams_by_year(year=year, page_num=i)
-                    for i in range(MAX_TEAMS_PAGE_NUM)
-                ]
-            )
+            [t async for t in tpa.get_all_teams_by_year(year=year)]
         ):
             bar.set_description(team.key)
             n_districts = 0
@@ -270,23 +262,23 @@ async def unused():
 
     n = 0
     async with tpa_cm() as tpa:
-        for page in trange(MAX_TEAMS_PAGE_RANGE):
-            async for team in tpa.get_teams(page_num=page):
-                while n < team.team_number:
-                    # print(n)
-
-                    if (
-                        (len(set(str(n))) in [1, 2])
-                        and not any([c in str(n) for c in "0689"])
-                        and n >= 325
-                        and prime(n)
-                    ):
-                        print(n)
+        all_teams = [t async for t in tpa.get_all_teams()]
+        for team in sorted(all_teams, key=lambda t: t.team_number):
+            while n < team.team_number:
+                # print(n)
 
-                    n += 1
+                if (
+                    (len(set(str(n))) in [1, 2])
+                    and not any([c in str(n) for c in "0689"])
+                    and n >= 325
+                    and prime(n)
+                ):
+                    print(n)
 
                 n += 1
 
+            n += 1
+
 
 @expose
 async def non_1_seed_wins():
@@ -734,8 +726,9 @@ async def youngest_einstein():
         ):
             async for award in tpa.get_event_awards(event_key=event.key):
                 if award.award_type == AwardType.WINNER:
-                    for recipient in award.recipient_list:
-                        team = await tpa.get_team(team_key=recipient.team_key)
+                    async for team in tpa.get_teams_by_keys(
+                        team_keys=[r.team_key for r in award.recipient_list]
+                    ):
                         ages[event.year - team.rookie_year].append(
                             [team.team_number, event.year]
                         )
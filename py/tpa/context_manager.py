@@ -1,21 +1,124 @@
+import asyncio
+import functools
+import inspect
 from contextlib import asynccontextmanager
+from itertools import cycle
+from typing import Callable
 
 from grpclib.client import Channel
+from grpclib.config import Configuration
+from grpclib.exceptions import StreamTerminatedError
 
 from protos.tpa import TpaStub
+from py.util import (
+    TPA_CHANNEL_POOL_SIZE,
+    TPA_HOST,
+    TPA_KEEPALIVE_SECONDS,
+    TPA_PORT,
+    TPA_RECONNECT_ATTEMPTS,
+)
 
-ch = Channel(host="127.0.0.1", port=1337)
-stub = TpaStub(channel=ch)
+# Raised when the proxy goes away (restart, crash) under an open connection.
+RECONNECTABLE_ERRORS = (ConnectionError, OSError, StreamTerminatedError)
+
+
+class ChannelPool:
+    def __init__(
+        self,
+        host: str = TPA_HOST,
+        port: int = TPA_PORT,
+        size: int = TPA_CHANNEL_POOL_SIZE,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.size = size
+        self.channels = []
+        self.stubs = None
+
+    def open(self) -> None:
+        if self.stubs is not None:
+            return
+
+        config = Configuration(
+            _keepalive_time=TPA_KEEPALIVE_SECONDS,
+            _keepalive_permit_without_calls=True,
+            _http2_min_sent_ping_interval_without_data=TPA_KEEPALIVE_SECONDS,
+        )
+        self.channels = [
+            Channel(host=self.host, port=self.port, config=config)
+            for _ in range(self.size)
+        ]
+        self.stubs = cycle([TpaStub(channel=ch) for ch in self.channels])
+
+    def next_stub(self) -> TpaStub:
+        self.open()
+        return next(self.stubs)
+
+    def close(self) -> None:
+        for ch in self.channels:
+            ch.close()
+
+        self.channels = []
+        self.stubs = None
+
+
+class PooledStub:
+    """Drop-in for `TpaStub` that spreads calls over a `ChannelPool`.
+
+    Calls that fail because the proxy went away are retried on the next channel
+    (grpclib reconnects lazily). Streams are only retried if nothing has been
+    yielded yet, so callers never see duplicated items.
+    """
+
+    def __init__(self, pool: ChannelPool) -> None:
+        self.pool = pool
+
+    def __getattr__(self, name: str) -> Callable:
+        method = getattr(TpaStub, name)
+
+        if inspect.isasyncgenfunction(method):
+
+            @functools.wraps(method)
+            async def stream(*args, **kwargs):
+                for attempt in range(TPA_RECONNECT_ATTEMPTS):
+                    started = False
+                    try:
+                        stub = self.pool.next_stub()
+                        async for item in getattr(stub, name)(*args, **kwargs):
+                            started = True
+                            yield item
+                        return
+                    except RECONNECTABLE_ERRORS:
+                        if started or attempt == TPA_RECONNECT_ATTEMPTS - 1:
+                            raise
+                        await asyncio.sleep(2**attempt)
+
+            return stream
+
+        @functools.wraps(method)
+        async def unary(*args, **kwargs):
+            for attempt in range(TPA_RECONNECT_ATTEMPTS):
+                try:
+                    stub = self.pool.next_stub()
+                    return await getattr(stub, name)(*args, **kwargs)
+                except RECONNECTABLE_ERRORS:
+                    if attempt == TPA_RECONNECT_ATTEMPTS - 1:
+                        raise
+                    await asyncio.sleep(2**attempt)
+
+        return unary
+
+
+pool = ChannelPool()
+stub = PooledStub(pool)
 
 
 @asynccontextmanager
 async def tpa_cm():
-    try:
-        yield stub
-    finally:
-        # ch.close()
-        pass
+    # Channels outlive the block on purpose: nested and sequential tpa_cm()s
+    # share the pool, and `close` tears it down once the command finishes.
+    yield stub
 
 
 def close():
-    ch.close()
+    pool.close()
@@ -1,7 +1,8 @@
 import json
 import os
+import time
 from collections import defaultdict
-from typing import List
+from typing import Dict, List
 
 from geopy.geocoders import Nominatim
 
@@ -13,16 +14,212 @@ import statbotics
 
 # sb = statbotics.Statbotics()
 
+ELOS_PATH = "py/data/elos.json"
+REGIONS_PATH = "py/data/regions.json"
+
+REGION_COLORS = {
+    "fim": "#0076B6",
+    "ne": "#006D00",
+    "chs": "#CC8400",
+    "ont": "#134A8E",
+    "fit": "#A71930",
+    "in": "#CCAC00",
+    "fma": "#C542F5",
+    "fnc": "#FFC0CB",
+    "pnw": "#69BE28",
+    # "pch": "",
+    "Minnesota": "#660066",
+    "New York": "#0C2340",
+    "California": "#E56B6F",
+}
+
+# Correction tables: bad value -> {team number / event key: fixed value}.
+# Use 0 as default.
+TEAM_CITY_FIXES = {
+    "Falmouth/Gorham": {172: "Falmouth"},
+    "Famindale": {361: "Farmingdale"},
+    "Harrisonburburg": {1154: "Harrisonburg"},
+    "currently meeting in Bedford": {1519: "Bedford"},
+    "rishon le tzion": {6741: "Rishon LeZion"},
+    "Kibutz E'in Shemer": {1657: "Ein Shemer"},
+    "Gadera": {1942: "Gedera"},
+    "Port Hueneme CBC Base": {0: "Oxnard"},
+    "pttsburgh": {3108: "Pittsburgh"},
+    "Okland": {4047: "Oakland"},
+    "San Antoino": {4670: "San Antonio"},
+    "Southbury / Middlebury": {2064: "Middlebury"},
+    "Rosh Hayin": {1943: "Rosh HaAyin"},
+    "APO": {3011: "Wiesbaden"},
+    "bet-hasmonai": {4661: "Azarya"},
+    "Petah Tiqua": {5928: "Petah Tikva"},
+    "Kfar hanoar Neurim ": {7039: "Ne'urim"},
+    "Cuautilán Izcalli": {4371: "Cuautitlán Izcalli"},
+    "Santa Catarina / Tuxtla Gutierrez, Chiapas": {6017: "Santa Catarina"},
+    "Wuri Dist.": {7130: "Wuri District"},
+    "taybe": {7177: "Tayibe"},
+    "Santiago": {2576: ""},
+    "St. Cloud & Harmony": {1390: "St. Cloud"},
+    "Detroi": {4834: "Detroit"},
+    "Pghp": {1707: "Pittsburgh"},
+    "Cape Vincent / Clayton": {1713: "Cape Vincent"},
+    "Kefar Blum": {3034: "Kfar Blum"},
+    "Dabburiya": {5715: "Daburiyya"},
+    "Jaffa of Nazareth": {7554: "Yafa an-Naseriyye"},
+    "arara negev": {6149: "Ar'arat an-Naqab"},
+    "Jadeh Mahbas": {7329: ""},
+    "Tamra GLIL": {1946: "Tamra"},
+}
+
+
+TEAM_STATE_PROV_FIXES = {
+    "TA": {0: "Tel Aviv District"},
+    "Tel-Aviv": {6741: ""},
+    "HaMerkaz": {0: "Center District"},
+    "HaMerkaz (Central)": {1952: "Center District"},
+    "HaDarom": {0: ""},
+    "HaDarom (Southern)": {2216: ""},
+    "HaZafon": {0: ""},
+    "HaZafon (Northern)": {0: ""},
+    "Kaohsiung Special Municipality": {0: ""},
+    "Changhua": {0: ""},
+    "Taipei Special Municipality": {0: ""},
+    "Tainan Municipality": {0: ""},
+    "Taichung Municipality": {0: ""},
+    "Dolnoslaskie": {7570: ""},
+    "Región Metropolitana de Santiago": {0: ""},
+}
+
+
+TEAM_COUNTRY_FIXES = {
+    "Chinese Taipei": {0: "Taiwan"},
+}
+
+
+EVENT_CITY_FIXES = {
+    "": {
+        "2006ca": "Los Angeles",
+        "2007az": "Phoenix",
+        "2007br": "Porto Alegre",
+        "2007ca": "Los Angeles",
+        "2007co": "Denver",
+        "2007ct": "Hartford",
+        "2007fl": "Orlando",
+        "2013mm": "Montgomery Township",
+        "2013mshsl": "Minneapolis",
+        "2013rsr": "New Orleans",
+        "2014bfbg": "Lexington",
+    },
+    "Seatwen": {0: ""},
+    "Troy": {0: "City of Troy"},
+}
+
+
+EVENT_STATE_PROV_FIXES = {
+    "": {
+        "2006ca": "California",
+        "2007az": "Arizona",
+        "2007br": "",
+        "2007ca": "California",
+        "2007co": "Colorado",
+        "2007ct": "Connecticut",
+        "2007fl": "Florida",
+        "2013mm": "New Jersey",
+        "2013mshsl": "Minnesota",
+        "2013rsr": "Louisiana",
+        "2014bfbg": "Kentucky",
+    },
+    "HaMerkaz": {0: "Center District"},
+    "KY": {"2008ios": ""},
+    "TXQ": {0: "Taichung City"},
+}
+
+
+EVENT_COUNTRY_FIXES = {
+    "": {"2007br": "Brazil", 0: "USA"},
+    "Chinese Taipei": {0: "Taiwan"},
+    "Austrialia": {"2017aurb": "Australia"},
+    "Northern Israel": {"2008ios": "Israel"},
+}
+
+
+# Loaded from ELOS_PATH / REGIONS_PATH by load_fix_data.
+team_elos = {}  # type: Dict[int, Dict[int, float]]
+regions = {}  # type: Dict[str, str]
+fix_data_mtimes = None
+fix_data_checked = 0.0
+
+# Fixed output per entity, keyed by the inputs the fixers read. Cleared whenever
+# the data files change.
+team_memo = {}  # type: Dict[tuple, tuple]
+event_memo = {}  # type: Dict[tuple, tuple]
+
+
+def load_fix_data():
+    global team_elos, regions, fix_data_mtimes
+    fix_data_mtimes = tuple(os.stat(p).st_mtime_ns for p in [ELOS_PATH, REGIONS_PATH])
+
+    with open(ELOS_PATH, "r") as f:
+        team_elos = {
+            int(team_number): {
+                int(year): elo for year, elo in years.items() if elo not in [None, 0.0]
+            }
+            for team_number, years in json.load(f).items()
+        }
+
+    with open(REGIONS_PATH, "r") as f:
+        regions = json.load(f)
+
+    team_memo.clear()
+    event_memo.clear()
+
+
+def reload_fix_data_if_changed():
+    global fix_data_checked
+    now = time.monotonic()
+    if now - fix_data_checked < 1:
+        return
+
+    fix_data_checked = now
+    mtimes = tuple(os.stat(p).st_mtime_ns for p in [ELOS_PATH, REGIONS_PATH])
+    if mtimes != fix_data_mtimes:
+        load_fix_data()
+
+
+load_fix_data()
 
-with open("py/data/elos.json", "r") as f:
-    raw_elos = json.load(f)
 
+def lookup_fix(table: Dict[str, dict], value: str, key) -> str:
+    if value not in table:
+        return value
 
-with open("py/data/regions.json", "r") as f:
-    regions = json.load(f)
+    return table[value].get(key, table[value].get(0, value))
 
 
 def fix_team(team: Team) -> Team:
+    reload_fix_data_if_changed()
+    memo_key = (
+        team.key,
+        team.team_number,
+        team.city,
+        team.state_prov,
+        team.country,
+        team.lat,
+        team.lng,
+    )
+    if memo_key in team_memo:
+        (
+            team.city,
+            team.state_prov,
+            team.country,
+            team.lat,
+            team.lng,
+            elos,
+            team.region.name,
+            team.region.color,
+        ) = team_memo[memo_key]
+        team.yearly_elos = dict(elos)
+        return team
+
     for f in [
         fix_team_city,
         fix_team_state_prov,
@@ -33,103 +230,67 @@ def fix_team(team: Team) -> Team:
     ]:
         team = f(team)
 
+    team_memo[memo_key] = (
+        team.city,
+        team.state_prov,
+        team.country,
+        team.lat,
+        team.lng,
+        dict(team.yearly_elos),
+        team.region.name,
+        team.region.color,
+    )
     return team
 
 
 def fix_event(event: Event) -> Event:
+    reload_fix_data_if_changed()
+    memo_key = (
+        event.key,
+        event.city,
+        event.state_prov,
+        event.country,
+        event.lat,
+        event.lng,
+    )
+    if memo_key in event_memo:
+        (
+            event.city,
+            event.state_prov,
+            event.country,
+            event.lat,
+            event.lng,
+        ) = event_memo[memo_key]
+        return event
+
     for f in [fix_event_city, fix_event_state_prov, fix_event_country, fix_event_geo]:
         event = f(event)
 
+    event_memo[memo_key] = (
+        event.city,
+        event.state_prov,
+        event.country,
+        event.lat,
+        event.lng,
+    )
     return event
 
 
 def fix_team_region(team: Team) -> Team:
     team.region.name = regions.get(team.key, "")
-    team.region.color = {
-        "fim": "#0076B6",
-        "ne": "#006D00",
-        "chs": "#CC8400",
-        "ont": "#134A8E",
-        "fit": "#A71930",
-        "in": "#CCAC00",
-        "fma": "#C542F5",
-        "fnc": "#FFC0CB",
-        "pnw": "#69BE28",
-        # "pch": "",
-        "Minnesota": "#660066",
-        "New York": "#0C2340",
-        "California": "#E56B6F",
-    }.get(team.region.name, "#808080")
+    team.region.color = REGION_COLORS.get(team.region.name, "#808080")
     return team
 
 
 def fix_team_city(team: Team) -> Team:
-    d = {
-        "Falmouth/Gorham": {172: "Falmouth"},
-        "Famindale": {361: "Farmingdale"},
-        "Harrisonburburg": {1154: "Harrisonburg"},
-        "currently meeting in Bedford": {1519: "Bedford"},
-        "rishon le tzion": {6741: "Rishon LeZion"},
-        "Kibutz E'in Shemer": {1657: "Ein Shemer"},
-        "Gadera": {1942: "Gedera"},
-        "Port Hueneme CBC Base": {0: "Oxnard"},
-        "pttsburgh": {3108: "Pittsburgh"},
-        "Okland": {4047: "Oakland"},
-        "San Antoino": {4670: "San Antonio"},
-        "Southbury / Middlebury": {2064: "Middlebury"},
-        "Rosh Hayin": {1943: "Rosh HaAyin"},
-        "APO": {3011: "Wiesbaden"},
-        "bet-hasmonai": {4661: "Azarya"},
-        "Petah Tiqua": {5928: "Petah Tikva"},
-        "Kfar hanoar Neurim ": {7039: "Ne'urim"},
-        "Cuautilán Izcalli": {4371: "Cuautitlán Izcalli"},
-        "Santa Catarina / Tuxtla Gutierrez, Chiapas": {6017: "Santa Catarina"},
-        "Wuri Dist.": {7130: "Wuri District"},
-        "taybe": {7177: "Tayibe"},
-        "Santiago": {2576: ""},
-        "St. Cloud & Harmony": {1390: "St. Cloud"},
-        "Detroi": {4834: "Detroit"},
-        "Pghp": {1707: "Pittsburgh"},
-        "Cape Vincent / Clayton": {1713: "Cape Vincent"},
-        "Kefar Blum": {3034: "Kfar Blum"},
-        "Dabburiya": {5715: "Daburiyya"},
-        "Jaffa of Nazareth": {7554: "Yafa an-Naseriyye"},
-        "arara negev": {6149: "Ar'arat an-Naqab"},
-        "Jadeh Mahbas": {7329: ""},
-        "Tamra GLIL": {1946: "Tamra"},
-    }
-
-    # Use 0 as default
-    if team.city in d:
-        team.city = d[team.city].get(team.team_number, d[team.city].get(0, team.city))
-
+    team.city = lookup_fix(TEAM_CITY_FIXES, team.city, team.team_number)
     return team
 
 
 def fix_team_state_prov(team: Team) -> Team:
-    d = {
-        "TA": {0: "Tel Aviv District"},
-        "Tel-Aviv": {6741: ""},
-        "HaMerkaz": {0: "Center District"},
-        "HaMerkaz (Central)": {1952: "Center District"},
-        "HaDarom": {0: ""},
-        "HaDarom (Southern)": {2216: ""},
-        "HaZafon": {0: ""},
-        "HaZafon (Northern)": {0: ""},
-        "Kaohsiung Special Municipality": {0: ""},
-        "Changhua": {0: ""},
-        "Taipei Special Municipality": {0: ""},
-        "Tainan Municipality": {0: ""},
-        "Taichung Municipality": {0: ""},
-        "Dolnoslaskie": {7570: ""},
-        "Región Metropolitana de Santiago": {0: ""},
-    }
-
-    # Use 0 as default
-    if team.state_prov in d:
-        team.state_prov = d[team.state_prov].get(
-            team.team_number, d[team.state_prov].get(0, team.state_prov)
-        )
+    team.state_prov = lookup_fix(
+        TEAM_STATE_PROV_FIXES, team.state_prov, team.team_number
+    )
 
     if team.state_prov in SHORT_TO_STATE and team.country in ["USA", "Canada"]:
         team.state_prov = SHORT_TO_STATE[team.state_prov]
@@ -138,16 +299,7 @@ def fix_team_state_prov(team: Team) -> Team:
 
 
 def fix_team_country(team: Team) -> Team:
-    d = {
-        "Chinese Taipei": {0: "Taiwan"},
-    }
-
-    # Use 0 as default
-    if team.country in d:
-        team.country = d[team.country].get(
-            team.team_number, d[team.country].get(0, team.country)
-        )
-
+    team.country = lookup_fix(TEAM_COUNTRY_FIXES, team.country, team.team_number)
     return team
 
 
@@ -170,11 +322,7 @@ def fix_team_geo(team: Team) -> Team:
 
 
 def fix_team_elos(team: Team) -> Team:
-    team.yearly_elos = {
-        int(k): v
-        for k, v in raw_elos.get(str(team.team_number), dict()).items()
-        if v not in [None, 0.0]
-    }
+    team.yearly_elos = dict(team_elos.get(team.team_number, {}))
 
     # team.yearly_elos = {2022: sb.get_team(team.team_number)["elo"]}
 
@@ -182,56 +330,12 @@ def fix_team_elos(team: Team) -> Team:
 
 
 def fix_event_city(event: Event) -> Event:
-    d = {
-        "": {
-            "2006ca": "Los Angeles",
-            "2007az": "Phoenix",
-            "2007br": "Porto Alegre",
-            "2007ca": "Los Angeles",
-            "2007co": "Denver",
-            "2007ct": "Hartford",
-            "2007fl": "Orlando",
-            "2013mm": "Montgomery Township",
-            "2013mshsl": "Minneapolis",
-            "2013rsr": "New Orleans",
-            "2014bfbg": "Lexington",
-        },
-        "Seatwen": {0: ""},
-        "Troy": {0: "City of Troy"},
-    }
-
-    # Use 0 as default
-    if event.city in d:
-        event.city = d[event.city].get(event.key, d[event.city].get(0, event.city))
-
+    event.city = lookup_fix(EVENT_CITY_FIXES, event.city, event.key)
     return event
 
 
 def fix_event_state_prov(event: Event) -> Event:
-    d = {
-        "": {
-            "2006ca": "California",
-            "2007az": "Arizona",
-            "2007br": "",
-            "2007ca": "California",
-            "2007co": "Colorado",
-            "2007ct": "Connecticut",
-            "2007fl": "Florida",
-            "2013mm": "New Jersey",
-            "2013mshsl": "Minnesota",
-            "2013rsr": "Louisiana",
-            "2014bfbg": "Kentucky",
-        },
-        "HaMerkaz": {0: "Center District"},
-        "KY": {"2008ios": ""},
-        "TXQ": {0: "Taichung City"},
-    }
-
-    # Use 0 as default
-    if event.state_prov in d:
-        event.state_prov = d[event.state_prov].get(
-            event.key, d[event.state_prov].get(0, event.state_prov)
-        )
+    event.state_prov = lookup_fix(EVENT_STATE_PROV_FIXES, event.state_prov, event.key)
 
     if event.state_prov in SHORT_TO_STATE and event.country == "USA":
         event.state_prov = SHORT_TO_STATE[event.state_prov]
@@ -240,19 +344,7 @@ def fix_event_state_prov(event: Event) -> Event:
 
 
 def fix_event_country(event: Event) -> Event:
-    d = {
-        "": {"2007br": "Brazil", 0: "USA"},
-        "Chinese Taipei": {0: "Taiwan"},
-        "Austrialia": {"2017aurb": "Australia"},
-        "Northern Israel": {"2008ios": "Israel"},
-    }
-
-    # Use 0 as default
-    if event.country in d:
-        event.country = d[event.country].get(
-            event.key, d[event.country].get(0, event.country)
-        )
-
+    event.country = lookup_fix(EVENT_COUNTRY_FIXES, event.country, event.key)
     return event
 
 
@@ -0,0 +1,258 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import struct
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+import betterproto
+
+from py.tpa.tracer import mark_cache
+from py.util import CURRENT_YEAR, CURRENT_YEAR_FRESH_FOR, PAST_YEAR_FRESH_FOR
+
+# Files whose contents shape every fixed message. Editing any of them changes the
+# fingerprint, which orphans (and on the next open, deletes) cached responses.
+CODE_INPUTS = [
+    "py/tpa/force_fixes.py",
+    "py/tpa/tpa_server.py",
+]
+# Only read by fix_team, so they only fingerprint Team responses.
+TEAM_DATA_INPUTS = [
+    "py/data/elos.json",
+    "py/data/regions.json",
+]
+FIX_INPUTS = CODE_INPUTS + TEAM_DATA_INPUTS
+
+_LEN = struct.Struct("<I")
+
+# path -> ((mtime, size), content hash), so unchanged files aren't rehashed.
+_file_hashes = {}  # type: Dict[str, Tuple[Tuple[int, int], str]]
+
+
+def file_hash(path: str) -> str:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "-"
+
+    stamp = (st.st_mtime_ns, st.st_size)
+    if path not in _file_hashes or _file_hashes[path][0] != stamp:
+        with open(path, "rb") as f:
+            _file_hashes[path] = (stamp, hashlib.sha1(f.read()).hexdigest())
+
+    return _file_hashes[path][1]
+
+
+def fix_fingerprint(inputs: List[str] = FIX_INPUTS) -> str:
+    # By content, so rewriting a file with the same data (a rerun of elo
+    # generate) keeps the cache.
+    parts = [f"{path}:{file_hash(path)}" for path in inputs]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def message_inputs(message_type: Type[betterproto.Message]) -> List[str]:
+    return FIX_INPUTS if message_type.__name__ == "Team" else CODE_INPUTS
+
+
+def pack(messages: Iterable[bytes]) -> bytes:
+    return b"".join(_LEN.pack(len(m)) + m for m in messages)
+
+
+def unpack(data: bytes) -> List[bytes]:
+    out = []
+    pos = 0
+    while pos < len(data):
+        (n,) = _LEN.unpack_from(data, pos)
+        pos += _LEN.size
+        out.append(data[pos : pos + n])
+        pos += n
+
+    return out
+
+
+def is_current_season(args: Dict[str, object]) -> bool:
+    for v in args.values():
+        if v == CURRENT_YEAR or (type(v) is str and str(CURRENT_YEAR) in v):
+            return True
+
+    return False
+
+
+class PbCache:
+    """Caches already-fixed, serialized TPA responses keyed by RPC name + args."""
+
+    def __init__(self, path: str = "tpa_cache.sqlite") -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, created REAL, expires REAL, data BLOB)"
+        )
+        self.conn.commit()
+        # key -> future resolving to the packed response, or None if the leader
+        # gave up (client went away, upstream error) and a waiter should retry.
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.fingerprints = ()  # type: Tuple[str, ...]
+        self.prune()
+
+    def prune(self) -> None:
+        """Delete responses cached under any fingerprint but the current ones."""
+        self.fingerprints = tuple(
+            sorted({fix_fingerprint(CODE_INPUTS), fix_fingerprint(FIX_INPUTS)})
+        )
+        self.conn.execute(
+            "DELETE FROM responses WHERE substr(key, 1, instr(key, ':') - 1) "
+            f"NOT IN ({', '.join('?' * len(self.fingerprints))})",
+            self.fingerprints,
+        )
+        self.conn.commit()
+
+    def key(
+        self, rpc: str, args: Dict[str, object], inputs: List[str] = FIX_INPUTS
+    ) -> str:
+        # Fingerprinted per call so edits to elos.json / regions.json on a running
+        # proxy take effect without a restart.
+        fingerprint = fix_fingerprint(inputs)
+        if fingerprint not in self.fingerprints:
+            self.prune()
+
+        return f"{fingerprint}:{rpc}:{json.dumps(args, sort_keys=True)}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self.conn.execute(
+            "SELECT expires, data FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        expires, data = row
+        if expires is not None and expires < time.time():
+            return None
+
+        return data
+
+    def set(self, key: str, data: bytes, current_season: bool) -> None:
+        now = time.time()
+        fresh_for = CURRENT_YEAR_FRESH_FOR if current_season else PAST_YEAR_FRESH_FOR
+        expires = now + fresh_for.total_seconds()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+            (key, now, expires, data),
+        )
+        self.conn.commit()
+
+    async def join_flight(
+        self, key: str
+    ) -> Tuple[Optional[bytes], Optional[asyncio.Future]]:
+        """(data, None) from an identical call already in flight, else
+        (None, flight) for a flight the caller now leads and must end.
+
+        When a leader gives up, its waiters all wake, but the first one starts
+        the next flight before yielding, so the rest wait on it instead of all
+        going upstream together.
+        """
+        while key in self.in_flight:
+            data = await asyncio.shield(self.in_flight[key])
+            if data is not None:
+                return data, None
+
+        return None, self.start_flight(key)
+
+    def start_flight(self, key: str) -> asyncio.Future:
+        flight = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = flight
+        return flight
+
+    def end_flight(self, key: str, flight: asyncio.Future, data: Optional[bytes]):
+        if not flight.done():
+            flight.set_result(data)
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
+
+    def clear(self) -> None:
+        self.conn.execute("DELETE FROM responses")
+        self.conn.commit()
+
+
+def pb_cached(message_type: Type[betterproto.Message]) -> Callable:
+    """Serve a TPAService handler from `self.pb_cache` when possible.
+
+    Works for both unary handlers and server-stream (async generator) handlers.
+    Streams are only stored once they have been fully consumed. Concurrent
+    identical calls are coalesced: the first one goes upstream and the rest wait
+    for its result instead of issuing their own fetch.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        sig = inspect.signature(fn)
+        inputs = message_inputs(message_type)
+
+        def call_args(self, args, kwargs) -> Dict[str, object]:
+            bound = sig.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            return {k: v for k, v in bound.arguments.items() if k != "self"}
+
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def stream_wrapper(self, *args, **kwargs):
+                fn_args = call_args(self, args, kwargs)
+                key = self.pb_cache.key(fn.__name__, fn_args, inputs)
+                data = self.pb_cache.get(key)
+                if data is not None:
+                    mark_cache("hit")
+                else:
+                    data, flight = await self.pb_cache.join_flight(key)
+                    if data is not None:
+                        mark_cache("coalesced")
+                if data is not None:
+                    for raw in unpack(data):
+                        yield message_type.FromString(raw)
+                    return
+
+                mark_cache("miss")
+                try:
+                    out = []
+                    async for msg in fn(self, *args, **kwargs):
+                        out.append(msg.SerializeToString())
+                        yield msg
+
+                    data = pack(out)
+                    self.pb_cache.set(key, data, is_current_season(fn_args))
+                finally:
+                    self.pb_cache.end_flight(key, flight, data)
+
+            return stream_wrapper
+
+        @functools.wraps(fn)
+        async def unary_wrapper(self, *args, **kwargs):
+            fn_args = call_args(self, args, kwargs)
+            key = self.pb_cache.key(fn.__name__, fn_args, inputs)
+            data = self.pb_cache.get(key)
+            if data is not None:
+                mark_cache("hit")
+            else:
+                data, flight = await self.pb_cache.join_flight(key)
+                if data is not None:
+                    mark_cache("coalesced")
+            if data is not None:
+                return message_type.FromString(data)
+
+            mark_cache("miss")
+            try:
+                msg = await fn(self, *args, **kwargs)
+                if msg is not None:
+                    data = msg.SerializeToString()
+                    self.pb_cache.set(key, data, is_current_season(fn_args))
+            finally:
+                self.pb_cache.end_flight(key, flight, data)
+
+            return msg
+
+        return unary_wrapper
+
+    return decorator
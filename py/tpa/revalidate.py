@@ -0,0 +1,123 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from py.tpa.tracer import add_upstream_bytes
+from py.util import CURRENT_YEAR, CURRENT_YEAR_FRESH_FOR
+
+# Headers that describe the wire encoding rather than the stored (decoded) body.
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+Stored = Tuple[Optional[str], Optional[str], str, bytes, float]
+
+
+class RevalidatingAdapter(BaseAdapter):
+    """Conditional-request cache for current-season TBA URLs.
+
+    Within CURRENT_YEAR_FRESH_FOR a stored body is served as-is. After that the
+    request goes upstream with If-None-Match / If-Modified-Since, and a 304 just
+    refreshes the stored copy instead of re-downloading it. Anything that isn't
+    current-season is handed to `fallback` untouched.
+    """
+
+    def __init__(self, fallback: BaseAdapter, path: str = "tpa_cache.sqlite"):
+        super().__init__()
+        self.fallback = fallback
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_responses "
+            "(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT, "
+            "body BLOB, checked REAL)"
+        )
+        self.conn.commit()
+
+    def load(self, url: str) -> Optional[Stored]:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT etag, last_modified, headers, body, checked "
+                "FROM http_responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+    def store(self, url: str, response: Response) -> None:
+        headers = {
+            k: v
+            for k, v in response.headers.items()
+            if k.lower() not in DROPPED_HEADERS
+        }
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO http_responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    json.dumps(headers),
+                    response.content,
+                    time.time(),
+                ),
+            )
+            self.conn.commit()
+
+    def touch(self, url: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "UPDATE http_responses SET checked = ? WHERE url = ?",
+                (time.time(), url),
+            )
+            self.conn.commit()
+
+    def build_response(self, request: PreparedRequest, stored: Stored) -> Response:
+        _, _, headers, body, _ = stored
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def send_upstream(self, request: PreparedRequest, **kwargs) -> Response:
+        response = self.fallback.send(request, **kwargs)
+        if not getattr(response, "from_cache", False):
+            add_upstream_bytes(len(response.content))
+
+        return response
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        if request.method != "GET" or str(CURRENT_YEAR) not in request.url:
+            return self.send_upstream(request, **kwargs)
+
+        stored = self.load(request.url)
+        if stored is not None:
+            etag, last_modified, _, _, checked = stored
+            if time.time() - checked < CURRENT_YEAR_FRESH_FOR.total_seconds():
+                return self.build_response(request, stored)
+
+            if etag is not None:
+                request.headers["If-None-Match"] = etag
+            if last_modified is not None:
+                request.headers["If-Modified-Since"] = last_modified
+
+        response = self.send_upstream(request, **kwargs)
+        if response.status_code == 304 and stored is not None:
+            self.touch(request.url)
+            return self.build_response(request, stored)
+
+        if response.status_code == 200:
+            self.store(request.url, response)
+
+        return response
+
+    def close(self) -> None:
+        self.fallback.close()
+        self.conn.close()
@@ -1,6 +1,19 @@
-import inspect
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pprint import pprint
-from typing import AsyncIterator, ForwardRef
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    ForwardRef,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from protos.tpa import *
 from py.tba import tba
@@ -11,7 +24,10 @@ from py.tpa.force_fixes import (
     fix_team,
     gen_missing_event_alliances,
 )
-from py.util import MAX_TEAMS_PAGE_RANGE
+from py.tpa.pb_cache import PbCache, fix_fingerprint, pb_cached
+from py.tpa.revalidate import RevalidatingAdapter
+from py.tpa.tracer import traced
+from py.util import TEAMS_PAGE_FAN_OUT, TPA_MAX_CONCURRENCY
 
 SBs = {
     2015: (MatchScoreBreakdown2015, MatchScoreBreakdown2015Alliance),
@@ -26,15 +42,6 @@ SBs = {
 }
 
 
-def print_current_args():
-    stack = inspect.stack()
-    frame = stack[1][0]
-    fn_name = frame.f_code.co_name
-    fn_args = inspect.getargvalues(frame).locals
-    arg_str = ", ".join([f"{k}={v}" for k, v in fn_args.items() if k != "self"])
-    print(f"{fn_name}({arg_str})")
-
-
 def tba_match_to_tpa_match(m) -> Match:
     if "score_breakdown" not in m or m["score_breakdown"] is None:
         return fix_match(Match().from_dict(m))
@@ -66,69 +73,105 @@ def tba_match_to_tpa_match(m) -> Match:
 
 
 class TPAService(TpaBase):
+    def __init__(self, max_concurrency: int = TPA_MAX_CONCURRENCY) -> None:
+        # tbapy is blocking, so upstream calls run on a bounded pool to keep the
+        # grpclib event loop free to serve other streams in the meantime.
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="tba"
+        )
+        self.max_concurrency = max_concurrency
+        self.pb_cache = PbCache()
+        # Keyed by the fix fingerprint, like the cache, so edits to elos.json /
+        # regions.json rebuild it.
+        self.team_index: Optional[Tuple[str, Dict[str, Team]]] = None
+        self.team_index_lock = asyncio.Lock()
+        tba.session.mount(
+            tba.READ_URL_PRE,
+            RevalidatingAdapter(fallback=tba.session.get_adapter(tba.READ_URL_PRE)),
+        )
+
+    async def fetch(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        # Carry the current trace span over so the HTTP adapter can count bytes.
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, partial(ctx.run, fn, *args, **kwargs)
+        )
+
+    @traced
     async def get_district_events(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("Event")]:
-        print_current_args()  #  get_district_events
         return None
 
+    @traced
     async def get_district_events_keys(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_district_events_keys
         return None
 
+    @traced
     async def get_district_events_simple(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("EventSimple")]:
-        print_current_args()  #  get_district_events_simple
         return None
 
+    @traced
+    @pb_cached(DistrictRanking)
     async def get_district_rankings(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("DistrictRanking")]:
         try:
-            for a in tba.district_rankings(district=district_key):
+            for a in await self.fetch(tba.district_rankings, district=district_key):
                 pprint(a)
                 yield DistrictRanking().from_dict(a)
         except ValueError:
             pass
 
+    @traced
+    @pb_cached(Team)
     async def get_district_teams(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("Team")]:
-        print_current_args()  #  get_district_teams
-        for team in tba.district_teams(district=district_key):
+        for team in await self.fetch(tba.district_teams, district=district_key):
             yield fix_team(Team().from_dict(team))
 
+    @traced
     async def get_district_teams_keys(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_district_teams_keys
         return None
 
+    @traced
     async def get_district_teams_simple(
         self, district_key: str
     ) -> AsyncIterator[ForwardRef("TeamSimple")]:
-        print_current_args()  #  get_district_teams_simple
         return None
 
+    @traced
+    @pb_cached(DistrictList)
     async def get_districts_by_year(
         self, year: int
     ) -> AsyncIterator[ForwardRef("DistrictList")]:
-        print_current_args()  #  get_districts_by_year
-        for district in tba.districts(year=year):
+        for district in await self.fetch(tba.districts, year=year):
             yield DistrictList().from_dict(district)
 
+    @traced
+    @pb_cached(Event)
     async def get_event(self, event_key: str) -> "Event":
-        return fix_event(Event().from_dict(tba.event(event=event_key)))
+        return fix_event(
+            Event().from_dict(await self.fetch(tba.event, event=event_key))
+        )
 
+    @traced
+    @pb_cached(EliminationAlliance)
     async def get_event_alliances(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("EliminationAlliance")]:
-        print_current_args()
         try:
-            for i, a in enumerate(tba.event_alliances(event=event_key), start=1):
+            for i, a in enumerate(
+                await self.fetch(tba.event_alliances, event=event_key), start=1
+            ):
                 yield fix_event_alliance(EliminationAlliance().from_dict(a), i)
         except TypeError:
             if event_key == "2007sac":
@@ -139,18 +182,20 @@ class TPAService(TpaBase):
             ):
                 yield ea
 
+    @traced
+    @pb_cached(Award)
     async def get_event_awards(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("Award")]:
-        print_current_args()
-        awards = tba.event_awards(event=event_key)
+        awards = await self.fetch(tba.event_awards, event=event_key)
         for a in awards:
             yield Award().from_dict(a)
 
+    @traced
+    @pb_cached(EventDistrictPoints)
     async def get_event_district_points(self, event_key: str) -> "EventDistrictPoints":
-        print_current_args()
         try:
-            edp = tba.event_district_points(event=event_key)
+            edp = await self.fetch(tba.event_district_points, event=event_key)
         except TypeError:
             return EventDistrictPoints()
 
@@ -160,300 +205,464 @@ class TPAService(TpaBase):
 
         return EventDistrictPoints().from_dict(edp)
 
+    @traced
     async def get_event_insights(self, event_key: str) -> "EventInsights":
-        print_current_args()  #  get_event_insights
         return None
 
+    @traced
     async def get_event_match_timeseries(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_event_match_timeseries
         return None
 
+    @traced
+    @pb_cached(Match)
     async def get_event_matches(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("Match")]:
-        print_current_args()
-        for m in tba.event_matches(event=event_key):
+        for m in await self.fetch(tba.event_matches, event=event_key):
             m_ = tba_match_to_tpa_match(m)
             yield m_
 
+    @traced
     async def get_event_matches_keys(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_event_matches_keys
         return None
 
+    @traced
     async def get_event_matches_simple(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("MatchSimple")]:
-        print_current_args()  #  get_event_matches_simple
         return None
 
+    @traced
+    @pb_cached(EventOpRs)
     async def get_event_op_rs(self, event_key: str) -> "EventOpRs":
-        print_current_args()
-        return EventOpRs().from_dict(tba.event_oprs(event=event_key))
+        return EventOpRs().from_dict(await self.fetch(tba.event_oprs, event=event_key))
 
+    @traced
+    @pb_cached(EventRanking)
     async def get_event_rankings(self, event_key: str) -> "EventRanking":
-        print_current_args()
-        return EventRanking().from_dict(tba.event_rankings(event=event_key))
+        return EventRanking().from_dict(
+            await self.fetch(tba.event_rankings, event=event_key)
+        )
 
+    @traced
     async def get_event_simple(self, event_key: str) -> "EventSimple":
-        print_current_args()  #  get_event_simple
         return None
 
+    @traced
+    @pb_cached(Team)
     async def get_event_teams(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("Team")]:
-        print_current_args()
-        teams = tba.event_teams(event=event_key)
+        teams = await self.fetch(tba.event_teams, event=event_key)
         for t in teams:
             yield fix_team(Team().from_dict(t))
 
+    @traced
     async def get_event_teams_keys(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_event_teams_keys
         return None
 
+    @traced
     async def get_event_teams_simple(
         self, event_key: str
     ) -> AsyncIterator[ForwardRef("TeamSimple")]:
-        print_current_args()  #  get_event_teams_simple
         return None
 
+    @traced
+    @pb_cached(Event)
     async def get_events_by_year(self, year: int) -> AsyncIterator[ForwardRef("Event")]:
-        print_current_args()
-        events = tba.events(year=year)
+        events = await self.fetch(tba.events, year=year)
         for e in events:
             yield fix_event(Event().from_dict(e))
 
+    @traced
     async def get_events_by_year_keys(
         self, year: int
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_events_by_year_keys
         return None
 
+    @traced
     async def get_events_by_year_simple(
         self, year: int
     ) -> AsyncIterator[ForwardRef("EventSimple")]:
-        print_current_args()  #  get_events_by_year_simple
         return None
 
+    @traced
+    @pb_cached(Match)
     async def get_match(self, match_key: str) -> "Match":
-        return tba_match_to_tpa_match(tba.match(key=match_key))
+        return tba_match_to_tpa_match(await self.fetch(tba.match, key=match_key))
 
+    @traced
     async def get_match_simple(self, match_key: str) -> "MatchSimple":
-        print_current_args()  #  get_match_simple
         return None
 
+    @traced
     async def get_match_zebra(self, match_key: str) -> "Zebra":
-        print_current_args()  #  get_match_zebra
         return None
 
+    @traced
+    @pb_cached(Team)
     async def get_team(self, team_key: str) -> "Team":
-        print_current_args()
-        return fix_team(Team().from_dict(tba.team(team=team_key)))
+        return fix_team(Team().from_dict(await self.fetch(tba.team, team=team_key)))
 
+    @traced
     async def get_team_awards(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("Award")]:
-        print_current_args()  #  get_team_awards
         return None
 
+    @traced
+    @pb_cached(Award)
     async def get_team_awards_by_year(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("Award")]:
-        print_current_args()
-        awards = tba.team_awards(team_key, year=year)
+        awards = await self.fetch(tba.team_awards, team_key, year=year)
         for award in awards:
             yield Award().from_dict(award)
 
+    @traced
     async def get_team_districts(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("DistrictList")]:
-        print_current_args()  #  get_team_districts
         return None
 
+    @traced
+    @pb_cached(Award)
     async def get_team_event_awards(
         self, team_key: str, event_key: str
     ) -> AsyncIterator[ForwardRef("Award")]:
-        print_current_args()
-        for a in tba.team_awards(team=team_key, event=event_key):
+        for a in await self.fetch(tba.team_awards, team=team_key, event=event_key):
             yield Award().from_dict(a)
 
+    @traced
+    @pb_cached(Match)
     async def get_team_event_matches(
         self, team_key: str, event_key: str
     ) -> AsyncIterator[ForwardRef("Match")]:
-        for m in tba.team_matches(team=team_key, event=event_key):
+        for m in await self.fetch(tba.team_matches, team=team_key, event=event_key):
             yield fix_match(Match().from_dict(m))
 
+    @traced
     async def get_team_event_matches_keys(
         self, team_key: str, event_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_team_event_matches_keys
         return None
 
+    @traced
     async def get_team_event_matches_simple(
         self, team_key: str, event_key: str
     ) -> AsyncIterator[ForwardRef("Match")]:
-        print_current_args()  #  get_team_event_matches_simple
         return None
 
+    @traced
+    @pb_cached(TeamEventStatus)
     async def get_team_event_status(
         self, team_key: str, event_key: str
     ) -> "TeamEventStatus":
         return TeamEventStatus().from_dict(
-            tba.team_status(team=team_key, event=event_key)
+            await self.fetch(tba.team_status, team=team_key, event=event_key)
         )
 
+    @traced
+    @pb_cached(Event)
     async def get_team_events(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("Event")]:
-        print_current_args()  #  get_team_events
-        for e in tba.team_events(team=team_key):
+        for e in await self.fetch(tba.team_events, team=team_key):
             yield fix_event(Event().from_dict(e))
 
+    @traced
+    @pb_cached(Event)
     async def get_team_events_by_year(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("Event")]:
-        print_current_args()
-        for e in tba.team_events(team=team_key, year=year):
+        for e in await self.fetch(tba.team_events, team=team_key, year=year):
             yield fix_event(Event().from_dict(e))
 
+    @traced
     async def get_team_events_by_year_keys(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_team_events_by_year_keys
         return None
 
+    @traced
     async def get_team_events_by_year_simple(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("EventSimple")]:
-        print_current_args()  #  get_team_events_by_year_simple
         return None
 
+    @traced
     async def get_team_events_keys(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_team_events_keys
         return None
 
+    @traced
     async def get_team_events_simple(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("EventSimple")]:
-        print_current_args()  #  get_team_events_simple
         return None
 
+    @traced
+    @pb_cached(Match)
     async def get_team_matches_by_year(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("Match")]:
-        print_current_args()
-        for m in tba.team_matches(team=team_key, year=year):
+        for m in await self.fetch(tba.team_matches, team=team_key, year=year):
             m_ = tba_match_to_tpa_match(m)
             yield m_
 
+    @traced
     async def get_team_matches_by_year_keys(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_team_matches_by_year_keys
         return None
 
+    @traced
     async def get_team_matches_by_year_simple(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("MatchSimple")]:
-        print_current_args()  #  get_team_matches_by_year_simple
         return None
 
+    @traced
     async def get_team_media_by_tag(
         self, team_key: str, media_tag: str
     ) -> AsyncIterator[ForwardRef("Media")]:
-        print_current_args()  #  get_team_media_by_tag
         return None
 
+    @traced
     async def get_team_media_by_tag_year(
         self, team_key: str, media_tag: str, year: int
     ) -> AsyncIterator[ForwardRef("Media")]:
-        print_current_args()  #  get_team_media_by_tag_year
         return None
 
+    @traced
     async def get_team_media_by_year(
         self, team_key: str, year: int
     ) -> AsyncIterator[ForwardRef("Media")]:
-        print_current_args()  #  get_team_media_by_year
         return None
 
+    @traced
     async def get_team_robots(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("TeamRobot")]:
-        print_current_args()  #  get_team_robots
         return None
 
+    @traced
     async def get_team_simple(self, team_key: str) -> "TeamSimple":
-        print_current_args()  #  get_team_simple
         return None
 
+    @traced
     async def get_team_social_media(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("Media")]:
-        print_current_args()  #  get_team_social_media
         return None
 
+    @traced
+    @pb_cached(Response)
     async def get_team_years_participated(
         self, team_key: str
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_team_years_participated
-        for y in tba.team_years(team=team_key):
+        for y in await self.fetch(tba.team_years, team=team_key):
             yield Response(int_value=y)
 
+    @traced
+    @pb_cached(Team)
     async def get_teams(self, page_num: int) -> AsyncIterator[ForwardRef("Team")]:
-        print_current_args()
-        for t in tba.teams(page=page_num):
+        for t in await self.fetch(tba.teams, page=page_num):
             yield fix_team(Team().from_dict(t))
 
+    @traced
+    @pb_cached(Team)
     async def get_teams_by_year(
         self, year: int, page_num: int
     ) -> AsyncIterator[ForwardRef("Team")]:
-        print_current_args()
-        for t in tba.teams(page=page_num, year=year):
+        for t in await self.fetch(tba.teams, page=page_num, year=year):
             yield fix_team(Team().from_dict(t))
 
+    @traced
+    @pb_cached(Response)
     async def get_teams_by_year_keys(
         self, year: int, page_num: int
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()
-        for t in tba.teams(year=year, page=page_num, keys=True):
+        for t in await self.fetch(tba.teams, year=year, page=page_num, keys=True):
             yield Response(string_value=t)
 
+    @traced
     async def get_teams_by_year_simple(
         self, year: int, page_num: int
     ) -> AsyncIterator[ForwardRef("TeamSimple")]:
-        print_current_args()  #  get_teams_by_year_simple
         return None
 
+    @traced
     async def get_teams_keys(
         self, page_num: int
     ) -> AsyncIterator[ForwardRef("Response")]:
-        print_current_args()  #  get_teams_keys
         return None
 
+    @traced
     async def get_teams_simple(
         self, page_num: int
     ) -> AsyncIterator[ForwardRef("TeamSimple")]:
-        print_current_args()  #  get_teams_simple
         return None
 
+    async def fan_out_pages(
+        self, page_fn: Callable[[int], AsyncIterator[Team]]
+    ) -> AsyncIterator[Team]:
+        # Page count isn't known up front: keep a window of pages in flight and
+        # stop scheduling past the first page that comes back empty. Pages that
+        # finish early are held back so teams still come out in page order.
+        async def collect(pg_num: int) -> Tuple[int, List[Team]]:
+            return pg_num, [t async for t in page_fn(pg_num)]
+
+        next_page = 0
+        next_out = 0
+        first_empty = None
+        pending = set()
+        finished = {}  # type: Dict[int, List[Team]]
+        try:
+            while True:
+                while len(pending) < TEAMS_PAGE_FAN_OUT and (
+                    first_empty is None or next_page < first_empty
+                ):
+                    pending.add(asyncio.ensure_future(collect(next_page)))
+                    next_page += 1
+
+                if len(pending) == 0:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    pg_num, teams = task.result()
+                    finished[pg_num] = teams
+                    if len(teams) == 0 and (
+                        first_empty is None or pg_num < first_empty
+                    ):
+                        first_empty = pg_num
+
+                while next_out in finished and next_out != first_empty:
+                    for team in finished.pop(next_out):
+                        yield team
+                    next_out += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @traced
     async def get_all_teams_by_year(self, year: int) -> AsyncIterator["Team"]:
-        print_current_args()
-        for pg_num in range(MAX_TEAMS_PAGE_RANGE):
-            print(f'\t{pg_num}')
-            team_page = tba.teams(page=pg_num, year=year)
-            for team in team_page:
-                yield fix_team(Team().from_dict(team))
+        async for team in self.fan_out_pages(
+            lambda pg_num: self.get_teams_by_year(year=year, page_num=pg_num)
+        ):
+            yield team
 
+    @traced
     async def get_all_teams(self) -> AsyncIterator["Team"]:
-        print_current_args()
-        for pg_num in range(MAX_TEAMS_PAGE_RANGE):
-            team_page = tba.teams(page=pg_num)
-            for team in team_page:
-                yield fix_team(Team().from_dict(team))
+        async for team in self.fan_out_pages(
+            lambda pg_num: self.get_teams(page_num=pg_num)
+        ):
+            yield team
+
+    async def filtered_events(
+        self, year_start: int, year_end: int, event_types: Optional[List[int]]
+    ) -> List[Event]:
+        events = []
+        for year in range(year_start, year_end + 1):
+            async for event in self.get_events_by_year(year=year):
+                if not event_types or event.event_type in event_types:
+                    events.append(event)
+
+        return events
+
+    async def fan_out(
+        self, events: List[Event], fn: Callable[[Event], AsyncIterator]
+    ) -> AsyncIterator:
+        # A fixed pool of workers pulls events off a queue, so a season's worth of
+        # events never means thousands of tasks at once.
+        queue: asyncio.Queue[Event] = asyncio.Queue()
+        for e in events:
+            queue.put_nowait(e)
+        results: asyncio.Queue[Union[list, Exception]] = asyncio.Queue()
+
+        async def worker() -> None:
+            while not queue.empty():
+                event = queue.get_nowait()
+                try:
+                    items = [x async for x in fn(event)]
+                except Exception as e:
+                    results.put_nowait(e)
+                    return
+                results.put_nowait(items)
+
+        n_workers = min(self.max_concurrency, len(events))
+        workers = [asyncio.ensure_future(worker()) for _ in range(n_workers)]
+        try:
+            for _ in events:
+                items = await results.get()
+                if isinstance(items, Exception):
+                    raise items
+                for item in items:
+                    yield item
+        finally:
+            for w in workers:
+                w.cancel()
+
+    @traced
+    async def get_events_matches(
+        self, year_start: int, year_end: int, event_types: Optional[List[int]]
+    ) -> AsyncIterator["Match"]:
+        events = await self.filtered_events(year_start, year_end, event_types)
+        async for m in self.fan_out(
+            events, lambda e: self.get_event_matches(event_key=e.key)
+        ):
+            yield m
+
+    @traced
+    async def get_events_teams(
+        self, year_start: int, year_end: int, event_types: Optional[List[int]]
+    ) -> AsyncIterator["EventTeam"]:
+
+        async def event_teams(event: Event) -> AsyncIterator[EventTeam]:
+            async for t in self.get_event_teams(event_key=event.key):
+                yield EventTeam(event_key=event.key, team=t)
+
+        events = await self.filtered_events(year_start, year_end, event_types)
+        async for et in self.fan_out(events, event_teams):
+            yield et
+
+    @traced
+    async def get_events_awards(
+        self, year_start: int, year_end: int, event_types: Optional[List[int]]
+    ) -> AsyncIterator["Award"]:
+        events = await self.filtered_events(year_start, year_end, event_types)
+        async for a in self.fan_out(
+            events, lambda e: self.get_event_awards(event_key=e.key)
+        ):
+            yield a
+
+    async def get_team_index(self) -> Dict[str, Team]:
+        async with self.team_index_lock:
+            fingerprint = fix_fingerprint()
+            if self.team_index is None or self.team_index[0] != fingerprint:
+                index = {t.key: t async for t in self.get_all_teams()}
+                self.team_index = (fingerprint, index)
+
+        return self.team_index[1]
+
+    @traced
+    async def get_teams_by_keys(
+        self, team_keys: Optional[List[str]]
+    ) -> AsyncIterator["Team"]:
+        index = await self.get_team_index()
+        for team_key in team_keys or []:
+            if team_key not in index:
+                # Not in the all-teams listing (e.g. registered since startup).
+                index[team_key] = await self.get_team(team_key=team_key)
+
+            yield index[team_key]
@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import random
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import IO, Callable, Deque, Dict, Iterable, List, Optional
+
+from py.util import (
+    TRACE_LOG_MAX_BYTES,
+    TRACE_LOG_PATH,
+    TRACE_MAX_LIST_ARG,
+    TRACE_RING_SIZE,
+    TRACE_SAMPLE_RATE,
+)
+
+PERCENTILES = [50, 90, 99]
+
+
+def summarize_arg(value: object) -> object:
+    if isinstance(value, (list, tuple)) and len(value) > TRACE_MAX_LIST_ARG:
+        digest = hashlib.sha1(json.dumps(value, default=str).encode()).hexdigest()
+        return {"len": len(value), "sha1": digest[:12]}
+
+    return value
+
+
+class Span:
+    __slots__ = ["rpc", "args", "start", "parent", "cache", "upstream_bytes"]
+
+    def __init__(
+        self, rpc: str, args: Dict[str, object], parent: Optional["Span"]
+    ) -> None:
+        self.rpc = rpc
+        self.args = {k: summarize_arg(v) for k, v in args.items()}
+        self.start = time.perf_counter()
+        self.parent = parent
+        self.cache = None  # type: Optional[str]
+        self.upstream_bytes = 0
+
+    def to_dict(self, ms: float, error: Optional[str]) -> Dict[str, object]:
+        return {
+            "ts": time.time(),
+            "rpc": self.rpc,
+            "args": self.args,
+            "ms": round(ms, 3),
+            "cache": self.cache,
+            "upstream_bytes": self.upstream_bytes,
+            "nested": self.parent is not None,
+            "error": error,
+        }
+
+
+# The span of the handler currently running. `TPAService.fetch` copies the
+# context into the executor so upstream byte counts land on the right span.
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Records one line per sampled TPA call into a ring buffer (and JSONL)."""
+
+    def __init__(
+        self,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        ring_size: int = TRACE_RING_SIZE,
+        path: Optional[str] = TRACE_LOG_PATH,
+        max_bytes: int = TRACE_LOG_MAX_BYTES,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.ring: Deque[Dict[str, object]] = deque(maxlen=ring_size)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file: Optional[IO[str]] = None
+
+    def start(self, rpc: str, args: Dict[str, object]) -> Optional[Span]:
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+
+        return Span(rpc, args, parent=current_span.get())
+
+    def finish(self, span: Span, error: Optional[BaseException] = None) -> None:
+        ms = (time.perf_counter() - span.start) * 1000
+        record = span.to_dict(ms, None if error is None else type(error).__name__)
+        self.ring.append(record)
+        if span.parent is not None:
+            span.parent.upstream_bytes += span.upstream_bytes
+
+        if self.path is not None:
+            if self.file is not None and self.file.tell() >= self.max_bytes:
+                # Keep one old log around so a rollover doesn't lose everything.
+                self.file.close()
+                os.replace(self.path, self.path + ".1")
+                self.file = None
+            if self.file is None:
+                # Line-buffered so a killed proxy still leaves a usable trace.
+                self.file = open(self.path, "a", buffering=1)
+            self.file.write(json.dumps(record, default=str) + "\n")
+
+
+tracer = Tracer()
+
+
+def mark_cache(state: str) -> None:
+    span = current_span.get()
+    if span is not None:
+        span.cache = state
+
+
+def add_upstream_bytes(n: int) -> None:
+    span = current_span.get()
+    if span is not None:
+        span.upstream_bytes += n
+
+
+def traced(fn: Callable) -> Callable:
+    """Time a TPAService handler and record it with `tracer`.
+
+    Streams are timed until they are exhausted (or the client goes away).
+    """
+    sig = inspect.signature(fn)
+
+    def call_args(self, args, kwargs) -> Dict[str, object]:
+        bound = sig.bind(self, *args, **kwargs)
+        return {k: v for k, v in bound.arguments.items() if k != "self"}
+
+    if inspect.isasyncgenfunction(fn):
+
+        @functools.wraps(fn)
+        async def stream_wrapper(self, *args, **kwargs):
+            span = tracer.start(fn.__name__, call_args(self, args, kwargs))
+            if span is None:
+                async for msg in fn(self, *args, **kwargs):
+                    yield msg
+                return
+
+            # Restored by value rather than token: a stream may be closed from a
+            # different context than the one it started in.
+            error = None
+            try:
+                current_span.set(span)
+                async for msg in fn(self, *args, **kwargs):
+                    current_span.set(span.parent)
+                    yield msg
+                    current_span.set(span)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                current_span.set(span.parent)
+                tracer.finish(span, error)
+
+        return stream_wrapper
+
+    @functools.wraps(fn)
+    async def unary_wrapper(self, *args, **kwargs):
+        span = tracer.start(fn.__name__, call_args(self, args, kwargs))
+        if span is None:
+            return await fn(self, *args, **kwargs)
+
+        error = None
+        try:
+            current_span.set(span)
+            return await fn(self, *args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            current_span.set(span.parent)
+            tracer.finish(span, error)
+
+    return unary_wrapper
+
+
+def read_trace(path: str = TRACE_LOG_PATH) -> List[Dict[str, object]]:
+    records = []
+    for p in [path + ".1", path]:
+        if os.path.exists(p):
+            with open(p) as f:
+                records += [json.loads(line) for line in f if line.strip()]
+
+    return records
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    idx = round(pct / 100 * (len(sorted_values) - 1))
+    return sorted_values[idx]
+
+
+def latency_by_rpc(
+    records: Iterable[Dict[str, object]], include_nested: bool = False
+) -> Dict[str, Dict[str, float]]:
+    latencies = defaultdict(list)
+    hits = defaultdict(int)
+    upstream = defaultdict(int)
+    for r in records:
+        if r["nested"] and not include_nested:
+            continue
+
+        latencies[r["rpc"]].append(r["ms"])
+        hits[r["rpc"]] += r["cache"] == "hit"
+        upstream[r["rpc"]] += r["upstream_bytes"]
+
+    out = {}
+    for rpc, ms in latencies.items():
+        ms.sort()
+        out[rpc] = {
+            "n": len(ms),
+            **{f"p{p}": percentile(ms, p) for p in PERCENTILES},
+            "max": ms[-1],
+            "hit_rate": hits[rpc] / len(ms),
+            "upstream_bytes": upstream[rpc],
+        }
+
+    return out
@@ -0,0 +1,33 @@
+import humanize
+from rich import print
+from rich.table import Table
+
+from py.cli import expose
+from py.tpa.tracer import PERCENTILES, latency_by_rpc, read_trace
+from py.util import TRACE_LOG_PATH
+
+
+@expose
+def latency(path: str = TRACE_LOG_PATH, include_nested: bool = False):
+    stats = latency_by_rpc(read_trace(path), include_nested=include_nested)
+
+    table = Table(show_header=True, title=path)
+    table.add_column("RPC")
+    table.add_column("N", justify="right")
+    for p in PERCENTILES:
+        table.add_column(f"p{p} ms", justify="right")
+    table.add_column("max ms", justify="right")
+    table.add_column("hit %", justify="right")
+    table.add_column("upstream", justify="right")
+
+    for rpc, s in sorted(stats.items(), key=lambda kv: -kv[1]["p99"]):
+        table.add_row(
+            rpc,
+            str(s["n"]),
+            *[f"{s[f'p{p}']:.1f}" for p in PERCENTILES],
+            f"{s['max']:.1f}",
+            f"{s['hit_rate'] * 100:.0f}",
+            humanize.naturalsize(s["upstream_bytes"]),
+        )
+
+    print(table)
@@ -18,8 +18,6 @@ from typing import (
 )
 
 import bar_chart_race as bcr
-import numpy as np
-import numpy.typing as npt
 import pandas as pd
 
 # from async_lru import alru_cache
@@ -64,11 +62,61 @@ T = TypeVar("T")
 OPPOSITE_COLOR = {"blue": "red", "red": "blue"}
 ENABLE_GEOCODING = False
 
-MAX_TEAMS_PAGE_NUM = 17
-MAX_TEAMS_PAGE_RANGE = MAX_TEAMS_PAGE_NUM + 1
+# How many pages of /teams the proxy fetches at once when walking every page.
+TEAMS_PAGE_FAN_OUT = 8
 CURRENT_YEAR = datetime.datetime.today().year
 CURRENT_YEAR_RANGE = CURRENT_YEAR + 1
 
+# How long anything mentioning the current season is served without asking TBA
+# again. After that it is revalidated with a conditional request.
+CURRENT_YEAR_FRESH_FOR = datetime.timedelta(minutes=10)
+# Past seasons barely change, but still get picked up again eventually (late
+# result fixes, teams registering, new pages of /teams).
+PAST_YEAR_FRESH_FOR = datetime.timedelta(days=7)
+
+# Max number of upstream TBA requests the proxy keeps in flight at once.
+TPA_MAX_CONCURRENCY = 32
+
+# Where `python main.py tpa` listens, and how clients talk to it.
+TPA_HOST = "127.0.0.1"
+TPA_PORT = 1337
+TPA_CHANNEL_POOL_SIZE = 4
+TPA_KEEPALIVE_SECONDS = 60.0
+TPA_RECONNECT_ATTEMPTS = 5
+
+# Fraction of proxy calls recorded by py/tpa/tracer.py, how many records are
+# kept in memory, and where they are appended (None to keep them in memory only).
+TRACE_SAMPLE_RATE = 0.05
+TRACE_RING_SIZE = 10_000
+TRACE_LOG_PATH = "tpa_trace.jsonl"
+# The log is rolled over to TRACE_LOG_PATH + ".1" past this size.
+TRACE_LOG_MAX_BYTES = 50 * 1024 * 1024
+# Longer list args (team / event keys) are logged as their length and a hash.
+TRACE_MAX_LIST_ARG = 8
+
+# How many events' OPR normal-matrix factorizations py/opr.py keeps around.
+OPR_FACTORIZATION_CACHE_SIZE = 512
+# Penalty on |x|^2 for the "ridge" OPR solver, in alliance-row units.
+OPR_RIDGE_ALPHA = 1.0
+
+# Normal draws per chunk in py/montecarlo.py; bounds simulation memory use.
+SIM_CHUNK_SAMPLES = 2**22
+# Where py/team_features.py keeps per-(team, year) simulation features.
+TEAM_FEATURES_PATH = "team_features.sqlite"
+# Annealing steps py/balance.py takes when splitting teams into divisions, and
+# how long it may run before settling for the best split so far.
+BALANCE_STEPS = 100_000
+BALANCE_TIME_BUDGET_SECONDS = 60.0
+# Local search steps per qual match py/schedule_gen.py spends on a schedule, and
+# how many generated schedules it keeps in memory.
+SCHEDULE_STEPS = 1000
+SCHEDULE_CACHE_SIZE = 64
+# Random team -> schedule slot assignments scored when picking the one with the
+# most even strength of schedule.
+SCHEDULE_CANDIDATES = 4096
+# Per-season match arrays and rating checkpoints written by py/elo.py.
+ELO_CHECKPOINT_DIR = "out/elo"
+
 STATE_TO_SHORT = {
     "Alabama": "AL",
     "Alaska": "AK",
@@ -475,63 +523,6 @@ def event_is_official(event: Event):
     return event.event_type in EventType.STANDARD_EVENT_TYPES
 
 
-class OPRUtils:
-    @staticmethod
-    def build_team_mapping(matches: List[Match]) -> Tuple[List[str], Dict[str, int]]:
-        team_set = set()
-        for match in matches:
-            for color in ["red", "blue"]:
-                for team in getattr(match.alliances, color).team_keys:
-                    team_set.add(team[3:])
-
-        team_list = list(team_set)
-        team_id_map = {}
-        for i, team in enumerate(team_list):
-            team_id_map[team] = i
-
-        return team_list, team_id_map
-
-    @staticmethod
-    def build_s_matrix(
-        matches: List[Match],
-        team_id_map: Dict[str, int],
-        accessor: Callable[[Match, str], float],
-    ) -> npt.NDArray[np.float64]:
-        n = len(team_id_map.keys())
-        s = np.zeros((n, 1))
-        for match in matches:
-            if match.alliances.blue.score == -1:
-                continue
-
-            for color in ["red", "blue"]:
-                alliance_teams = [
-                    team[3:] for team in getattr(match.alliances, color).team_keys
-                ]
-                stat = accessor(match, color)
-                for team in alliance_teams:
-                    s[team_id_map[team]] += stat
-
-        return s
-
-    @staticmethod
-    def build_m_inv_matrix(
-        matches: List[Match], team_id_map: Dict[str, int]
-    ) -> npt.NDArray[np.float64]:
-        n = len(team_id_map.keys())
-        M = np.zeros((n, n))
-        for match in matches:
-            if match.alliances.blue.score == -1:
-                continue
-
-            for color in ["red", "blue"]:
-                alliance_teams = getattr(match.alliances, color).team_keys
-                for team1 in alliance_teams:
-                    for team2 in alliance_teams:
-                        M[team_id_map[team1[3:]], team_id_map[team2[3:]]] += 1
-
-        return np.linalg.pinv(M)
-
-
 def calculate_alliance_pts(
     alliances: List[EliminationAlliance], team_key: str
 ) -> Optional[int]:
@@ -1,3 +1,4 @@
+import asyncio
 from collections import defaultdict
 from datetime import datetime
 from pprint import pprint
@@ -14,8 +15,6 @@ from py.tba import AwardType, EventType
 from py.tpa import tpa_cm
 from py.util import (
     CURRENT_YEAR,
-    MAX_TEAMS_PAGE_NUM,
-    MAX_TEAMS_PAGE_RANGE,
     OPPOSITE_COLOR,
     _confidence,
     _confidence_bayes,
@@ -156,10 +155,14 @@ async def generate():
         [most_teleop_notes_scored, "Most Teleop Notes", ["Key", "Teams", "Count"]],
     ]
     # await summary()
+    # Tables are independent, so run them together and let the proxy keep their
+    # upstream requests in flight concurrently.
+    results = await asyncio.gather(*[table_fn() for table_fn, _, _ in to_run])
     with open("out.md", "w+") as f:
-        for i, (table_fn, title, headers) in enumerate(to_run, start=1):
+        for i, ((table_fn, title, headers), data) in enumerate(
+            zip(to_run, results), start=1
+        ):
             print(f"{i} / {len(to_run)} - {title}")
-            data = await table_fn()
             ranked = [[i] + row for (i, row) in enumerate(data, start=1)]
             print(f"### {title}\n", file=f)
             print(tabulate(ranked, headers=["N"] + headers, tablefmt="pipe"), file=f)
@@ -172,24 +175,23 @@ async def summary():
     played = set()
     unplayed = set()
     events = defaultdict(set)
+    event_filter = dict(
+        year_start=CURRENT_YEAR,
+        year_end=CURRENT_YEAR,
+        event_types=list(EventType.SEASON_EVENT_TYPES),
+    )
     async with tpa_cm() as tpa:
-        async for event in all_events_with_bar(
-            tpa=tpa,
-            year_start=CURRENT_YEAR,
-            year_end=CURRENT_YEAR,
-            condition=lambda e: e.event_type in EventType.SEASON_EVENT_TYPES,
-        ):
-            async for team in tpa.get_event_teams(event_key=event.key):
-                unplayed.add(team.key)
+        async for event_team in tpa.get_events_teams(**event_filter):
+            unplayed.add(event_team.team.key)
 
-            async for match in tpa.get_event_matches(event_key=event.key):
-                if match.alliances.blue.score == -1 and match.alliances.red.score == -1:
-                    continue
+        async for match in tpa.get_events_matches(**event_filter):
+            if match.alliances.blue.score == -1 and match.alliances.red.score == -1:
+                continue
 
-                for c in ["red", "blue"]:
-                    for tk in getattr(match.alliances, c).team_keys:
-                        played.add(tk)
-                        events[tk].add(match.event_key)
+            for c in ["red", "blue"]:
+                for tk in getattr(match.alliances, c).team_keys:
+                    played.add(tk)
+                    events[tk].add(match.event_key)
 
     print(
         f"{len(played)} teams have played. {len(unplayed.difference(played))} are yet to play."
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from py.balance import DivisionStatSpread, StrengthSpread, anneal
+
+
+def test_anneal_skips_non_finite_swaps():
+    def stat(v: np.ndarray) -> float:
+        # Undefined for any division holding both 0 and 5.
+        return float("nan") if 0 in v and 5 in v else float(v.mean())
+
+    split = anneal(
+        initial=[[0, 1], [2, 3], [4, 5]],
+        objectives=[DivisionStatSpread("Mean", np.arange(6.0), stat)],
+        steps=5000,
+        seed=0,
+    )
+
+    # Best possible without pairing 0 and 5: {0, 4}, {1, 5}, {2, 3}.
+    assert split.cost == pytest.approx(1.0)
+    assert all(not {0, 5} <= set(d) for d in split.divisions)
+
+
+def test_strength_spread_delta_matches_reset():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=24)
+    members = [np.arange(i, 24, 4) for i in range(4)]
+    o = StrengthSpread(values)
+    o.reset(members)
+    before = o.score()
+
+    swap = (0, 1, 2, 3)
+    d = o.delta(members, swap)
+    members[0][1], members[2][3] = members[2][3], members[0][1]
+    o.reset(members)
+    assert o.score() - before == pytest.approx(d)
@@ -0,0 +1,94 @@
+import numpy as np
+
+from py.elo import MU, SIGMA, TEAM_SIZE, Ratings, Season, layers
+
+
+def one_match(outcome: int) -> Ratings:
+    ratings = Ratings()
+    ratings.rate(
+        Season(
+            keys=np.array(["frc1", "frc2"]),
+            red=np.array([[0] + [-1] * (TEAM_SIZE - 1)], dtype=np.int32),
+            blue=np.array([[1] + [-1] * (TEAM_SIZE - 1)], dtype=np.int32),
+            outcome=np.array([outcome], dtype=np.int8),
+        )
+    )
+    return ratings
+
+
+def test_one_on_one_win_matches_trueskill():
+    # trueskill.rate_1vs1(Rating(), Rating()) with the default environment.
+    ratings = one_match(1)
+    np.testing.assert_allclose(ratings.mu, [29.396, 20.604], atol=1e-3)
+    np.testing.assert_allclose(ratings.sigma, [7.171, 7.171], atol=1e-3)
+
+
+def test_one_on_one_draw_matches_trueskill():
+    ratings = one_match(0)
+    np.testing.assert_allclose(ratings.mu, [MU, MU], atol=1e-9)
+    np.testing.assert_allclose(ratings.sigma, [6.458, 6.458], atol=1e-3)
+
+
+def random_season(seed: int = 0) -> Season:
+    rng = np.random.default_rng(seed)
+    n_teams, n_matches = 30, 120
+    teams = np.stack([rng.permutation(n_teams)[:6] for _ in range(n_matches)])
+    return Season(
+        keys=np.array([f"frc{i}" for i in range(n_teams)]),
+        red=teams[:, :3].astype(np.int32),
+        blue=teams[:, 3:].astype(np.int32),
+        outcome=rng.choice([-1, 0, 1], n_matches).astype(np.int8),
+    )
+
+
+def test_layers_keep_team_order():
+    season = random_season()
+    lyr = layers(season.red, season.blue)
+    teams = np.concatenate([season.red, season.blue], axis=1)
+    for t in range(len(season.keys)):
+        played = lyr[(teams == t).any(axis=1)]
+        assert np.all(np.diff(played) > 0)
+
+
+def test_layered_rating_equals_sequential():
+    season = random_season()
+    layered = Ratings()
+    layered.rate(season)
+
+    sequential = Ratings()
+    sequential.add(season.keys.tolist())
+    for m in range(len(season.outcome)):
+        sequential.update(
+            season.red[m : m + 1].astype(np.int64),
+            season.blue[m : m + 1].astype(np.int64),
+            season.outcome[m : m + 1],
+        )
+
+    np.testing.assert_allclose(layered.mu, sequential.mu, atol=1e-12)
+    np.testing.assert_allclose(layered.sigma, sequential.sigma, atol=1e-12)
+
+
+def test_new_season_regresses_sigma(tmp_path):
+    ratings = one_match(1)
+    ratings.new_season()
+    np.testing.assert_allclose(ratings.sigma, (7.171 + SIGMA) / 2, atol=1e-3)
+    assert not ratings.active.any()
+
+    path = str(tmp_path / "ratings.npz")
+    ratings.save(path)
+    loaded = Ratings.load(path)
+    assert loaded.keys == ratings.keys
+    np.testing.assert_array_equal(loaded.mu, ratings.mu)
+    assert loaded.index == {"frc1": 0, "frc2": 1}
+
+
+def test_upsets_stay_finite():
+    ratings = Ratings()
+    ratings.add(["frc1", "frc2"])
+    ratings.mu[:] = [200.0, -200.0]
+    ratings.sigma[:] = 1.0
+    ratings.update(
+        np.array([[0, -1, -1]]), np.array([[1, -1, -1]]), np.array([-1], np.int8)
+    )
+    assert np.all(np.isfinite(ratings.mu)) and np.all(np.isfinite(ratings.sigma))
+    assert ratings.mu[1] > -200.0
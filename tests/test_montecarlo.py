@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from py.montecarlo import (
+    BRACKETS,
+    SEEDS,
+    TeamModel,
+    rank_percentiles,
+    rank_probabilities,
+    simulate_playoffs,
+    simulate_quals,
+    team_model,
+)
+
+
+def playoff_model() -> TeamModel:
+    rng = np.random.default_rng(0)
+    n = SEEDS * 3
+    means = np.zeros((n, 3))
+    means[:, 2] = rng.uniform(10, 40, n)
+    return TeamModel(
+        keys=[f"frc{i}" for i in range(n)],
+        means=means,
+        variances=np.full((n, 3), 25.0),
+    )
+
+
+@pytest.mark.parametrize("bracket", sorted(BRACKETS))
+def test_playoff_reach_is_monotonic(bracket):
+    result = simulate_playoffs(
+        model=playoff_model(),
+        alliances=np.arange(SEEDS * 3).reshape(SEEDS, 3),
+        bracket=BRACKETS[bracket],
+        iterations=2000,
+        seed=0,
+    )
+
+    assert result.reach.shape == (SEEDS, len(result.rounds))
+    assert np.all(np.diff(result.reach, axis=1) <= 0)
+    np.testing.assert_allclose(result.reach[:, 0], 1.0)
+    assert result.reach[:, -1].sum() == pytest.approx(1.0)
+
+
+def test_playoffs_are_seeded():
+    kwargs = dict(
+        model=playoff_model(),
+        alliances=np.arange(SEEDS * 3).reshape(SEEDS, 3),
+        bracket=BRACKETS["double"],
+        iterations=500,
+        seed=1,
+    )
+    np.testing.assert_array_equal(
+        simulate_playoffs(**kwargs).reach, simulate_playoffs(**kwargs).reach
+    )
+
+
+def qual_setup(n_teams: int = 12, n_matches: int = 20):
+    rng = np.random.default_rng(0)
+    model = TeamModel(
+        keys=[f"frc{i}" for i in range(n_teams)],
+        means=rng.uniform(0.0, 1.0, (n_teams, 3)) * [1, 1, 30],
+        variances=np.full((n_teams, 3), 4.0),
+    )
+    alliances = np.stack(
+        [rng.permutation(n_teams)[:6].reshape(2, 3) for _ in range(n_matches)]
+    )
+    return model, alliances
+
+
+def test_rank_probabilities_are_distributions():
+    model, alliances = qual_setup()
+    sim = simulate_quals(model, alliances, (1.5, 1.5), iterations=3000, seed=0)
+
+    # Every iteration's ranks are a permutation of 1..n.
+    np.testing.assert_array_equal(
+        np.sort(sim.ranks, axis=1), np.tile(np.arange(1, 13), (3000, 1))
+    )
+    probs = rank_probabilities(sim.ranks, chunk=1000)
+    np.testing.assert_allclose(probs.sum(axis=1), 1.0)
+    np.testing.assert_allclose(probs.sum(axis=0), 1.0)
+
+    pct = rank_percentiles(probs)
+    assert np.all(np.diff(pct, axis=1) >= 0)
+    assert pct.min() >= 1 and pct.max() <= 12
+
+
+def test_quals_count_every_match():
+    model, alliances = qual_setup()
+    sim = simulate_quals(model, alliances, (1.5, 1.5), iterations=500, seed=0)
+
+    appearances = np.bincount(alliances.ravel(), minlength=12)
+    np.testing.assert_array_equal(sim.played, 500 * appearances)
+    assert np.all(sim.wins + sim.ties <= sim.played)
+    # Each match has exactly one winner or two tied sides.
+    assert sim.wins.sum() * 2 + sim.ties.sum() == 500 * len(alliances) * 3 * 2
+
+
+def test_team_model_pools_variance_for_thin_histories():
+    model = team_model(
+        ["frc1", "frc2", "frc3"],
+        {
+            "frc1": [(1.0, 2.0, 10.0), (3.0, 4.0, 20.0)],
+            "frc2": [(5.0, 6.0, 30.0)],
+            "frc3": [],
+        },
+    )
+
+    np.testing.assert_allclose(model.means[0], [2.0, 3.0, 15.0])
+    np.testing.assert_allclose(model.means[2], 0.0)
+    pooled = np.var([[1, 2, 10], [3, 4, 20], [5, 6, 30]], axis=0)
+    np.testing.assert_allclose(model.variances[1], pooled)
@@ -0,0 +1,107 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from protos.tpa import Match, MatchAlliance, MatchAlliances
+from py.opr import IncrementalOPR, OPRDesign, component_targets
+
+N_TEAMS = 12
+
+
+def score(m: Match, color: str) -> float:
+    return getattr(m.alliances, color).score
+
+
+def event_matches(n_matches: int = 40, seed: int = 0) -> List[Match]:
+    rng = np.random.default_rng(seed)
+    true_opr = rng.uniform(5, 25, N_TEAMS)
+    matches = []
+    for i in range(n_matches):
+        teams = rng.permutation(N_TEAMS)[:6].reshape(2, 3)
+        scores = true_opr[teams].sum(axis=1) + rng.normal(0, 3, 2)
+        matches.append(
+            Match(
+                key=f"2024test_qm{i + 1}",
+                alliances=MatchAlliances(
+                    red=MatchAlliance(
+                        team_keys=[f"frc{t + 1}" for t in teams[0]],
+                        score=int(round(scores[0])),
+                    ),
+                    blue=MatchAlliance(
+                        team_keys=[f"frc{t + 1}" for t in teams[1]],
+                        score=int(round(scores[1])),
+                    ),
+                ),
+            )
+        )
+
+    return matches
+
+
+def batch(matches: List[Match], **kwargs) -> Tuple[OPRDesign, np.ndarray]:
+    design = OPRDesign.from_matches(matches)
+    return design, design.solve(component_targets(matches, [score]), **kwargs)
+
+
+def test_ls_matches_lstsq():
+    matches = event_matches()
+    design, x = batch(matches)
+    y = component_targets(matches, [score])
+    expected, *_ = np.linalg.lstsq(design.a.toarray(), y, rcond=None)
+    np.testing.assert_allclose(x, expected, atol=1e-9)
+
+
+def test_ridge_matches_closed_form():
+    matches = event_matches()
+    design, x = batch(matches, mode="ridge", alpha=2.0)
+    a = design.a.toarray()
+    y = component_targets(matches, [score])
+    expected = np.linalg.solve(a.T @ a + 2.0 * np.eye(N_TEAMS), a.T @ y)
+    np.testing.assert_allclose(x, expected, atol=1e-9)
+
+
+def test_nnls_and_l1():
+    matches = event_matches()
+    design, ls = batch(matches)
+    _, nnls = batch(matches, mode="nnls")
+    _, l1 = batch(matches, mode="l1")
+    a = design.a.toarray()
+    y = component_targets(matches, [score])
+
+    assert np.all(nnls >= 0)
+    # L1 minimizes absolute residuals, so it can't do worse than least squares.
+    assert np.abs(a @ l1 - y).sum() <= np.abs(a @ ls - y).sum() + 1e-6
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        batch(event_matches(), mode="nope")
+
+
+def test_incremental_matches_batch():
+    matches = event_matches()
+    live = IncrementalOPR([score])
+    for i in range(1, len(matches) + 1):
+        live.update(matches[:i])
+
+    design, x = batch(matches)
+    expected = design.as_dict(x[:, 0])
+    got = live.as_dict()
+    assert got.keys() == expected.keys()
+    for t in expected:
+        assert got[t] == pytest.approx(expected[t], abs=1e-8)
+
+
+def test_incremental_adds_unlisted_teams():
+    matches = event_matches()
+    listed = [f"frc{i}" for i in range(1, N_TEAMS - 1)]
+    live = IncrementalOPR([score], teams=listed)
+    for i in range(1, len(matches) + 1):
+        live.update(matches[:i])
+
+    design, x = batch(matches)
+    expected = design.as_dict(x[:, 0])
+    assert set(live.as_dict()) == set(expected)
+    for t, v in live.as_dict().items():
+        assert v == pytest.approx(expected[t], abs=1e-8)
@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from py.tpa import pb_cache
+from py.tpa.pb_cache import PbCache, pack, pb_cached, unpack
+from py.util import CURRENT_YEAR
+
+
+class Msg:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def SerializeToString(self) -> bytes:
+        return self.data
+
+    @classmethod
+    def FromString(cls, data: bytes) -> "Msg":
+        return cls(data)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    inputs = []
+    for name in ["fixes.py", "elos.json"]:
+        path = tmp_path / name
+        path.write_text("{}")
+        inputs.append(str(path))
+
+    monkeypatch.setattr(pb_cache, "CODE_INPUTS", inputs[:1])
+    monkeypatch.setattr(pb_cache, "FIX_INPUTS", inputs)
+    return PbCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_pack_round_trips():
+    messages = [b"", b"a", b"\x00" * 300]
+    assert unpack(pack(messages)) == messages
+
+
+def test_expiry(cache):
+    cache.set("k1", b"x", current_season=True)
+    cache.set("k2", b"y", current_season=False)
+    assert cache.get("k1") == b"x"
+    created, expires = cache.conn.execute(
+        "SELECT created, expires FROM responses WHERE key = 'k2'"
+    ).fetchone()
+    assert expires == pytest.approx(
+        created + pb_cache.PAST_YEAR_FRESH_FOR.total_seconds()
+    )
+
+    cache.conn.execute("UPDATE responses SET expires = ?", (time.time() - 1,))
+    assert cache.get("k1") is None
+
+
+def test_stale_fingerprints_are_pruned(cache, tmp_path):
+    args = {"team_key": "frc1"}
+    key = cache.key("get_team", args, pb_cache.FIX_INPUTS)
+    cache.set(key, b"x", current_season=False)
+
+    # Rewriting with the same contents keeps the fingerprint.
+    (tmp_path / "elos.json").write_text("{}")
+    assert cache.key("get_team", args, pb_cache.FIX_INPUTS) == key
+
+    (tmp_path / "elos.json").write_text('{"1": {}}')
+    new_key = cache.key("get_team", args, pb_cache.FIX_INPUTS)
+    assert new_key != key
+    conn = sqlite3.connect(cache.path)
+    assert conn.execute("SELECT COUNT(*) FROM responses").fetchone() == (0,)
+
+
+def test_one_leader_after_a_failed_flight(cache):
+    calls = []
+
+    class Service:
+        pb_cache = cache
+
+        @pb_cached(Msg)
+        async def get(self, year: int) -> Msg:
+            calls.append(year)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("upstream")
+            return Msg(b"ok")
+
+    async def run():
+        service = Service()
+        return await asyncio.gather(
+            *[service.get(year=CURRENT_YEAR) for _ in range(10)],
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert isinstance(results[0], RuntimeError)
+    assert all(r.data == b"ok" for r in results[1:])
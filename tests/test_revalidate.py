@@ -0,0 +1,58 @@
+import requests
+from requests.adapters import BaseAdapter
+
+from py.tpa.revalidate import RevalidatingAdapter
+from py.util import CURRENT_YEAR
+
+
+class FakeUpstream(BaseAdapter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(dict(request.headers))
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if request.headers.get("If-None-Match") == '"v1"':
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response.headers["ETag"] = '"v1"'
+            response._content = b'{"team": 1}'
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def test_revalidates_with_etag(tmp_path):
+    upstream = FakeUpstream()
+    adapter = RevalidatingAdapter(upstream, path=str(tmp_path / "cache.sqlite"))
+    session = requests.Session()
+    session.mount("https://", adapter)
+    url = f"https://example.com/events/{CURRENT_YEAR}"
+
+    assert session.get(url).content == b'{"team": 1}'
+    # Fresh: served without going upstream.
+    assert session.get(url).content == b'{"team": 1}'
+    assert len(upstream.requests) == 1
+
+    adapter.conn.execute("UPDATE http_responses SET checked = 0")
+    response = session.get(url)
+    assert response.status_code == 200
+    assert response.content == b'{"team": 1}'
+    assert upstream.requests[-1]["If-None-Match"] == '"v1"'
+
+
+def test_past_seasons_pass_through(tmp_path):
+    upstream = FakeUpstream()
+    adapter = RevalidatingAdapter(upstream, path=str(tmp_path / "cache.sqlite"))
+    session = requests.Session()
+    session.mount("https://", adapter)
+
+    for _ in range(2):
+        session.get("https://example.com/events/2009")
+    assert len(upstream.requests) == 2
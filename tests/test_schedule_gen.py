@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from py.schedule_gen import (
+    TEAMS_PER_MATCH,
+    balanced_assignment,
+    generate_schedule,
+    min_gap,
+    schedule_quality,
+    sos_matrix,
+)
+
+
+@pytest.mark.parametrize("n_teams, rounds", [(6, 2), (13, 5), (30, 8)])
+def test_generated_schedule_constraints(n_teams, rounds):
+    s = generate_schedule(n_teams, rounds, seed=0)
+    flat = s.teams.reshape(len(s.teams), TEAMS_PER_MATCH)
+
+    assert flat.min() == 1 and flat.max() == n_teams
+    # Nobody plays themselves.
+    assert all(len(set(m)) == TEAMS_PER_MATCH for m in flat.tolist())
+
+    # Everyone plays `rounds` counted matches; the extra one is a surrogate.
+    counted = np.bincount(flat[~s.surrogate.reshape(flat.shape)], minlength=n_teams + 1)
+    np.testing.assert_array_equal(counted[1:], rounds)
+    assert s.surrogate.sum() == len(flat) * TEAMS_PER_MATCH - n_teams * rounds
+
+    q = schedule_quality(s.teams - 1, np.zeros(n_teams))
+    assert q.min_gap >= 1
+
+
+def test_generated_schedule_is_cached_and_read_only():
+    a = generate_schedule(18, 4, seed=3)
+    assert generate_schedule(18, 4, seed=3) is a
+    with pytest.raises(ValueError):
+        a.teams[0, 0, 0] = 1
+
+
+def test_too_few_teams():
+    with pytest.raises(ValueError):
+        generate_schedule(5, 3)
+
+
+def test_min_gap_grows_with_teams():
+    assert min_gap(18) == 2
+    assert min_gap(100) == 8
+
+
+def test_sos_counts_opponents_minus_partners():
+    # One match: 0 1 2 vs 3 4 5.
+    sos = sos_matrix(np.array([[[0, 1, 2], [3, 4, 5]]]), 6)
+    strength = np.arange(6.0)
+    np.testing.assert_allclose(sos @ strength, [9, 10, 11, -6, -5, -4])
+
+
+def test_balanced_assignment_beats_identity():
+    s = generate_schedule(24, 6, seed=0)
+    strength = np.random.default_rng(0).normal(size=24)
+    order, variance = balanced_assignment(s.teams - 1, strength, candidates=256)
+
+    np.testing.assert_array_equal(np.sort(order), np.arange(24))
+    assert variance == pytest.approx(
+        schedule_quality(s.teams - 1, strength[order]).sos_variance
+    )
+    assert variance <= schedule_quality(s.teams - 1, strength).sos_variance
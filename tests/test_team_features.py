@@ -0,0 +1,42 @@
+import numpy as np
+
+from py.team_features import TeamFeatureStore, zscores
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "features.sqlite")
+    store = TeamFeatureStore(path)
+    store.put_event("2024a", 2024, {"frc1": (1.0, 2.0, 10.0), "frc2": (0, 0, 5.0)})
+    store.put_event("2024b", 2024, {"frc1": (3.0, 4.0, 20.0)})
+
+    reopened = TeamFeatureStore(path)
+    assert reopened.solved == {"2024a", "2024b"}
+    assert reopened.history("frc1", 2024) == [(1.0, 2.0, 10.0), (3.0, 4.0, 20.0)]
+    means, variances = reopened.stats("frc1", 2024)
+    np.testing.assert_allclose(means, [2.0, 3.0, 15.0])
+    np.testing.assert_allclose(variances, [1.0, 1.0, 25.0])
+    assert reopened.stats("frc3", 2024) is None
+
+
+def test_rewriting_an_event_replaces_it(tmp_path):
+    store = TeamFeatureStore(str(tmp_path / "features.sqlite"))
+    store.put_event("2024a", 2024, {"frc1": (1.0, 1.0, 1.0)})
+    store.put_event("2024a", 2024, {"frc1": (2.0, 2.0, 2.0)})
+    assert store.history("frc1", 2024) == [(2.0, 2.0, 2.0)]
+
+
+def test_solver_configs_are_kept_apart(tmp_path):
+    path = str(tmp_path / "features.sqlite")
+    TeamFeatureStore(path).put_event("2024a", 2024, {"frc1": (1.0, 1.0, 1.0)})
+
+    ridge = TeamFeatureStore(path, mode="ridge")
+    assert ridge.solved == set()
+    assert ridge.history("frc1", 2024) == []
+    assert TeamFeatureStore(path).history("frc1", 2024) == [(1.0, 1.0, 1.0)]
+
+
+def test_zscores():
+    z = zscores({"a": 1.0, "b": 3.0})
+    assert z == {"a": -1.0, "b": 1.0}
+    assert zscores({"a": 5.0}) == {"a": 0.0}
+    assert zscores({"a": 2.0, "b": 2.0}) == {"a": 0.0, "b": 0.0}